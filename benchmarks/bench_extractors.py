@@ -0,0 +1,122 @@
+"""
+Per-row cost of building the transactions of a section with the extractors that compile_columns generates (with exec),
+against a plain closure over the same columns, which converts the fields in a loop.
+
+    python -m benchmarks.bench_extractors [--rows N]
+"""
+
+import argparse
+import json
+import time
+from collections import deque
+from typing import Callable, Sequence
+
+from finparse.cards.isracard import ISRACARD, Section
+from finparse.cards.spec import (
+    Columns,
+    CurrencyColumn,
+    compile_columns,
+    date_parser,
+    excel_datetime,
+)
+from finparse.models import CURRENCY_BY_SYMBOL, TransactionRow
+
+
+def closure_extractor(columns: Columns) -> Callable[[Sequence], TransactionRow]:
+    """
+    The fields of each row, read and converted one by one
+    """
+    parse_date = (
+        excel_datetime
+        if columns.date_format is None
+        else date_parser(columns.date_format)
+    )
+    converters = {
+        "date": parse_date,
+        "amount": str,
+        "foreign_amount": str,
+        "currency": CURRENCY_BY_SYMBOL.__getitem__,
+        "foreign_currency": CURRENCY_BY_SYMBOL.__getitem__,
+    }
+
+    fields = []
+    for name in (
+        "date",
+        "description",
+        "amount",
+        "currency",
+        "foreign_amount",
+        "foreign_currency",
+        "category",
+        "id",
+        "notes",
+    ):
+        column = getattr(columns, name)
+        if isinstance(column, CurrencyColumn):
+            column = column.column
+        if column is not None:
+            fields.append((name, column, converters.get(name)))
+
+    def row(values: Sequence) -> TransactionRow:
+        kwargs = {}
+        for name, column, convert in fields:
+            value = values[column]
+            kwargs[name] = convert(value) if convert is not None else value
+        return TransactionRow(**kwargs)
+
+    return row
+
+
+def measure(
+    extract: Callable[[Sequence], TransactionRow], rows: list, repeat: int
+) -> dict:
+    best = min(_timed(extract, rows) for _ in range(repeat))
+    return {"seconds": best, "us_per_row": best / len(rows) * 1e6}
+
+
+def _timed(extract: Callable[[Sequence], TransactionRow], rows: list) -> float:
+    start = time.perf_counter()
+    deque(map(extract, rows), maxlen=0)
+    return time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    arg_parser.add_argument("--rows", type=int, default=200_000)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    # The values of the rows of the local section of an Isracard report, as xlrd reads them
+    columns = Section.Local.columns
+    rows = [
+        [
+            f"{i % 28 + 1:02}/03/2024",
+            f"BUSINESS {i}",
+            i / 10,
+            "₪",
+            i / 10,
+            "₪",
+            str(i),
+            f"note {i}",
+        ]
+        for i in range(args.rows)
+    ]
+
+    generated = compile_columns(columns, ISRACARD.format.cells).row
+    closure = closure_extractor(columns)
+    assert generated(rows[0]) == closure(rows[0])
+
+    results = {
+        "generated": measure(generated, rows, args.repeat),
+        "closure": measure(closure, rows, args.repeat),
+    }
+
+    for name, result in results.items():
+        print(f"{name:<10} {result['us_per_row']:>8.2f} us/row")
+    print(json.dumps({"rows": args.rows, "results": results}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Per-row cost of the stages of the Isracard parser, on a synthetic report: loading the workbook with xlrd, scanning
+its rows into section events, and the whole parse (loading, scanning and building the transactions).
+
+    python -m benchmarks.bench_isracard [--rows N] [--currencies N]
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable
+
+import xlrd
+from loguru import logger
+
+from finparse.cards.isracard import ISRACARD, IsracardReportParser
+from tests.synthetic import write_isracard_report
+
+
+def measure(run: Callable[[], object], rows: int, repeat: int) -> dict:
+    best = min(_timed(run) for _ in range(repeat))
+    return {"seconds": best, "us_per_row": best / rows * 1e6}
+
+
+def _timed(run: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    arg_parser.add_argument("--rows", type=int, default=50_000)
+    arg_parser.add_argument(
+        "--currencies", type=int, default=2, help="Foreign currency sections per card"
+    )
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    logger.remove()
+    path = Path(tempfile.mkdtemp(prefix="finparse-bench-")) / "isracard.xls"
+    currencies = tuple("$€"[i % 2] for i in range(args.currencies))
+    write_isracard_report(path, args.rows, foreign_currencies=currencies)
+
+    sheet = xlrd.open_workbook(path).sheet_by_index(0)
+    results = {
+        "load": measure(lambda: xlrd.open_workbook(path), args.rows, args.repeat),
+        "scan": measure(
+            lambda: deque(ISRACARD.layout.scan(sheet, ISRACARD.format), maxlen=0),
+            args.rows,
+            args.repeat,
+        ),
+        "parse": measure(
+            lambda: deque(IsracardReportParser.iter_records(path), maxlen=0),
+            args.rows,
+            args.repeat,
+        ),
+    }
+
+    for stage, result in results.items():
+        print(f"{stage:<6} {result['us_per_row']:>8.2f} us/row")
+    print(json.dumps({"rows": args.rows, "results": results}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Memory of parsing large synthetic reports: peak RSS while parsing, the RSS left once a report was parsed (and its
+workbook released), and the file descriptors left open, when parsing a report once or many times in one process.
+
+    python -m benchmarks.bench_memory [--sizes N ...] [--repeat-files N]
+
+Every measurement runs in a fresh subprocess, so its peak RSS is its own.
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.run import ISSUERS, get_parser, peak_rss_kb
+
+MODES = ("open_sheet", "iter_transactions", "parse_workbook")
+
+
+def current_rss_kb() -> int | None:
+    try:
+        resident_pages = int(Path("/proc/self/statm").read_text().split()[1])
+    except OSError:
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def open_fds() -> int | None:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def open_sheet(issuer: str, path: Path):
+    from finparse.workbooks import open_xls_sheet, open_xlsx_sheet
+
+    if issuer == "isracard":
+        with open_xls_sheet(path) as sheet:
+            return sheet.nrows
+
+    with open_xlsx_sheet(path) as sheet:
+        return sum(1 for _ in sheet.iter_rows(values_only=True))
+
+
+def measure_once(issuer: str, path: Path, mode: str, times: int) -> dict:
+    """
+    Parse the report (times times) in this process, and measure it. Meant to be called in a fresh subprocess.
+    """
+    from loguru import logger
+
+    logger.remove()
+    parser = get_parser(issuer)
+
+    gc.collect()
+    rss_before, peak_before, fds_before = current_rss_kb(), peak_rss_kb(), open_fds()
+    for _ in range(times):
+        if mode == "open_sheet":
+            open_sheet(issuer, path)
+        elif mode == "iter_transactions":
+            sum(1 for _ in parser.iter_transactions(path))
+        else:
+            list(parser.parse_workbook(path))
+
+    # Before collecting garbage, since workbooks that aren't closed only release their files once collected
+    fds_after = open_fds()
+    gc.collect()
+    rss_after = current_rss_kb()
+    return {
+        "peak_rss_delta_kb": peak_rss_kb() - peak_before,
+        "rss_retained_kb": (
+            rss_after - rss_before if None not in (rss_after, rss_before) else None
+        ),
+        "open_fds_delta": (
+            fds_after - fds_before if None not in (fds_after, fds_before) else None
+        ),
+    }
+
+
+def measure(issuer: str, path: Path, mode: str, times: int = 1) -> dict:
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.bench_memory",
+            "_measure",
+            issuer,
+            str(path),
+            mode,
+            str(times),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    if sys.argv[1:2] == ["_measure"]:
+        _, _, issuer, path, mode, times = sys.argv
+        print(json.dumps(measure_once(issuer, Path(path), mode, int(times))))
+        return
+
+    arg_parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 60_000])
+    arg_parser.add_argument("--issuers", nargs="+", default=list(ISSUERS))
+    arg_parser.add_argument(
+        "--repeat-files",
+        type=int,
+        default=50,
+        help="Number of times a small report is parsed in one process, to find leaks",
+    )
+    args = arg_parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for issuer in args.issuers:
+            suffix, write_report = ISSUERS[issuer]
+            for size in args.sizes:
+                path = Path(tmp) / f"{issuer}-{size}{suffix}"
+                write_report(path, size)
+                for mode in MODES:
+                    result = measure(issuer, path, mode)
+                    results.append(
+                        {
+                            "issuer": issuer,
+                            "size": size,
+                            "file_kb": path.stat().st_size // 1024,
+                            "mode": mode,
+                            **result,
+                        }
+                    )
+                    print(
+                        f"{issuer:<9} {size:>7} rows {mode:<18} "
+                        f"{result['peak_rss_delta_kb'] / 1024:>7.1f} MiB peak RSS",
+                        file=sys.stderr,
+                    )
+
+            small = Path(tmp) / f"{issuer}-small{suffix}"
+            write_report(small, 100)
+            result = measure(issuer, small, "iter_transactions", args.repeat_files)
+            results.append({"issuer": issuer, "files": args.repeat_files, **result})
+            print(
+                f"{issuer:<9} {args.repeat_files} reports: "
+                f"{result['open_fds_delta']} file descriptors left open",
+                file=sys.stderr,
+            )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Startup time of the CLI: how long running a command takes before it does any work, and which modules it imports.
+
+    python -m benchmarks.bench_startup [--repeat N] [--top N]
+
+Every run is a fresh interpreter, as when finparse is invoked from cron or a file watcher.
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from tests.synthetic import write_cal_report, write_isracard_report
+
+ROOT = Path(__file__).parent.parent
+
+# Modules that should only be imported by the commands that need them
+HEAVY_MODULES = ("firefly_iii_client", "openpyxl", "xlrd", "pick", "xattr")
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+\d+ \|\s+(\S+)")
+
+
+def run_python(code: str, *args: str) -> subprocess.CompletedProcess:
+    env = os.environ | {
+        "PYTHONPATH": os.pathsep.join((str(ROOT), str(ROOT / "finparse")))
+    }
+    return subprocess.run(
+        [sys.executable, *args, "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def best_time(code: str, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_python(code)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def imported_modules(code: str) -> list[str]:
+    result = run_python(f"{code}\nimport sys\nprint('\\n'.join(sys.modules))")
+    return [m for m in HEAVY_MODULES if m in result.stdout.splitlines()]
+
+
+def slowest_imports(code: str, top: int) -> list[dict]:
+    """
+    The modules that took the longest to import, excluding the modules they imported
+    """
+    result = run_python(code, "-X", "importtime")
+    imports = []
+    for line in result.stderr.splitlines():
+        if match := IMPORT_TIME_LINE.match(line):
+            own, module = match.groups()
+            imports.append({"module": module, "ms": int(own) / 1000})
+    return sorted(imports, key=lambda i: i["ms"], reverse=True)[:top]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--top", type=int, default=10)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cal_path = Path(tmp) / "report.xlsx"
+        isracard_path = Path(tmp) / "report.xls"
+        write_cal_report(cal_path, 10)
+        write_isracard_report(isracard_path, 10)
+
+        scenarios = {
+            "python": "pass",
+            "import": "import finparse.main",
+            "help": "from finparse.main import app\n"
+            "try:\n    app(['--help'])\nexcept SystemExit:\n    pass",
+            "detect_cal": "from finparse.parsers import find_parser\n"
+            f"find_parser(__import__('pathlib').Path({str(cal_path)!r}))",
+            "detect_isracard": "from finparse.parsers import find_parser\n"
+            f"find_parser(__import__('pathlib').Path({str(isracard_path)!r}))",
+        }
+
+        results = {
+            name: {
+                "seconds": best_time(code, args.repeat),
+                "heavy_modules": imported_modules(code),
+                "slowest_imports": slowest_imports(code, args.top),
+            }
+            for name, code in scenarios.items()
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
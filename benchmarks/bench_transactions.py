@@ -0,0 +1,118 @@
+"""
+Compare the cost of the parse stage's transaction representations: a pydantic Transaction per row (as parsers used to
+build), against a slotted TransactionRow per row that's validated in batches.
+
+    python benchmarks/bench_transactions.py [--rows N]
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable
+
+from finparse.cards.isracard import DATE_FORMAT
+from finparse.cards.spec import date_parser
+from finparse.models import (
+    CURRENCY_BY_SYMBOL,
+    Transaction,
+    TransactionRow,
+    validate_rows,
+)
+
+
+parse_date = date_parser(DATE_FORMAT)
+
+
+def build_pydantic(raw_rows: list[tuple]) -> list:
+    return [
+        Transaction(
+            date=datetime.strptime(_date, "%d/%m/%Y"),
+            description=business,
+            amount=str(amount),
+            currency=currency,
+            foreign_amount=str(foreign_amount),
+            foreign_currency=foreign_currency,
+            id=_id,
+            notes=notes,
+        )
+        for _date, business, amount, currency, foreign_amount, foreign_currency, _id, notes in raw_rows
+    ]
+
+
+def build_rows(raw_rows: list[tuple]) -> list:
+    return [
+        TransactionRow(
+            date=parse_date(_date),
+            description=business,
+            amount=str(amount),
+            currency=CURRENCY_BY_SYMBOL[currency],
+            foreign_amount=str(foreign_amount),
+            foreign_currency=CURRENCY_BY_SYMBOL[foreign_currency],
+            id=_id,
+            notes=notes,
+        )
+        for _date, business, amount, currency, foreign_amount, foreign_currency, _id, notes in raw_rows
+    ]
+
+
+def build_and_validate_rows(raw_rows: list[tuple]) -> list:
+    return validate_rows(build_rows(raw_rows))
+
+
+def measure(build: Callable[[list[tuple]], list], raw_rows: list[tuple]) -> dict:
+    start = time.perf_counter()
+    build(raw_rows)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    transactions = build(raw_rows)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del transactions
+
+    return {
+        "rows_per_sec": len(raw_rows) / elapsed,
+        "bytes_per_transaction": (after - before) / len(raw_rows),
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--rows", type=int, default=100_000)
+    args = arg_parser.parse_args()
+
+    # What the Isracard parser reads from each row: date, business, amount, currency, foreign amount/currency, id,
+    # notes. Distinct strings per row, like a real report, so interning doesn't flatter the memory numbers
+    raw_rows = [
+        (
+            f"{i % 28 + 1:02}/03/2024",
+            f"BUSINESS {i}",
+            i / 10,
+            "₪",
+            i / 10,
+            "$",
+            str(i),
+            f"note {i}",
+        )
+        for i in range(args.rows)
+    ]
+
+    results = {
+        "pydantic per row": measure(build_pydantic, raw_rows),
+        "slotted rows": measure(build_rows, raw_rows),
+        "slotted rows + batch validation": measure(build_and_validate_rows, raw_rows),
+    }
+
+    for name, result in results.items():
+        print(
+            f"{name:<34} {result['rows_per_sec']:>12,.0f} rows/s "
+            f"{result['bytes_per_transaction']:>8,.0f} bytes/transaction"
+        )
+    print(json.dumps({"rows": args.rows, "results": results}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Benchmark suite for the report parsers and the upload path, on synthetic reports.
+
+Run from the repository root:
+
+    python -m benchmarks.run --sizes 1000 100000 1000000 --output results.json
+
+Every parse runs in a fresh subprocess, so its peak RSS is its own. Uploads run against a local fake Firefly III
+server, so they measure finparse's overhead rather than the server's. Results are written as JSON, to be tracked
+over time.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from tests.synthetic import write_cal_report, write_isracard_report
+
+ISSUERS = {
+    "cal": (".xlsx", write_cal_report),
+    "isracard": (".xls", write_isracard_report),
+}
+
+PARSE_MODES = ("parse_workbook", "iter_transactions", "parse_tables")
+
+
+def peak_rss_kb() -> int:
+    # On Linux, ru_maxrss survives exec, so a subprocess would report the peak of the parent it was forked from.
+    # The high-water mark of the process' own memory doesn't.
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, and in kilobytes on Linux
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def get_parser(issuer: str):
+    if issuer == "cal":
+        from finparse.cards.cal import CalReportParser
+
+        return CalReportParser
+
+    from finparse.cards.isracard import IsracardReportParser
+
+    return IsracardReportParser
+
+
+def parse_once(issuer: str, path: Path, mode: str) -> dict:
+    """
+    Parse the report in this process, and measure it. Meant to be called in a fresh subprocess (see bench_parse).
+    """
+    parser = get_parser(issuer)
+    rss_before = peak_rss_kb()
+
+    start = time.perf_counter()
+    if mode == "parse_workbook":
+        rows = sum(len(card.transactions) for card in parser.parse_workbook(path))
+    elif mode == "parse_tables":
+        rows = sum(len(table) for table in parser.parse_tables(path))
+    else:
+        rows = sum(1 for _ in parser.iter_transactions(path))
+    seconds = time.perf_counter() - start
+
+    return {
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds,
+        "peak_rss_kb": peak_rss_kb(),
+        "peak_rss_delta_kb": peak_rss_kb() - rss_before,
+    }
+
+
+def bench_parse(issuer: str, path: Path, mode: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "_parse", issuer, str(path), mode],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def bench_upload(path: Path, concurrency: int, latency: float) -> dict:
+    from loguru import logger
+
+    from finparse.cards.cal import CalReportParser
+    from finparse.firefly import Firefly
+    from finparse.upload import AsyncUploader, upload_serially
+    from tests.fake_firefly import FakeFirefly
+
+    logger.remove()
+    fake = FakeFirefly(latency=latency).start()
+    try:
+        account_id = fake.add_account("Checking")
+        firefly = Firefly(fake.url, "token", pool_size=concurrency)
+        translations = CalReportParser.get_category_translations()
+        rows = CalReportParser.iter_transactions(path)
+
+        start = time.perf_counter()
+        if concurrency > 1:
+            uploader = AsyncUploader(firefly, translations, account_id, concurrency)
+            asyncio.run(uploader.upload_rows(rows))
+        else:
+            upload_serially(rows, firefly, translations, account_id)
+        seconds = time.perf_counter() - start
+    finally:
+        fake.stop()
+
+    return {
+        "rows": fake.transaction_posts,
+        "requests": sum(fake.requests.values()),
+        "seconds": seconds,
+        "rows_per_sec": fake.transaction_posts / seconds,
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    if sys.argv[1:2] == ["_parse"]:
+        _, _, issuer, path, mode = sys.argv
+        print(json.dumps(parse_once(issuer, Path(path), mode)))
+        return
+
+    arg_parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100_000])
+    arg_parser.add_argument("--issuers", nargs="+", default=list(ISSUERS))
+    arg_parser.add_argument(
+        "--upload-rows", type=int, default=2000, help="Size of the uploaded report"
+    )
+    arg_parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 8], help="Upload concurrency"
+    )
+    arg_parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=5,
+        help="Simulated Firefly III response time",
+    )
+    arg_parser.add_argument(
+        "--data-dir", type=Path, help="Where to keep the generated reports"
+    )
+    arg_parser.add_argument("--output", type=Path, help="JSON results file")
+    args = arg_parser.parse_args()
+
+    data_dir = args.data_dir or Path(tempfile.mkdtemp(prefix="finparse-bench-"))
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parse": [],
+        "upload": [],
+    }
+
+    for issuer in args.issuers:
+        suffix, write_report = ISSUERS[issuer]
+        for size in args.sizes:
+            path = data_dir / f"{issuer}-{size}{suffix}"
+            try:
+                if not path.exists():
+                    print(f"Generating {path}", file=sys.stderr)
+                    write_report(path, size)
+            except ValueError as e:
+                # Isracard exports .xls, which can't hold more than XLS_MAX_ROWS rows
+                results["parse"].append(
+                    {"issuer": issuer, "size": size, "skipped": str(e)}
+                )
+                print(f"Skipping {issuer} at {size} rows: {e}", file=sys.stderr)
+                continue
+
+            for mode in PARSE_MODES:
+                result = bench_parse(issuer, path, mode)
+                results["parse"].append(
+                    {"issuer": issuer, "size": size, "mode": mode, **result}
+                )
+                print(
+                    f"{issuer:<9} {size:>9} rows {mode:<18} "
+                    f"{result['rows_per_sec']:>10,.0f} rows/s "
+                    f"{result['peak_rss_kb'] / 1024:>8.1f} MiB peak RSS",
+                    file=sys.stderr,
+                )
+
+    upload_path = data_dir / f"cal-{args.upload_rows}.xlsx"
+    if not upload_path.exists():
+        write_cal_report(upload_path, args.upload_rows)
+
+    for concurrency in args.concurrency:
+        result = bench_upload(upload_path, concurrency, args.latency_ms / 1000)
+        results["upload"].append(
+            {"concurrency": concurrency, "latency_ms": args.latency_ms, **result}
+        )
+        print(
+            f"upload    {args.upload_rows:>9} rows concurrency {concurrency:<6} "
+            f"{result['rows_per_sec']:>10,.0f} rows/s",
+            file=sys.stderr,
+        )
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,89 +1,63 @@
-from typing import Iterable
-
 import re
-from pathlib import Path
-
-import openpyxl
-from openpyxl.cell import Cell
-from openpyxl.workbook import Workbook
-from openpyxl.worksheet.worksheet import Worksheet
-
-from finparse.models import Card, Transaction, Currency, ReportParser
-
-title_pattern = re.compile(r"לכרטיס\s(.*?)\sהמסתיים.*(\d{4})$")
-currency_pattern = re.compile(r"\[\$(.*?)]")
-
 
-def get_currency(number_formatting: str) -> Currency:
-    match = currency_pattern.search(number_formatting)
-    return Currency(match.group(1))
-
-
-class CalReportParser(ReportParser):
+from finparse.cards.spec import (
+    Columns,
+    CurrencyColumn,
+    IssuerSpec,
+    Marker,
+    SectionSpec,
+    SheetFormat,
+    SpecReportParser,
+    TableLayout,
+)
+
+CAL = IssuerSpec(
+    "Cal",
+    SheetFormat.XLSX,
+    TableLayout(
+        # The title in A1: "פירוט עסקאות לכרטיס <card name> המסתיים ב-<last 4 digits>"
+        card_title=re.compile(r"לכרטיס\s(.*?)\sהמסתיים.*(\d{4})$"),
+        section=SectionSpec(
+            "Transactions",
+            # The column titles, which start with the transaction date
+            Marker(0, suffix="עסקה"),
+            # Date, business, amount, debit amount, type, category, notes. The currencies are in the number formats
+            # of the amounts, and dates are Excel dates.
+            Columns(
+                date=0,
+                description=1,
+                foreign_amount=2,
+                foreign_currency=CurrencyColumn(2, number_format=True),
+                amount=3,
+                currency=CurrencyColumn(3, number_format=True),
+                category=5,
+                notes=6,
+            ),
+            column_titles=False,
+        ),
+    ),
+)
+
+# The categories Cal reports, by the Firefly III categories they translate to
+CATEGORY_TRANSLATIONS = {
+    "פנאי בילוי": "Leisure and Entertainment",
+    "אירועים": "Events",
+    "מזון ומשקאות": "Food and Beverages",
+    "ריהוט ובית": "Furniture and Home",
+    "טיפוח ויופי": "Beauty and Care",
+    "ציוד ומשרד": "Office Equipment",
+    "רפואה ובריאות": "Health and Wellness",
+    "מסעדות": "Restaurants",
+    "תקשורת ומחשבים": "Communication and Computers",
+    "מוסדות": "Institutions",
+    "אנרגיה": "Energy",
+    "רכב ותחבורה": "Transportation",
+}
+
+
+class CalReportParser(SpecReportParser):
+    spec = CAL
 
     @staticmethod
     def get_category_translations():
-        return {
-            "פנאי בילוי": "Leisure and Entertainment",
-            "אירועים": "Events",
-            "מזון ומשקאות": "Food and Beverages",
-            "ריהוט ובית": "Furniture and Home",
-            "טיפוח ויופי": "Beauty and Care",
-            "ציוד ומשרד": "Office Equipment",
-            "רפואה ובריאות": "Health and Wellness",
-            "מסעדות": "Restaurants",
-            "תקשורת ומחשבים": "Communication and Computers",
-            "מוסדות": "Institutions",
-            "אנרגיה": "Energy",
-            "רכב ותחבורה": "Transportation",
-        }
-
-    @staticmethod
-    def parse_workbook(workbook_path: Path) -> Iterable[Card]:
-        workbook: Workbook = openpyxl.load_workbook(
-            workbook_path, read_only=True, data_only=True, keep_links=False
-        )
-
-        sheet: Worksheet = workbook[workbook.sheetnames[0]]
-        cell: Cell = sheet["A1"]
-
-        match = title_pattern.search(cell.value)
-        card_name = match.group(1)
-        last_four_digits = match.group(2)
-
-        card = Card(name=card_name, last_4_digits=last_four_digits)
-
-        row_idx = 2
-        # Start with 2nd row, and iterate until we find the header of the transactions
-        while not str(sheet.cell(row_idx, 1).value).endswith("עסקה"):
-            row_idx += 1
-
-        # Next row_idx is the first transaction
-        row_idx += 1
-
-        row: tuple[Cell, ...]
-        for row in sheet.iter_rows(row_idx):
-            if not row[0].value:
-                break
-
-            date, description, foreign_cost, local_cost, _, category, notes = row
-            amount = str(local_cost.value)
-            currency = get_currency(local_cost.number_format)
-            foreign_amount = str(foreign_cost.value)
-            foreign_currency = get_currency(foreign_cost.number_format)
-
-            card.transactions.append(
-                Transaction(
-                    date=date.value,
-                    description=description.value,
-                    amount=amount,
-                    currency=currency,
-                    foreign_amount=foreign_amount,
-                    foreign_currency=foreign_currency,
-                    category=category.value,
-                    notes=notes.value,
-                )
-            )
-            row_idx += 1
-
-        yield card
+        return CATEGORY_TRANSLATIONS
@@ -1,143 +1,68 @@
-from datetime import datetime
-from pathlib import Path
-from typing import Iterable
-
-from finparse.models import Transaction, Card, ReportParser
-
-from loguru import logger
-import xlrd
-from xlrd.sheet import Sheet
-from xlrd.book import Book
-
-
-def _iter_transactions(sheet: Sheet, start_row: int) -> Iterable[tuple[list, int]]:
-    row = start_row
-
-    while sheet.cell_value(row, 0) and not (
-        # The last row has a date, but is a "total" footer
-        sheet.cell_value(row, 1).startswith("סך חיוב")
-        and sheet.cell_value(row, 1).endswith(":")
-    ):
-        yield sheet.row(row), row
-        row += 1
-
-    # Foreign transactions can have multiple sections (1 per foreign currency), so we do this dirty recursion
-    if sheet.cell_value(row, 2) == "TOTAL FOR DATE" and sheet.cell_value(row + 1, 0):
-        yield from _iter_transactions(sheet, row + 1)
-
-
-def parse_local_transactions(
-    sheet: Sheet, starting_idx: int
-) -> tuple[list[Transaction], int]:
-    row_idx = starting_idx
-    transactions = []
-
-    for row, row_idx in _iter_transactions(sheet, row_idx):
-        (
-            _date,
-            business,
-            amount,
-            currency,
-            debit_amount,
-            debit_currency,
-            _id,
-            notes,
-        ) = list(map(lambda c: c.value, row))
-
-        transactions.append(
-            Transaction(
-                date=datetime.strptime(_date, "%d/%m/%Y"),
-                description=business,
-                amount=str(amount),
-                currency=currency,
-                foreign_amount=str(debit_amount),
-                foreign_currency=debit_currency,
-                id=_id,
-                notes=notes,
-            )
-        )
-
-    return transactions, row_idx + 1
-
-
-def parse_foreign_transactions(sheet: Sheet, start_row: int):
-    row_idx = start_row
-    transactions = []
-
-    for row, row_idx in _iter_transactions(sheet, row_idx):
-        (
-            _date,
-            _,
-            business,
-            foreign_amount,
-            foreign_currency,
-            amount,
-            currency,
-            _,
-        ) = list(map(lambda c: c.value, row))
-
-        transactions.append(
-            Transaction(
-                date=datetime.strptime(_date, "%d/%m/%Y"),
-                description=business,
-                amount=str(amount),
-                currency=currency,
-                foreign_amount=str(foreign_amount),
-                foreign_currency=foreign_currency,
-            )
-        )
-
-    return transactions, row_idx + 1
-
-
-def parse_card(sheet: Sheet, starting_idx: int) -> tuple[Card, int]:
-    row = starting_idx
-    card_data = {}
-    card_header: str = sheet.cell_value(row, 0)
-
-    if card_header.endswith("*"):
-        card_header = card_header.removesuffix(" *")
-        card_data["enabled"] = False
-
-    name, last_4_digits = card_header.split(" - ")
-    card = Card(name=name, last_4_digits=last_4_digits)
-
-    row += 1
-    while cell_value := sheet.cell_value(row, 0):
-        if cell_value.startswith("עסקאות בארץ"):
-            transactions, row = parse_local_transactions(sheet, row + 2)
-            card.transactions.extend(transactions)
-        elif cell_value.startswith("עסקאות בח"):
-            transactions, row = parse_foreign_transactions(sheet, row + 2)
-            card.transactions.extend(transactions)
-        else:
-            logger.debug(f"Skipping cell value: {cell_value}")
-            break
-
-        row += 1
-
-    return card, row
-
-
-class IsracardReportParser(ReportParser):
-    @staticmethod
-    def parse_workbook(workbook_path: Path) -> Iterable[Card]:
-        book: Book = xlrd.open_workbook(workbook_path)
-        sh: Sheet = book.sheet_by_index(0)
-
-        # Skip first row which is empty
-        curr_row = 1
-
-        logger.info(f"Parsing card for {sh.cell_value(curr_row, 0)}")
-        # Skip empty row after name
-        curr_row += 1
-
-        while curr_row < sh.nrows:
-
-            if (first := sh.cell_value(curr_row, 0)) and " - " in first:
-                logger.info(f"Parsing card (row {curr_row}) for: {first}")
-                card, curr_row = parse_card(sh, curr_row)
-                yield card
-                logger.debug(f"Ended at ({curr_row}, 0): {sh.cell_value(curr_row, 0)}")
-
-            curr_row += 1
+import re
+
+from finparse.cards.spec import (
+    Columns,
+    CurrencyColumn,
+    IssuerSpec,
+    Marker,
+    SectionedLayout,
+    SectionSpec,
+    SheetFormat,
+    SpecReportParser,
+)
+
+DATE_FORMAT = "%d/%m/%Y"
+
+
+class Section:
+    # Date, business, amount, currency, debit amount, debit currency, voucher ID, notes
+    Local = SectionSpec(
+        "Local",
+        Marker(0, "עסקאות בארץ"),
+        Columns(
+            date=0,
+            description=1,
+            amount=2,
+            currency=CurrencyColumn(3),
+            foreign_amount=4,
+            foreign_currency=CurrencyColumn(5),
+            id=6,
+            notes=7,
+            date_format=DATE_FORMAT,
+        ),
+    )
+    # Date, billing date, business, amount, currency, debit amount, debit currency
+    Foreign = SectionSpec(
+        "Foreign",
+        Marker(0, "עסקאות בח"),
+        Columns(
+            date=0,
+            description=2,
+            foreign_amount=3,
+            foreign_currency=CurrencyColumn(4),
+            amount=5,
+            currency=CurrencyColumn(6),
+            date_format=DATE_FORMAT,
+        ),
+    )
+
+
+ISRACARD = IssuerSpec(
+    "Isracard",
+    SheetFormat.XLS,
+    SectionedLayout(
+        # "<name> - <last 4 digits>", with a " *" suffix on some cards
+        card_header=re.compile(r"^(.*?) - (.*?)(?: \*)?$"),
+        sections=(Section.Local, Section.Foreign),
+        # The footer of the local section has a date, but isn't a transaction
+        footer=Marker(1, "סך חיוב", ":"),
+        # The foreign section has a part per foreign currency, each ending with this
+        subtotal=Marker(2, "TOTAL FOR DATE"),
+        # The first row is empty, the second has the name of the card holder, and cards start after an empty row
+        start_row=2,
+    ),
+)
+
+
+class IsracardReportParser(SpecReportParser):
+    spec = ISRACARD
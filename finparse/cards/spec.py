@@ -0,0 +1,554 @@
+"""
+Declarative specs of the reports of issuers, which their parsers are generated from.
+
+A spec describes the layout of a report: its file format, the markers where cards and sections of transactions start
+and end, and the column every field of a transaction is read from (along with its date format and where its currency
+is). The columns of each section are compiled once into functions specialized to them, so a parser generated from a
+spec costs no more per row than a hand-written one.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum, auto
+from functools import cached_property, lru_cache
+from itertools import repeat
+from pathlib import Path
+from typing import Callable, ContextManager, Iterator, Sequence, TYPE_CHECKING
+
+from loguru import logger
+
+from finparse.metrics import metrics
+from finparse.models import (
+    CURRENCY_BY_SYMBOL,
+    Card,
+    Currency,
+    ReportParser,
+    TransactionRow,
+    TransactionTable,
+)
+from finparse.workbooks import open_xls_sheet, open_xlsx_sheet
+
+if TYPE_CHECKING:
+    from finparse.watermarks import Watermarks
+
+currency_pattern = re.compile(r"\[\$(.*?)]")
+
+
+@lru_cache
+def date_parser(date_format: str) -> Callable[[str], datetime]:
+    @lru_cache(maxsize=1024)
+    def parse_date(value: str) -> datetime:
+        # A report spans about a month, so the same few dates repeat on most rows
+        return datetime.strptime(value, date_format)
+
+    return parse_date
+
+
+def excel_datetime(value) -> datetime:
+    # Dates are converted by the spreadsheet library, unless a cell isn't formatted as a date
+    if isinstance(value, datetime):
+        return value
+
+    from openpyxl.utils.datetime import from_excel
+
+    return from_excel(value)
+
+
+@lru_cache(maxsize=64)
+def currency_from_format(number_format: str) -> Currency:
+    # A report uses a handful of number formats, so this is resolved once per distinct format
+    match = currency_pattern.search(number_format)
+    return CURRENCY_BY_SYMBOL[match.group(1)]
+
+
+class SheetFormat(Enum):
+    # Read with xlrd, as rows of values
+    XLS = "xls"
+    # Read with openpyxl, as rows of cells, which have number formats
+    XLSX = "xlsx"
+
+    @property
+    def cells(self) -> bool:
+        return self is SheetFormat.XLSX
+
+    def open(self, path: Path) -> ContextManager:
+        return open_xlsx_sheet(path) if self.cells else open_xls_sheet(path)
+
+    def iter_rows(
+        self, sheet, start_row: int, width: int
+    ) -> Iterator[tuple[int, Sequence]]:
+        """
+        (index, row) pairs of the rows of the sheet from start_row, both 0-based
+        """
+        if self.cells:
+            return enumerate(
+                sheet.iter_rows(min_row=start_row + 1, max_col=width), start_row
+            )
+        return ((i, sheet.row_values(i)) for i in range(start_row, sheet.nrows))
+
+    def values(self, row: Sequence) -> Sequence:
+        return [cell.value for cell in row] if self.cells else row
+
+    def cell_value(self, sheet, row: int, column: int):
+        if self.cells:
+            return sheet.cell(row + 1, column + 1).value
+        return sheet.cell_value(row, column)
+
+
+@dataclass(frozen=True)
+class Marker:
+    """
+    Text that a cell starts (and ends) with, marking the rows that delimit the parts of a report
+    """
+
+    column: int
+    prefix: str = ""
+    suffix: str = ""
+
+    def matches(self, values: Sequence) -> bool:
+        if len(values) <= self.column:
+            return False
+        value = values[self.column]
+        return (
+            isinstance(value, str)
+            and value.startswith(self.prefix)
+            and value.endswith(self.suffix)
+        )
+
+
+@dataclass(frozen=True)
+class CurrencyColumn:
+    column: int
+    # The symbol is in the number format of the cell ("[$₪] #,##0.00"), rather than in its value
+    number_format: bool = False
+
+
+@dataclass(frozen=True)
+class Columns:
+    """
+    The column that each field of a transaction is read from, in the rows of a section
+    """
+
+    date: int
+    description: int
+    amount: int
+    currency: CurrencyColumn
+    foreign_amount: int | None = None
+    foreign_currency: CurrencyColumn | None = None
+    category: int | None = None
+    id: int | None = None
+    notes: int | None = None
+    # The strptime format of the dates, or None if they're Excel dates
+    date_format: str | None = None
+
+    @property
+    def width(self) -> int:
+        used = [
+            c.column if isinstance(c, CurrencyColumn) else c
+            for c in vars(self).values()
+            if isinstance(c, (int, CurrencyColumn))
+        ]
+        return max(used) + 1
+
+
+@dataclass(frozen=True)
+class CompiledColumns:
+    # Builds the TransactionRow of a row
+    row: Callable[[Sequence], TransactionRow]
+    # The values that a row adds to a table, which fill_table converts a whole column at a time
+    raw: Callable[[Sequence], tuple]
+    fill_table: Callable[[list[tuple], TransactionTable], None]
+    source: str
+
+
+# Converter -> (the expression that converts a value, the function that converts a column)
+_CONVERTERS = {
+    "str": ("str({})", "str"),
+    "parse_date": ("parse_date({})", "parse_date"),
+    "currency_by_symbol": ("CURRENCY_BY_SYMBOL[{}]", "CURRENCY_BY_SYMBOL.__getitem__"),
+    "currency_from_format": ("currency_from_format({})", "currency_from_format"),
+}
+
+
+def _field_sources(columns: Columns, cells: bool) -> dict[str, tuple | None]:
+    """
+    The expression that reads each field of TransactionRow from a row, and the name of its converter
+    """
+
+    def value(column: int) -> str:
+        return f"row[{column}].value" if cells else f"row[{column}]"
+
+    def plain(column: int | None):
+        return None if column is None else (value(column), None)
+
+    def amount(column: int | None):
+        return None if column is None else (value(column), "str")
+
+    def currency(source: CurrencyColumn | None):
+        if source is None:
+            return None
+        if not source.number_format:
+            return value(source.column), "currency_by_symbol"
+        if not cells:
+            raise ValueError(f"Column {source.column} has no number format to read")
+        return f"row[{source.column}].number_format", "currency_from_format"
+
+    return {
+        "date": (value(columns.date), "parse_date"),
+        "description": plain(columns.description),
+        "amount": amount(columns.amount),
+        "currency": currency(columns.currency),
+        "foreign_amount": amount(columns.foreign_amount),
+        "foreign_currency": currency(columns.foreign_currency),
+        "category": plain(columns.category),
+        "id": plain(columns.id),
+        "notes": plain(columns.notes),
+    }
+
+
+def compile_columns(columns: Columns, cells: bool) -> CompiledColumns:
+    """
+    Generate the functions that read the columns from rows, like dataclasses generate __init__, so reading a row is a
+    single call with every access and conversion inlined, rather than a loop over the fields
+    """
+    sources = _field_sources(columns, cells)
+
+    row_args, raw_values, fill_lines = [], [], []
+    for name, source in sources.items():
+        if source is None:
+            row_args.append("None")
+            fill_lines.append(f"table.{name}.extend(repeat(None, len(raws)))")
+            continue
+
+        expression, converter = source
+        column = f"c{len(raw_values)}"
+        raw_values.append(expression)
+        if converter is None:
+            row_args.append(expression)
+            fill_lines.append(f"table.{name}.extend({column})")
+        else:
+            convert_value, convert_column = _CONVERTERS[converter]
+            row_args.append(convert_value.format(expression))
+            fill_lines.append(f"table.{name}.extend(map({convert_column}, {column}))")
+
+    columns_names = ", ".join(f"c{i}" for i in range(len(raw_values)))
+    source = "\n".join(
+        [
+            "def row(row):",
+            f"    return TransactionRow({', '.join(row_args)})",
+            "",
+            "def raw(row):",
+            f"    return ({', '.join(raw_values)},)",
+            "",
+            "def fill_table(raws, table):",
+            "    if not raws:",
+            "        return",
+            f"    {columns_names}, = zip(*raws)",
+            *(f"    {line}" for line in fill_lines),
+        ]
+    )
+
+    namespace = {
+        "TransactionRow": TransactionRow,
+        "CURRENCY_BY_SYMBOL": CURRENCY_BY_SYMBOL,
+        "currency_from_format": currency_from_format,
+        "parse_date": (
+            excel_datetime
+            if columns.date_format is None
+            else date_parser(columns.date_format)
+        ),
+        "repeat": repeat,
+    }
+    exec(compile(source, "<compiled columns>", "exec"), namespace)
+    return CompiledColumns(
+        namespace["row"], namespace["raw"], namespace["fill_table"], source
+    )
+
+
+@dataclass(frozen=True)
+class SectionSpec:
+    name: str
+    # The row that starts the section
+    title: Marker
+    columns: Columns
+    # The title is followed by a row of column titles (otherwise, the title is the row of column titles)
+    column_titles: bool = True
+
+
+# Events of the sheet, in the order they appear in it
+
+
+@dataclass(slots=True)
+class CardHeader:
+    row: int
+    name: str
+    last_4_digits: str
+
+
+@dataclass(slots=True)
+class SectionStart:
+    row: int
+    section: SectionSpec
+
+
+@dataclass(slots=True)
+class SectionRow:
+    row: int
+    section: SectionSpec
+    # The values of the row, or its cells in formats that have them
+    values: Sequence
+
+
+@dataclass(slots=True)
+class SectionTotal:
+    row: int
+    section: SectionSpec
+
+
+SheetEvent = CardHeader | SectionStart | SectionRow | SectionTotal
+
+
+@dataclass(frozen=True)
+class TableLayout:
+    """
+    A single card, named in the title of the sheet (its first cell), whose transactions follow the row that starts
+    the section, up to the first empty row
+    """
+
+    # Matches the name of the card and its last 4 digits
+    card_title: re.Pattern
+    section: SectionSpec
+
+    @property
+    def sections(self) -> tuple[SectionSpec, ...]:
+        return (self.section,)
+
+    def scan(self, sheet, sheet_format: SheetFormat) -> Iterator[SheetEvent]:
+        match = self.card_title.search(sheet_format.cell_value(sheet, 0, 0))
+        yield CardHeader(0, match.group(1), match.group(2))
+
+        section = self.section
+        rows = sheet_format.iter_rows(sheet, 1, section.columns.width)
+        for row_idx, row in rows:
+            if section.title.matches(sheet_format.values(row)):
+                yield SectionStart(row_idx, section)
+                if section.column_titles:
+                    next(rows, None)
+                break
+
+        cells = sheet_format.cells
+        for row_idx, row in rows:
+            if not (row[0].value if cells else row[0]):
+                yield SectionTotal(row_idx, section)
+                break
+            yield SectionRow(row_idx, section, row)
+
+
+class _State(Enum):
+    # Between cards
+    Outside = auto()
+    # In a card, where a section title (or the card's end) is expected
+    Card = auto()
+    # The row after a section title, which has the column titles
+    ColumnTitles = auto()
+    # In the transactions of a section
+    Section = auto()
+    # After a subtotal row, which is followed by more transactions of the section (or the card's end)
+    AfterTotal = auto()
+
+
+@dataclass(frozen=True)
+class SectionedLayout:
+    """
+    Cards that each start with a header row, followed by their sections. A section starts with a title, and its
+    transactions end with a footer or an empty row. A section may be split into parts (e.g. a part per currency),
+    each ending with a subtotal row.
+    """
+
+    # Matches the first cell of the header of a card, with the name of the card and its last 4 digits
+    card_header: re.Pattern
+    sections: tuple[SectionSpec, ...]
+    footer: Marker
+    subtotal: Marker
+    # The rows before the first card
+    start_row: int = 0
+
+    def scan(
+        self, sheet, sheet_format: SheetFormat, start_row: int | None = None
+    ) -> Iterator[SheetEvent]:
+        """
+        Classify every row of the sheet exactly once, and yield the events of the cards and sections in it
+        """
+        if start_row is None:
+            start_row = self.start_row
+        footer, subtotal, sections = self.footer, self.subtotal, self.sections
+        width = max(section.columns.width for section in sections)
+        cells = sheet_format.cells
+        state = _State.Outside
+        section = None
+
+        for row_idx, row in sheet_format.iter_rows(sheet, start_row, width):
+            values = [cell.value for cell in row] if cells else row
+            first = values[0]
+
+            if state in (_State.Section, _State.AfterTotal):
+                is_footer = footer.matches(values)
+                if first and not is_footer:
+                    yield SectionRow(row_idx, section, row)
+                    state = _State.Section
+                    continue
+
+                if state is _State.Section:
+                    if is_footer:
+                        yield SectionTotal(row_idx, section)
+                        state = _State.Card
+                    elif subtotal.matches(values):
+                        yield SectionTotal(row_idx, section)
+                        state = _State.AfterTotal
+                    else:
+                        state = _State.Card
+                    continue
+
+            elif state is _State.ColumnTitles:
+                state = _State.Section
+                continue
+
+            elif state is _State.Card and isinstance(first, str) and first:
+                section = next((s for s in sections if s.title.matches(values)), None)
+                if section is not None:
+                    yield SectionStart(row_idx, section)
+                    state = (
+                        _State.ColumnTitles if section.column_titles else _State.Section
+                    )
+                    continue
+
+                logger.debug(f"Skipping cell value: {first}")
+
+            # Between cards, or at the end of one
+            state = _State.Outside
+            if isinstance(first, str) and (match := self.card_header.search(first)):
+                yield CardHeader(row_idx, match.group(1), match.group(2))
+                state = _State.Card
+
+
+Layout = TableLayout | SectionedLayout
+
+
+@dataclass(frozen=True)
+class IssuerSpec:
+    name: str
+    format: SheetFormat
+    layout: Layout
+
+    @cached_property
+    def compiled(self) -> dict[str, CompiledColumns]:
+        # By section name, which is cheaper to look up by than the section
+        return {
+            section.name: compile_columns(section.columns, self.format.cells)
+            for section in self.layout.sections
+        }
+
+    def card(self, header: CardHeader) -> Card:
+        return Card(
+            name=header.name, last_4_digits=header.last_4_digits, issuer=self.name
+        )
+
+    def iter_records(self, workbook_path: Path) -> Iterator[Card | TransactionRow]:
+        extract_row = {name: c.row for name, c in self.compiled.items()}
+        with self.format.open(workbook_path) as sheet:
+            for event in self.layout.scan(sheet, self.format):
+                match event:
+                    case SectionRow():
+                        yield extract_row[event.section.name](event.values)
+                    case CardHeader():
+                        logger.info(
+                            f"Parsing card (row {event.row}) for: {event.name} - {event.last_4_digits}"
+                        )
+                        yield self.card(event)
+                    case SectionStart() | SectionTotal():
+                        logger.debug(
+                            f"{type(event).__name__} (row {event.row}): {event.section.name}"
+                        )
+
+    def iter_section_rows(
+        self, workbook_path: Path
+    ) -> Iterator[tuple[Card, SectionRow]]:
+        """
+        (card, row) pairs of the rows of the report, before their transactions are extracted (see extract_row)
+        """
+        card = None
+        with self.format.open(workbook_path) as sheet:
+            for event in self.layout.scan(sheet, self.format):
+                if isinstance(event, SectionRow):
+                    yield card, event
+                elif isinstance(event, CardHeader):
+                    logger.info(
+                        f"Parsing card (row {event.row}) for: {event.name} - {event.last_4_digits}"
+                    )
+                    card = self.card(event)
+
+    def extract_row(self, event: SectionRow) -> TransactionRow:
+        return self.compiled[event.section.name].row(event.values)
+
+    def iter_tables(self, workbook_path: Path) -> Iterator[TransactionTable]:
+        """
+        Read the transactions of each section into tuples of their raw values, and convert them a column at a time
+        """
+        compiled = self.compiled
+        table, section, raws = None, None, []
+
+        def fill():
+            if raws:
+                compiled[section.name].fill_table(raws, table)
+                raws.clear()
+
+        with self.format.open(workbook_path) as sheet:
+            for event in self.layout.scan(sheet, self.format):
+                if isinstance(event, SectionRow):
+                    if event.section is not section:
+                        fill()
+                        section = event.section
+                    raws.append(compiled[section.name].raw(event.values))
+                elif isinstance(event, CardHeader):
+                    fill()
+                    if table is not None:
+                        yield table
+                    table = TransactionTable(self.card(event))
+
+        fill()
+        if table is not None:
+            yield table
+
+
+class SpecReportParser(ReportParser):
+    """
+    A parser generated from the spec of an issuer. Issuers that subclass it only need to set their spec.
+    """
+
+    spec: IssuerSpec
+
+    @classmethod
+    def iter_records(cls, workbook_path: Path) -> Iterator[Card | TransactionRow]:
+        return cls.spec.iter_records(workbook_path)
+
+    @classmethod
+    def iter_transactions(
+        cls, workbook_path: Path, watermarks: "Watermarks | None" = None
+    ) -> Iterator[tuple[Card, TransactionRow]]:
+        if watermarks is None:
+            return super().iter_transactions(workbook_path)
+
+        # The rows under the watermarks are skipped before their transactions are extracted
+        pairs = watermarks.filter_new(
+            lambda: cls.spec.iter_section_rows(workbook_path),
+            cls.spec.extract_row,
+            lambda event: event.section.name,
+        )
+        return cls._checked(metrics.time_iter("parse", pairs))
+
+    @classmethod
+    def parse_tables(cls, workbook_path: Path) -> Iterator[TransactionTable]:
+        for table in metrics.time_iter("parse", cls.spec.iter_tables(workbook_path)):
+            metrics.incr("rows_parsed", len(table))
+            yield table
@@ -0,0 +1,168 @@
+"""
+Exporting parsed transactions to files, for analysis or bulk loading, without going through Firefly III
+"""
+
+import csv
+import json
+from abc import ABC, abstractmethod
+from enum import Enum
+from pathlib import Path
+from typing import IO, Iterable, TYPE_CHECKING
+
+from finparse.utils import batched
+
+if TYPE_CHECKING:
+    from finparse.models import AnyTransaction, Card
+
+COLUMNS = (
+    "card",
+    "last_4_digits",
+    "date",
+    "description",
+    "amount",
+    "currency",
+    "foreign_amount",
+    "foreign_currency",
+    "category",
+    "id",
+    "notes",
+)
+
+
+def export_record(card: "Card", transaction: "AnyTransaction") -> dict:
+    return {
+        "card": card.name,
+        "last_4_digits": card.last_4_digits,
+        "date": transaction.date.date(),
+        "description": transaction.description,
+        "amount": transaction.amount,
+        "currency": transaction.currency.name,
+        "foreign_amount": transaction.foreign_amount,
+        "foreign_currency": (
+            transaction.foreign_currency.name if transaction.foreign_currency else None
+        ),
+        "category": transaction.category,
+        "id": transaction.id,
+        "notes": transaction.notes,
+    }
+
+
+class ExportWriter(ABC):
+    """
+    Writes chunks of records to a file, so only a single chunk is held in memory at a time
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    @abstractmethod
+    def write(self, records: list[dict]):
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class CsvWriter(ExportWriter):
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self._file: IO = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, COLUMNS)
+        self._writer.writeheader()
+
+    def write(self, records: list[dict]):
+        self._writer.writerows(records)
+
+    def close(self):
+        self._file.close()
+
+
+class JsonlWriter(ExportWriter):
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self._file: IO = open(path, "w", encoding="utf-8")
+
+    def write(self, records: list[dict]):
+        self._file.writelines(
+            json.dumps(record, ensure_ascii=False, default=str) + "\n"
+            for record in records
+        )
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter(ExportWriter):
+    """
+    Writes every chunk as a row group. Requires pyarrow, which is an optional dependency (the parquet extra)
+    """
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError(
+                "Exporting to Parquet requires pyarrow (pip install 'finparse[parquet]')"
+            ) from e
+
+        self._pa = pa
+        self._schema = pa.schema(
+            [(c, pa.date32() if c == "date" else pa.string()) for c in COLUMNS]
+        )
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, records: list[dict]):
+        self._writer.write_table(
+            self._pa.Table.from_pylist(records, schema=self._schema)
+        )
+
+    def close(self):
+        self._writer.close()
+
+
+class ExportFormat(str, Enum):
+    csv = "csv"
+    jsonl = "jsonl"
+    parquet = "parquet"
+
+    @classmethod
+    def from_path(cls, path: Path) -> "ExportFormat":
+        try:
+            return cls(path.suffix.removeprefix(".").lower())
+        except ValueError:
+            raise ValueError(
+                f"Can't tell the export format of {path.name}, use one of: "
+                f"{', '.join(f.value for f in cls)}"
+            ) from None
+
+    @property
+    def writer(self) -> type[ExportWriter]:
+        return {
+            ExportFormat.csv: CsvWriter,
+            ExportFormat.jsonl: JsonlWriter,
+            ExportFormat.parquet: ParquetWriter,
+        }[self]
+
+
+def export_rows(
+    rows: Iterable[tuple["Card", "AnyTransaction"]],
+    writer: ExportWriter,
+    chunk_size: int = 10_000,
+) -> int:
+    """
+    Stream the rows to the writer in chunks, and return the number of rows written
+    """
+    written = 0
+    for chunk in batched(rows, chunk_size):
+        writer.write([export_record(card, transaction) for card, transaction in chunk])
+        written += len(chunk)
+    return written
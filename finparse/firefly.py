@@ -1,18 +1,36 @@
+import hashlib
+from datetime import datetime, timedelta
 from enum import Enum
-from typing import Self
+from itertools import zip_longest
+from pathlib import Path
+from typing import Iterator, Self
 
 from firefly_iii_client import (
+    CategoryRead,
+    RuleGroupRead,
     RuleGroupStore,
     RuleRead,
 )
 from loguru import logger
 import firefly_iii_client as firefly3
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+
+from finparse.metrics import metrics
+from finparse.matcher import CategoryMatcher, MatchType
+from finparse.paths import app_dir
 
 
 class CategoryRule(BaseModel):
     id: str
     activators: list[str] = []
+    # The trigger type (description_contains, description_is...) of each activator
+    trigger_types: list[str] = []
+    # Whether each activator's trigger is active
+    trigger_active: list[bool] = []
+    # Inactive rules never fire
+    active: bool = True
+    # Strict rules fire only if all of their triggers match, rather than any of them
+    strict: bool = False
 
     @classmethod
     def from_rule(cls, rule: RuleRead) -> Self:
@@ -23,12 +41,36 @@ class CategoryRule(BaseModel):
             id=rule.id,
             # This assumes that all triggers are of type DESCRIPTION_* (like DESCRIPTION_IS)
             activators=[trigger.value for trigger in rule.attributes.triggers],
+            trigger_types=[trigger.type.value for trigger in rule.attributes.triggers],
+            trigger_active=[
+                trigger.active is not False for trigger in rule.attributes.triggers
+            ],
+            active=rule.attributes.active is not False,
+            # Rules are strict unless they say otherwise, like in Firefly III
+            strict=rule.attributes.strict is not False,
         )
 
+    def triggers(self) -> Iterator[tuple[str, MatchType]]:
+        """
+        The active triggers of the rule
+        """
+        for activator, trigger_type, active in zip_longest(
+            self.activators,
+            self.trigger_types[: len(self.activators)],
+            self.trigger_active[: len(self.activators)],
+        ):
+            if active is False:
+                continue
+            try:
+                yield activator, MatchType(trigger_type or MatchType.Contains.value)
+            except ValueError:
+                logger.warning(f"Ignoring unsupported trigger {trigger_type!r}")
+
 
 class CategoryRuleType(Enum):
-    DescriptionRule = "Finparse: Description Rules"
+    # In the order the rule groups should be applied in, so description rules override category translations
     TranslationRule = "Finparse: Category Translations"
+    DescriptionRule = "Finparse: Description Rules"
 
 
 class Category(BaseModel):
@@ -53,33 +95,176 @@ class Category(BaseModel):
                 self.translation_rules.append(rule_obj)
 
 
+class MetadataSnapshot(BaseModel):
+    fingerprint: str
+    saved_at: datetime
+    categories: list[Category]
+
+
+def metadata_fingerprint(
+    categories: list[CategoryRead], rule_groups: list[RuleGroupRead]
+) -> str:
+    """
+    Fingerprint of the categories and rule groups, which changes whenever one of them is added, removed or updated
+    """
+    parts = sorted(
+        (c.id, c.attributes.name, str(c.attributes.updated_at)) for c in categories
+    ) + sorted(
+        (rg.id, rg.attributes.title, str(rg.attributes.updated_at))
+        for rg in rule_groups
+    )
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+class MetadataCache:
+    """
+    On-disk snapshot of the categories and their rules, so we don't have to crawl every rule on every run.
+
+    A snapshot is used only while it's younger than the TTL, and only if the categories and rule groups weren't
+    updated since it was saved. Rule edits that don't touch their rule group are picked up once the TTL expires.
+    """
+
+    def __init__(
+        self,
+        firefly_host: str,
+        ttl: timedelta = timedelta(hours=12),
+        cache_dir: Path | None = None,
+    ):
+        host_hash = hashlib.sha256(firefly_host.encode()).hexdigest()[:16]
+        self.path = (cache_dir or app_dir() / "metadata") / f"{host_hash}.json"
+        self.ttl = ttl
+
+    def load(self, fingerprint: str) -> MetadataSnapshot | None:
+        try:
+            snapshot = MetadataSnapshot.model_validate_json(self.path.read_bytes())
+        except (OSError, ValidationError):
+            logger.debug(f"No usable metadata snapshot at {self.path}")
+            return None
+
+        if datetime.now() - snapshot.saved_at > self.ttl:
+            logger.info("Metadata snapshot expired")
+            return None
+        if snapshot.fingerprint != fingerprint:
+            logger.info("Categories or rule groups changed since the metadata snapshot")
+            return None
+
+        return snapshot
+
+    def save(self, fingerprint: str, categories: list[Category]):
+        snapshot = MetadataSnapshot(
+            fingerprint=fingerprint, saved_at=datetime.now(), categories=categories
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(snapshot.model_dump_json())
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
 class Categories:
 
     def __init__(
         self,
         categories_api: firefly3.CategoriesApi,
         rule_group_api: firefly3.RuleGroupsApi,
+        cache: MetadataCache | None = None,
     ):
         self.by_id: dict[str, Category] = {}
         self.id_by_name: dict[str, str] = {}
+        self.rule_group_ids: dict[CategoryRuleType, str] = {}
+        self.rule_group_orders: dict[CategoryRuleType, int] = {}
+        self.matcher = CategoryMatcher()
 
         self._categories_api = categories_api
+        self._rule_groups_api = rule_group_api
 
-        for firefly_category in self._categories_api.list_category().data:
+        firefly_categories = self._categories_api.list_category().data
+        rule_groups = self._rule_groups_api.list_rule_group().data
+        fingerprint = metadata_fingerprint(firefly_categories, rule_groups)
+
+        if cache and (snapshot := cache.load(fingerprint)):
+            for category in snapshot.categories:
+                self[category.id] = category
+            logger.success(f"Found categories: {list(self.id_by_name.keys())}")
+            logger.info("Loaded category rules from the metadata snapshot")
+            self.rule_group_ids = self._rule_group_ids(rule_groups)
+            self.rule_group_orders = self._rule_group_orders(rule_groups)
+            self._compile_matcher(rule_groups)
+            return
+
+        for firefly_category in firefly_categories:
             self[firefly_category.id] = Category(
                 id=firefly_category.id, name=firefly_category.attributes.name
             )
         logger.success(f"Found categories: {list(self.id_by_name.keys())}")
 
-        self._rule_groups_api = rule_group_api
-        self._init_rule_group()
-
-    def _init_rule_group(self):
-        rule_groups = self._rule_groups_api.list_rule_group()
+        self._init_rule_group(rule_groups)
+        self.rule_group_ids = self._rule_group_ids(rule_groups)
+        self.rule_group_orders = self._rule_group_orders(rule_groups)
+
+        if cache:
+            # Rule groups we just created are part of the fingerprint from now on
+            fingerprint = metadata_fingerprint(firefly_categories, rule_groups)
+            cache.save(fingerprint, list(self.by_id.values()))
+
+        self._compile_matcher(rule_groups)
+
+    def _compile_matcher(self, rule_groups: list[RuleGroupRead]):
+        if any(
+            rg.attributes.title == CategoryRuleType.DescriptionRule.value
+            and rg.attributes.active is False
+            for rg in rule_groups
+        ):
+            logger.info("The description rule group is inactive")
+            self.matcher = CategoryMatcher()
+            return
+
+        rules = []
+        for category in self.by_id.values():
+            for rule in category.description_rules:
+                if not rule.active:
+                    continue
+                triggers = list(rule.triggers())
+                if rule.strict and len(triggers) > 1:
+                    # The matcher fires on any trigger, so these are only applied by Firefly III itself
+                    logger.debug(
+                        f"Not matching strict rule {rule.id} ({category.name}) locally"
+                    )
+                    continue
+                rules.extend(
+                    (activator, match_type, category.name)
+                    for activator, match_type in triggers
+                )
 
+        self.matcher = CategoryMatcher(rules)
+        logger.info(f"Compiled {len(self.matcher)} description rule activators")
+
+    @staticmethod
+    def _rule_group_ids(
+        rule_groups: list[RuleGroupRead],
+    ) -> dict[CategoryRuleType, str]:
+        titles = {rule_type.value for rule_type in CategoryRuleType}
+        return {
+            CategoryRuleType(rg.attributes.title): rg.id
+            for rg in rule_groups
+            if rg.attributes.title in titles
+        }
+
+    @staticmethod
+    def _rule_group_orders(
+        rule_groups: list[RuleGroupRead],
+    ) -> dict[CategoryRuleType, int]:
+        titles = {rule_type.value for rule_type in CategoryRuleType}
+        return {
+            CategoryRuleType(rg.attributes.title): rg.attributes.order
+            for rg in rule_groups
+            if rg.attributes.title in titles and rg.attributes.order is not None
+        }
+
+    def _init_rule_group(self, rule_groups: list[RuleGroupRead]):
         required_rule_groups = set(rule_group for rule_group in CategoryRuleType)
 
-        for rg in rule_groups.data:
+        for rg in rule_groups:
             try:
                 category_rule_type = CategoryRuleType(rg.attributes.title)
                 required_rule_groups.remove(category_rule_type)
@@ -93,13 +278,15 @@ class Categories:
                 self[rule_category].add_rule(category_rule_type, rule)
 
         logger.info(f"Creating rule groups: {required_rule_groups}")
-        for rg in required_rule_groups:
-            self._rule_groups_api.store_rule_group(
+        # Firefly III applies the groups in the order they're created in
+        for rg in (t for t in CategoryRuleType if t in required_rule_groups):
+            created = self._rule_groups_api.store_rule_group(
                 RuleGroupStore(
                     active=True,
                     title=rg.value,
                 )
             )
+            rule_groups.append(created.data)
 
     def get(self, name: str) -> Category | None:
         return self.by_id.get(self.id_by_name.get(name))
@@ -121,12 +308,65 @@ class Categories:
         return item in self.id_by_name
 
 
+def normalize_category(name: str) -> str:
+    # Case and whitespace insensitive, so " food and  beverages" finds "Food and Beverages"
+    return " ".join(name.split()).casefold()
+
+
+class CategoryLookup:
+    """
+    Category IDs by category name, and by the category the issuer reported (through the category translations).
+
+    Built once per run, so rows are categorized without Firefly III resolving category names, which creates a new
+    category for every misspelled one. Keys are both exact and normalized, so most lookups don't normalize.
+    """
+
+    def __init__(self, categories: Categories, translations: dict[str, str]):
+        self.id_by_name: dict[str, str] = {}
+        for name, category_id in categories.id_by_name.items():
+            self.id_by_name.setdefault(normalize_category(name), category_id)
+            self.id_by_name[name] = category_id
+
+        self.id_by_reported: dict[str, str] = {}
+        for reported_category, name in translations.items():
+            if (category_id := self.by_name(name)) is None:
+                logger.warning(
+                    f"No {name!r} category in Firefly III, transactions reported as "
+                    f"{reported_category!r} won't be categorized by it"
+                )
+                continue
+            self.id_by_reported[normalize_category(reported_category)] = category_id
+            self.id_by_reported[reported_category] = category_id
+
+    def by_name(self, name: str) -> str | None:
+        return self.id_by_name.get(name) or self.id_by_name.get(
+            normalize_category(name)
+        )
+
+    def by_reported(self, reported_category: str | None) -> str | None:
+        if not reported_category:
+            return None
+        return self.id_by_reported.get(reported_category) or self.id_by_reported.get(
+            normalize_category(reported_category)
+        )
+
+
 class Firefly:
-    def __init__(self, firefly_host: str, token: str):
+    def __init__(
+        self,
+        firefly_host: str,
+        token: str,
+        pool_size: int | None = None,
+        metadata_cache: MetadataCache | None = None,
+    ):
         configuration = firefly3.configuration.Configuration(
             host=firefly_host, access_token=token
         )
+        if pool_size:
+            # Keep a keep-alive connection per concurrent upload
+            configuration.connection_pool_maxsize = pool_size
         self.client = firefly3.ApiClient(configuration)
+        self.metadata_cache = metadata_cache
 
         about = firefly3.AboutApi(self.client).get_about()
         logger.success(
@@ -142,7 +382,10 @@ class Firefly:
         self.categories_api = firefly3.CategoriesApi(self.client)
         self.rule_groups_api = firefly3.RuleGroupsApi(self.client)
 
-        self.categories = Categories(self.categories_api, self.rule_groups_api)
+        with metrics.time("metadata"):
+            self.categories = Categories(
+                self.categories_api, self.rule_groups_api, metadata_cache
+            )
         logger.success(f"Loaded {len(self.categories)} categories")
 
         self.rules_api = firefly3.RulesApi(self.client)
@@ -0,0 +1,110 @@
+"""
+Files for the Firefly III Data Importer, for importing many transactions in one batch rather than a request each
+"""
+
+import csv
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterable, NamedTuple
+
+from finparse.models import AnyTransaction, Card
+from finparse.upload import generate_notes_str
+from finparse.utils import batched
+
+
+class ImporterColumn(NamedTuple):
+    header: str
+    # The role of the column in the Data Importer's configuration
+    role: str
+    value: Callable[[Card, AnyTransaction, dict[str, str]], str | None]
+
+
+# Mirrors the TransactionSplitStore that build_transaction_store uploads
+COLUMNS = (
+    ImporterColumn("date", "date_transaction", lambda c, t, _: f"{t.date:%Y-%m-%d}"),
+    ImporterColumn("description", "description", lambda c, t, _: t.description),
+    # Withdrawals from the account are negative amounts
+    ImporterColumn("amount", "amount_negated", lambda c, t, _: t.amount),
+    ImporterColumn("currency", "currency-code", lambda c, t, _: t.currency.name),
+    ImporterColumn("external_id", "external-id", lambda c, t, _: t.id),
+    ImporterColumn(
+        "foreign_amount", "amount_foreign", lambda c, t, _: t.foreign_amount
+    ),
+    ImporterColumn(
+        "foreign_currency",
+        "foreign-currency-code",
+        lambda c, t, _: t.foreign_currency.name if t.foreign_currency else None,
+    ),
+    ImporterColumn(
+        "category",
+        "category-name",
+        lambda c, t, translations: translations.get(t.category),
+    ),
+    ImporterColumn("tags", "tags-comma", lambda c, t, _: c.description),
+    ImporterColumn(
+        "notes", "note", lambda c, t, _: generate_notes_str(**t.firefly_notes)
+    ),
+)
+
+
+def importer_config(account_id: int) -> dict:
+    """
+    Data Importer configuration for the CSV files that write_importer_files writes
+    """
+    return {
+        "version": 3,
+        "source": "finparse",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "flow": "file",
+        "content_type": "csv",
+        "date": "Y-m-d",
+        "default_account": account_id,
+        "delimiter": "comma",
+        "headers": True,
+        "conversion": False,
+        "rules": True,
+        "skip_form": False,
+        "add_import_tag": True,
+        "roles": [column.role for column in COLUMNS],
+        "do_mapping": [False] * len(COLUMNS),
+        "mapping": [],
+        "duplicate_detection_method": "classic",
+        "ignore_duplicate_lines": True,
+        "unique_column_index": [column.header for column in COLUMNS].index(
+            "external_id"
+        ),
+        "unique_column_type": "external-id",
+    }
+
+
+def write_importer_files(
+    rows: Iterable[tuple[Card, AnyTransaction]],
+    csv_path: Path,
+    account_id: int,
+    category_translations: dict[str, str],
+    chunk_size: int = 10_000,
+) -> int:
+    """
+    Write the rows as a Data Importer CSV file, next to its JSON configuration (with the same name), and return the
+    number of rows written
+    """
+    written = 0
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(column.header for column in COLUMNS)
+
+        for chunk in batched(rows, chunk_size):
+            writer.writerows(
+                [
+                    column.value(card, transaction, category_translations)
+                    for column in COLUMNS
+                ]
+                for card, transaction in chunk
+            )
+            written += len(chunk)
+
+    csv_path.with_suffix(".json").write_text(
+        json.dumps(importer_config(account_id), indent=2)
+    )
+    return written
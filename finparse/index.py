@@ -0,0 +1,164 @@
+import hashlib
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from loguru import logger
+
+from finparse.metrics import metrics
+from finparse.models import Card, AnyTransaction
+from finparse.paths import DEFAULT_INDEX_PATH
+
+
+def transaction_key(transaction: AnyTransaction, card: Card) -> str:
+    """
+    A stable key for a transaction, within its issuer and card: the issuer's ID when the report has one (Isracard),
+    otherwise a hash of its content (Cal).
+
+    Identical transactions (two coffees on the same day) share a key, so they're told apart by how many times the key
+    occurs (see UploadIndex).
+    """
+    if transaction.id:
+        return f"{card.issuer}:{card.last_4_digits}:{transaction.id}"
+
+    content = "\x1f".join(
+        (
+            card.issuer,
+            card.last_4_digits,
+            transaction.date.date().isoformat(),
+            transaction.description,
+            transaction.amount,
+            transaction.currency.value,
+        )
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def index_scope(firefly_host: str, account_id: str) -> str:
+    # Uploads to one server (or account) say nothing about another
+    return f"{firefly_host.rstrip('/')}#{account_id}"
+
+
+class OccurrenceCounter:
+    """
+    Numbers the occurrences of each key within a card of a report, so the n-th of several identical transactions is
+    told apart from the ones before it. A new card (a new report, or the next card in it) starts the count over.
+
+    The rows of the card that were skipped before reaching the counter (see Card.skipped) are counted too, unless
+    only the rows that reach it matter (like in the journal of a single upload).
+    """
+
+    def __init__(self, count_skipped: bool = True):
+        self.count_skipped = count_skipped
+        self._card: Card | None = None
+        self._seen: Counter[str] = Counter()
+
+    def __call__(self, card: Card, key: str) -> int:
+        if card is not self._card:
+            self._card = card
+            self._seen = Counter()
+        self._seen[key] += 1
+        if self.count_skipped:
+            # Read on every call, since the skipped rows of the card's sections are counted as they're reached
+            return self._seen[key] + card.skipped[key]
+        return self._seen[key]
+
+
+class UploadIndex:
+    """
+    A persistent count of the transactions that were uploaded to a Firefly III account, by their keys.
+
+    Keys are counted, rather than kept in a set, since identical transactions share a key: the n-th occurrence of a
+    key in a card was uploaded only if the key was uploaded at least n times.
+
+    Safe to share between the thread that parses (and filters) rows and the one that records uploads.
+    """
+
+    def __init__(
+        self, path: Path = DEFAULT_INDEX_PATH, scope: str = "", commit_every: int = 100
+    ):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.scope = scope
+        self.commit_every = commit_every
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS uploads "
+            "(scope TEXT NOT NULL, key TEXT NOT NULL, count INTEGER NOT NULL, uploaded_at TEXT NOT NULL, "
+            "PRIMARY KEY (scope, key)) WITHOUT ROWID"
+        )
+        self._db.commit()
+
+    def count(self, key: str) -> int:
+        with self._lock:
+            cursor = self._db.execute(
+                "SELECT count FROM uploads WHERE scope = ? AND key = ?",
+                (self.scope, key),
+            )
+            row = cursor.fetchone()
+            return row[0] if row is not None else 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            cursor = self._db.execute(
+                "SELECT COALESCE(SUM(count), 0) FROM uploads WHERE scope = ?",
+                (self.scope,),
+            )
+            return cursor.fetchone()[0]
+
+    def add(self, transaction: AnyTransaction, card: Card):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO uploads VALUES (?, ?, 1, ?) ON CONFLICT (scope, key) "
+                "DO UPDATE SET count = count + 1, uploaded_at = excluded.uploaded_at",
+                (
+                    self.scope,
+                    transaction_key(transaction, card),
+                    datetime.now().isoformat(),
+                ),
+            )
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._db.commit()
+                self._pending = 0
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+            self._pending = 0
+
+    def filter_new(
+        self, rows: Iterable[tuple[Card, AnyTransaction]]
+    ) -> Iterator[tuple[Card, AnyTransaction]]:
+        """
+        Yield only the rows that weren't uploaded yet
+        """
+        occurrence = OccurrenceCounter()
+        skipped = 0
+        for card, transaction in rows:
+            key = transaction_key(transaction, card)
+            if occurrence(card, key) <= self.count(key):
+                logger.debug("Skipping already uploaded transaction: {}", transaction)
+                metrics.incr("skipped")
+                skipped += 1
+                continue
+            yield card, transaction
+
+        if skipped:
+            logger.info(f"Skipped {skipped} already uploaded transactions")
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,158 @@
+"""
+Parsing many reports at once, on a pool of processes
+"""
+
+import glob
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, Type
+
+from loguru import logger
+from pydantic import BaseModel
+
+from finparse.metrics import metrics
+from finparse.models import Card, ReportParser, Transaction, TransactionRow
+from finparse.parsers import find_parser
+from finparse.report_cache import ReportCache
+from finparse.watch import is_report
+
+
+class ParsedReport(BaseModel):
+    path: Path
+    parser: Type[ReportParser] | None
+    cards: list[Card]
+    parse_seconds: float
+    # Why the report couldn't be parsed, in which case it has no cards
+    error: str | None = None
+
+    @property
+    def transactions(self) -> int:
+        return sum(len(card.transactions) for card in self.cards)
+
+
+def expand_reports(reports: str) -> list[Path]:
+    """
+    Resolve a directory (all the reports in it) or a glob pattern into report paths
+    """
+    if Path(reports).is_dir():
+        paths = Path(reports).iterdir()
+    else:
+        paths = map(Path, glob.glob(reports, recursive=True))
+
+    return sorted(p for p in paths if is_report(p) and p.is_file())
+
+
+def iter_report_rows(paths: Iterable[Path]) -> Iterator[tuple[Card, TransactionRow]]:
+    """
+    Lazily parse the reports one after the other, in this process, into a single stream of (card, transaction) rows
+    """
+    for path in paths:
+        parser = find_parser(path)
+        logger.info(f"Reading {path.name} ({parser.__name__})")
+        for card, transaction in parser.iter_transactions(path):
+            if card.enabled:
+                yield card, transaction
+
+
+def parse_report(path: Path, cache: ReportCache | None = None) -> ParsedReport:
+    """
+    Parse a whole report. Runs in a worker process, so everything it returns must be picklable, including the error
+    of a report that couldn't be parsed (which shouldn't abort the parsing of the rest)
+    """
+    start = time.perf_counter()
+    parser = None
+    try:
+        parser = find_parser(path)
+        if cache is not None:
+            cards = cache.parse_workbook(parser, path)
+        else:
+            cards = list(parser.parse_workbook(path))
+    except Exception as e:
+        return ParsedReport(
+            path=path,
+            parser=parser,
+            cards=[],
+            parse_seconds=time.perf_counter() - start,
+            error=repr(e),
+        )
+    return ParsedReport(
+        path=path,
+        parser=parser,
+        cards=cards,
+        parse_seconds=time.perf_counter() - start,
+    )
+
+
+def parse_reports(
+    paths: Iterable[Path],
+    processes: int | None = None,
+    cache: ReportCache | None = None,
+) -> Iterator[ParsedReport]:
+    """
+    Parse the reports on a pool of processes (parsing is CPU bound), yielding them in order.
+
+    Parsing is much faster than uploading, so only a couple of reports per process are parsed ahead of the one being
+    yielded, rather than holding every parsed report until it's uploaded.
+    """
+    processes = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        in_flight = deque()
+        for path in paths:
+            in_flight.append(executor.submit(parse_report, path, cache))
+            if len(in_flight) >= processes * 2:
+                yield _parsed(in_flight.popleft().result())
+
+        while in_flight:
+            yield _parsed(in_flight.popleft().result())
+
+
+def _parsed(report: ParsedReport) -> ParsedReport:
+    if report.error is not None:
+        logger.error(f"Failed parsing {report.path.name}: {report.error}")
+        return report
+
+    # Reports are parsed in other processes, which have metrics of their own
+    metrics.add_time("parse", report.parse_seconds)
+    metrics.incr("rows_parsed", report.transactions)
+    logger.info(
+        f"Parsed {report.transactions} transactions from {report.path.name} "
+        f"({report.parser.__name__}) in {report.parse_seconds:.2f}s"
+    )
+    return report
+
+
+class IngestStats(BaseModel):
+    files: int = 0
+    failed_files: int = 0
+    transactions: int = 0
+    parse_seconds: float = 0
+
+    def rows(
+        self, reports: Iterable[ParsedReport]
+    ) -> Iterator[tuple[Card, Transaction]]:
+        """
+        Merge the reports into a single stream of (card, transaction) rows, counting them on the way
+        """
+        for report in reports:
+            self.files += 1
+            if report.error is not None:
+                self.failed_files += 1
+                continue
+            self.parse_seconds += report.parse_seconds
+            for card in filter(lambda c: c.enabled, report.cards):
+                for transaction in card.transactions:
+                    self.transactions += 1
+                    yield card, transaction
+
+    def log_summary(self, elapsed: float):
+        elapsed = max(elapsed, 1e-9)
+        logger.success(
+            f"Ingested {self.transactions} transactions from {self.files} files in {elapsed:.2f}s "
+            f"({self.transactions / elapsed:.1f} transactions/s, "
+            f"{self.parse_seconds:.2f}s of parsing across workers)"
+        )
+        if self.failed_files:
+            logger.warning(f"{self.failed_files} files couldn't be parsed")
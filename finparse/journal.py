@@ -0,0 +1,120 @@
+import os
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import IO, Iterable, Iterator
+
+from loguru import logger
+
+from finparse.index import OccurrenceCounter, transaction_key
+from finparse.models import Card, AnyTransaction
+from finparse.paths import app_dir
+from finparse.report_cache import file_hash
+
+
+JOURNAL_HEADER = "finparse-journal 2\n"
+
+
+class CheckpointJournal:
+    """
+    Write-ahead journal of the rows of a report that Firefly III acknowledged, so an interrupted upload can resume where
+    it stopped.
+
+    Rows are identified by their keys (see transaction_key), which are counted like in the upload index, so the journal
+    doesn't depend on seeing every row of the report, or on the order they're acknowledged in when uploading
+    concurrently. Acknowledgements are appended to the journal in batches of flush_every, and flushed on close, so at
+    worst a crash re-uploads the last unflushed batch.
+    """
+
+    def __init__(
+        self,
+        report_path: Path,
+        journal_dir: Path | None = None,
+        flush_every: int = 50,
+    ):
+        journal_dir = journal_dir or app_dir() / "journals"
+        journal_dir.mkdir(parents=True, exist_ok=True)
+        self.path = journal_dir / f"{file_hash(report_path)}.journal"
+        self.flush_every = flush_every
+        self.acknowledged: Counter[str] = Counter()
+
+        self._lock = threading.Lock()
+        self._pending: list[str] = []
+        self._file: IO | None = None
+
+    def load(self) -> int:
+        """
+        Load the acknowledgements of a previous run, and return how many there were
+        """
+        try:
+            lines = self.path.read_text().split("\n")
+        except FileNotFoundError:
+            return 0
+
+        if lines[:1] != [JOURNAL_HEADER.strip()]:
+            logger.warning(f"Ignoring unrecognized journal {self.path}")
+            return 0
+
+        # The last line is either empty or torn, if the previous run crashed while writing it
+        self.acknowledged = Counter(lines[1:-1])
+        return self.acknowledged.total()
+
+    def _open(self):
+        if self._file is None:
+            exists = self.path.exists() and bool(self.acknowledged)
+            self._file = open(self.path, "a" if exists else "w")
+            if not exists:
+                self._file.write(JOURNAL_HEADER)
+
+    def filter_new(
+        self, rows: Iterable[tuple[Card, AnyTransaction]]
+    ) -> Iterator[tuple[Card, AnyTransaction]]:
+        """
+        Yield only the rows that weren't acknowledged yet
+        """
+        with self._lock:
+            self._open()
+
+        # Only the rows of this report that reached the uploader were acknowledged
+        occurrence = OccurrenceCounter(count_skipped=False)
+        for card, transaction in rows:
+            key = transaction_key(transaction, card)
+            with self._lock:
+                acknowledged = self.acknowledged[key]
+            if occurrence(card, key) > acknowledged:
+                yield card, transaction
+
+    def add(self, transaction: AnyTransaction, card: Card):
+        key = transaction_key(transaction, card)
+        with self._lock:
+            self.acknowledged[key] += 1
+            self._pending.append(key)
+            if len(self._pending) >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        if self._pending and self._file is not None:
+            self._file.write("".join(f"{key}\n" for key in self._pending))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending.clear()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def complete(self):
+        """
+        The whole report was uploaded, so there's nothing to resume
+        """
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
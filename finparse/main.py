@@ -1,141 +1,514 @@
-import inspect
-from datetime import datetime
+import time
+from contextlib import nullcontext
+from datetime import timedelta
 from pathlib import Path
-from typing import Type
+from typing import Iterable, TYPE_CHECKING
 
-from firefly_iii_client import (
-    TransactionSplitStore,
-    TransactionTypeProperty,
-    AccountTypeFilter,
-    TransactionStore,
-)
 from loguru import logger
-from pick import pick
 
-from cards.isracard import IsracardReportParser
-from cards.cal import CalReportParser
-from finparse.firefly import Firefly
-from finparse.models import Card, Transaction, ReportParser
+from finparse.export import ExportFormat
+from finparse.metrics import Progress, metrics
+from finparse.paths import DEFAULT_INDEX_PATH
 from log import configure_log
-import xattr
 import typer
 
+# The Firefly III client, the parsers and their spreadsheet libraries take most of the startup time, so they're
+# imported by the commands that use them (see benchmarks/bench_startup.py)
+if TYPE_CHECKING:
+    from finparse.firefly import Firefly
+    from finparse.journal import CheckpointJournal
+    from finparse.models import Card, AnyTransaction, ReportParser
+    from finparse.watermarks import Watermarks
+
 app = typer.Typer()
 
+# Options shared by the commands that upload to Firefly III
+TOKEN_OPTION = typer.Option(envvar="FINPARSE_TOKEN", help="Firefly III API token")
+FIREFLY_HOST_OPTION = typer.Option(
+    "http://localhost/api",
+    envvar="FINPARSE_FIREFLY_HOST",
+    help="Firefly III API host",
+)
+CONCURRENCY_OPTION = typer.Option(
+    1, help="Number of concurrent uploads (1 uploads serially, one by one)"
+)
+BATCH_SIZE_OPTION = typer.Option(
+    10, help="Transactions handed to each upload worker at once"
+)
+DEDUP_OPTION = typer.Option(True, help="Skip transactions that were already uploaded")
+PRECHECK_OPTION = typer.Option(
+    True,
+    help="Skip transactions that are already in Firefly III, by listing the account's transactions before uploading",
+)
+INDEX_PATH_OPTION = typer.Option(
+    DEFAULT_INDEX_PATH,
+    envvar="FINPARSE_INDEX",
+    help="Index of uploaded transactions (used with --dedup)",
+)
+METADATA_TTL_OPTION = typer.Option(
+    12, help="Hours to reuse the cached Firefly III categories and rules for"
+)
+REFRESH_METADATA_OPTION = typer.Option(
+    False, help="Ignore the cached Firefly III categories and rules"
+)
+SYNC_RULES_OPTION = typer.Option(
+    True,
+    help="Sync the category translations of the parsers into the Firefly III translation rules",
+)
+PROGRESS_OPTION = typer.Option(True, help="Show the progress of the upload")
+REPORT_CACHE_OPTION = typer.Option(
+    None,
+    help="Reuse the parsed reports of previous runs, if the reports didn't change "
+    "(by default, unless --incremental parses only the new rows of the report)",
+    show_default=False,
+)
+INCREMENTAL_OPTION = typer.Option(
+    True,
+    help="Process only the transactions added to each card since its last upload, "
+    "for reports of the current billing cycle that are downloaded again as they grow",
+)
 
-CARD_MODULE_MAPPING: dict[str, Type[ReportParser]] = {
-    "isracard.co.il": IsracardReportParser,
-    "cal-online.co.il": CalReportParser,
-}
 
+@app.callback()
+def setup(
+    ctx: typer.Context,
+    verbose: bool = typer.Option(False),
+    metrics_json: Path = typer.Option(
+        None,
+        help="Write the metrics of the run (timings, counters, latencies) to this file",
+    ),
+):
+    configure_log(verbose)
+    if metrics_json:
+        ctx.call_on_close(lambda: metrics.dump(metrics_json))
 
-def get_download_url(
-    path: Path, attr: str = "com.apple.metadata:kMDItemWhereFroms"
-) -> str | None:
-    # noinspection PyBroadException
-    try:
-        dl_link: bytes = xattr.getxattr(path, attr)
-        return dl_link.decode("utf-8", "ignore")
-    except Exception:
-        logger.debug(f"Unable to find source of {path}", exc_info=True)
-        return None
 
+def connect(
+    firefly_host: str,
+    token: str,
+    concurrency: int,
+    metadata_ttl: float,
+    refresh_metadata: bool,
+    sync_rules: bool,
+) -> "Firefly":
+    from finparse.firefly import Firefly, MetadataCache
 
-def find_parser(path: Path) -> Type[ReportParser]:
-    dl_url = get_download_url(path)
-    for k, v in CARD_MODULE_MAPPING.items():
-        if k in dl_url:
-            return v
+    metadata_cache = MetadataCache(firefly_host, ttl=timedelta(hours=metadata_ttl))
+    if refresh_metadata:
+        metadata_cache.clear()
 
-    raise ValueError("Couldn't find an appropriate parser")
+    firefly = Firefly(
+        firefly_host, token, pool_size=concurrency, metadata_cache=metadata_cache
+    )
+    if sync_rules:
+        from finparse.parsers import all_category_translations
+        from finparse.rule_sync import sync_translation_rules
 
+        # The rules of all the issuers, as they share the rule group
+        sync_translation_rules(firefly, all_category_translations())
+    return firefly
 
-@app.callback()
-def setup(verbose: bool = typer.Option(False)):
-    configure_log(verbose)
 
+def select_account(firefly: "Firefly") -> str:
+    from firefly_iii_client import AccountTypeFilter
+    from pick import pick
 
-def generate_notes_str(**notes) -> str:
-    return ";\n".join(f"{k}: {v}" for k, v in notes.items())
+    accounts = firefly.accounts_api.list_account(type=AccountTypeFilter.ASSET).data
+    logger.info(f"Detected {len(accounts)} asset accounts")
+
+    acc_name, acc_idx = pick(
+        tuple(acc.attributes.name for acc in accounts), title="Select Account"
+    )
 
+    logger.success(f"Selected account: {acc_name}")
+    return accounts[acc_idx].id
 
-def upload_transaction(
-    transaction: Transaction,
-    card: Card,
-    firefly: Firefly,
-    parser: Type[ReportParser],
+
+def upload_rows(
+    rows: Iterable[tuple["Card", "AnyTransaction"]],
+    firefly: "Firefly",
+    category_translations: dict[str, str],
     account_id: str,
+    concurrency: int,
+    batch_size: int,
+    dedup: bool,
+    index_path: Path,
+    progress: bool,
+    precheck: bool,
+    journal: "CheckpointJournal | None" = None,
+) -> bool:
+    """
+    Upload the rows, and return whether all of them were uploaded
+    """
+    import asyncio
+
+    from finparse.index import UploadIndex, index_scope
+    from finparse.precheck import ExistingTransactions
+    from finparse.upload import AsyncUploader, upload_serially, log_report
+
+    existing = ExistingTransactions(firefly, account_id) if precheck else None
+    with (
+        (
+            UploadIndex(
+                index_path, index_scope(firefly.client.configuration.host, account_id)
+            )
+            if dedup
+            else nullcontext()
+        ) as index,
+        Progress() if progress else nullcontext(),
+    ):
+        if concurrency > 1:
+            uploader = AsyncUploader(
+                firefly,
+                category_translations,
+                account_id,
+                concurrency,
+                batch_size,
+                index=index,
+                journal=journal,
+                existing=existing,
+            )
+            report = asyncio.run(uploader.upload_rows(rows))
+        else:
+            upload_serially(
+                rows,
+                firefly,
+                category_translations,
+                account_id,
+                index,
+                journal,
+                existing,
+            )
+            report = None
+
+    metrics.log_summary()
+    if report is not None:
+        log_report(report)
+        return not report.failures
+
+    logger.success("Finished uploading transactions from all cards")
+    return True
+
+
+def card_company(parser: type) -> str:
+    import inspect
+
+    return Path(inspect.getfile(parser)).stem.capitalize()
+
+
+def report_rows(
+    parser: type["ReportParser"],
+    report_file: Path,
+    report_cache: bool | None,
+    watermarks: "Watermarks | None" = None,
+) -> Iterable[tuple["Card", "AnyTransaction"]]:
+    if watermarks is not None:
+        # Only the rows after the watermarks are parsed, so there's no point in caching the whole report
+        if report_cache:
+            logger.warning(
+                "Ignoring --report-cache, since --incremental parses only the new rows of the report "
+                "(pass --no-incremental to use the cache)"
+            )
+        transactions = parser.iter_transactions(report_file, watermarks)
+    elif report_cache is not False:
+        from finparse.report_cache import ReportCache
+
+        transactions = ReportCache().iter_transactions(parser, report_file)
+    else:
+        # Cards and transactions are parsed lazily, while they're being uploaded
+        transactions = parser.iter_transactions(report_file)
+
+    return ((card, transaction) for card, transaction in transactions if card.enabled)
+
+
+@app.command()
+def upload(
+    report_file: Path = typer.Argument(help="Credit card monthly report"),
+    token: str = TOKEN_OPTION,
+    firefly_host: str = FIREFLY_HOST_OPTION,
+    concurrency: int = CONCURRENCY_OPTION,
+    batch_size: int = BATCH_SIZE_OPTION,
+    dedup: bool = DEDUP_OPTION,
+    precheck: bool = PRECHECK_OPTION,
+    index_path: Path = INDEX_PATH_OPTION,
+    metadata_ttl: float = METADATA_TTL_OPTION,
+    refresh_metadata: bool = REFRESH_METADATA_OPTION,
+    sync_rules: bool = SYNC_RULES_OPTION,
+    report_cache: bool | None = REPORT_CACHE_OPTION,
+    incremental: bool = INCREMENTAL_OPTION,
+    progress: bool = PROGRESS_OPTION,
+    resume: bool = typer.Option(
+        False, help="Continue an interrupted upload of the report where it stopped"
+    ),
 ):
-    transaction_store = TransactionSplitStore(
-        amount=transaction.amount,
-        var_date=datetime.combine(transaction.date, datetime.min.time()),
-        description=transaction.description,
-        category_name=parser.get_category_translations().get(transaction.category),
-        currency_code=transaction.currency.name,
-        external_id=transaction.id,
-        foreign_amount=transaction.foreign_amount,
-        foreign_currency_code=transaction.foreign_currency.name,
-        source_id=account_id,
-        type=TransactionTypeProperty.WITHDRAWAL,
-        notes=generate_notes_str(**transaction.firefly_notes),
-        tags=[card.description],
+    from finparse.index import index_scope
+    from finparse.journal import CheckpointJournal
+    from finparse.parsers import find_parser
+    from finparse.watermarks import Watermarks
+
+    parser = find_parser(report_file)
+    logger.success(f"Found appropriate parser: {card_company(parser)}")
+
+    firefly = connect(
+        firefly_host, token, concurrency, metadata_ttl, refresh_metadata, sync_rules
+    )
+    account_id = select_account(firefly)
+    scope = index_scope(firefly.client.configuration.host, account_id)
+
+    watermarks = Watermarks(scope=scope) if incremental else None
+    rows = report_rows(parser, report_file, report_cache, watermarks)
+
+    # Acknowledged rows are always journaled, so any upload can be resumed later
+    journal = CheckpointJournal(report_file)
+    if resume:
+        if acknowledged := journal.load():
+            logger.info(
+                f"Resuming upload: {acknowledged} transactions were already uploaded"
+            )
+        else:
+            logger.info("Nothing to resume, uploading the whole report")
+
+    with journal:
+        complete = upload_rows(
+            rows,
+            firefly,
+            parser.get_category_translations(),
+            account_id,
+            concurrency,
+            batch_size,
+            dedup,
+            index_path,
+            progress,
+            precheck,
+            journal,
+        )
+
+    if complete:
+        journal.complete()
+        if watermarks is not None:
+            watermarks.commit()
+    else:
+        logger.warning(
+            "Some transactions failed, run again with --resume to retry them"
+        )
+
+
+@app.command()
+def ingest(
+    reports: str = typer.Argument(
+        help="Directory of credit card monthly reports, or a glob pattern matching them"
+    ),
+    processes: int = typer.Option(
+        None, help="Number of reports to parse in parallel (defaults to the CPU count)"
+    ),
+    token: str = TOKEN_OPTION,
+    firefly_host: str = FIREFLY_HOST_OPTION,
+    concurrency: int = CONCURRENCY_OPTION,
+    batch_size: int = BATCH_SIZE_OPTION,
+    dedup: bool = DEDUP_OPTION,
+    precheck: bool = PRECHECK_OPTION,
+    index_path: Path = INDEX_PATH_OPTION,
+    metadata_ttl: float = METADATA_TTL_OPTION,
+    refresh_metadata: bool = REFRESH_METADATA_OPTION,
+    sync_rules: bool = SYNC_RULES_OPTION,
+    report_cache: bool | None = REPORT_CACHE_OPTION,
+    progress: bool = PROGRESS_OPTION,
+):
+    from finparse.ingest import IngestStats, expand_reports, parse_reports
+    from finparse.parsers import all_category_translations
+    from finparse.report_cache import ReportCache
+
+    paths = expand_reports(reports)
+    if not paths:
+        raise typer.BadParameter(f"No reports found in {reports}")
+    logger.success(f"Found {len(paths)} reports")
+
+    firefly = connect(
+        firefly_host, token, concurrency, metadata_ttl, refresh_metadata, sync_rules
     )
+    account_id = select_account(firefly)
 
-    firefly.transactions_api.store_transaction(
-        TransactionStore(transactions=[transaction_store])
+    start = time.perf_counter()
+    stats = IngestStats()
+    upload_rows(
+        stats.rows(
+            parse_reports(
+                paths, processes, ReportCache() if report_cache is not False else None
+            )
+        ),
+        firefly,
+        all_category_translations(),
+        account_id,
+        concurrency,
+        batch_size,
+        dedup,
+        index_path,
+        progress,
+        precheck,
     )
+    stats.log_summary(time.perf_counter() - start)
 
 
-def upload_card(
-    card: Card, firefly: Firefly, parser: Type[ReportParser], account_id: str
+@app.command()
+def export(
+    reports: str = typer.Argument(
+        help="Credit card monthly report, a directory of reports, or a glob pattern matching them"
+    ),
+    output: Path = typer.Argument(help="Output file (.csv, .jsonl or .parquet)"),
+    output_format: ExportFormat = typer.Option(
+        None, "--format", help="Output format (by default, by the output's extension)"
+    ),
+    chunk_size: int = typer.Option(10_000, help="Transactions written at once"),
 ):
-    for transaction in card.transactions:
-        logger.info(f"Transaction: {transaction}")
-        upload_transaction(transaction, card, firefly, parser, account_id)
+    """
+    Export the transactions of the reports to a file, without uploading them to Firefly III
+    """
+    from finparse.export import export_rows
+    from finparse.ingest import expand_reports, iter_report_rows
+
+    paths = expand_reports(reports)
+    if not paths:
+        raise typer.BadParameter(f"No reports found in {reports}")
+
+    try:
+        output_format = output_format or ExportFormat.from_path(output)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+    with output_format.writer(output) as writer:
+        written = export_rows(iter_report_rows(paths), writer, chunk_size)
+
+    logger.success(
+        f"Exported {written} transactions from {len(paths)} reports to {output}"
+    )
 
 
 @app.command()
-def upload(
-    report_file: Path = typer.Argument(help="Credit card monthly report"),
-    token: str = typer.Option(envvar="FINPARSE_TOKEN", help="Firefly III API token"),
-    firefly_host: str = typer.Option(
-        "http://localhost/api",
-        envvar="FINPARSE_FIREFLY_HOST",
-        help="Firefly III API host",
+def importer(
+    reports: str = typer.Argument(
+        help="Credit card monthly report, a directory of reports, or a glob pattern matching them"
     ),
+    output: Path = typer.Argument(
+        help="CSV file to write (its JSON configuration is written next to it)"
+    ),
+    account_id: int = typer.Option(
+        ..., help="Firefly III asset account to import the transactions to"
+    ),
+    chunk_size: int = typer.Option(10_000, help="Transactions written at once"),
 ):
-    parser = find_parser(report_file)
-    card_company = Path(inspect.getfile(parser)).stem.capitalize()
-    logger.success(f"Found appropriate parser: {card_company}")
-    cards = parser.parse_workbook(report_file)
-    logger.success(f"Done parsing cards in {report_file}, starting upload...")
+    """
+    Write the transactions of the reports as files for the Firefly III Data Importer, to import them in one batch
+    """
+    from finparse.importer import write_importer_files
+    from finparse.ingest import expand_reports, iter_report_rows
+    from finparse.parsers import all_category_translations
 
-    firefly = Firefly(firefly_host, token)
+    paths = expand_reports(reports)
+    if not paths:
+        raise typer.BadParameter(f"No reports found in {reports}")
 
-    accounts = firefly.accounts_api.list_account(type=AccountTypeFilter.ASSET).data
-    logger.info(f"Detected {len(accounts)} asset accounts")
+    written = write_importer_files(
+        iter_report_rows(paths),
+        output,
+        account_id,
+        all_category_translations(),
+        chunk_size,
+    )
+    logger.success(
+        f"Wrote {written} transactions to {output}, "
+        f"with its configuration in {output.with_suffix('.json')}"
+    )
 
-    acc_name, acc_idx = pick(
-        tuple(acc.attributes.name for acc in accounts), title="Select Account"
+
+@app.command()
+def watch(
+    directory: Path = typer.Argument(
+        help="Directory to watch for new credit card monthly reports",
+        exists=True,
+        file_okay=False,
+    ),
+    account_id: str = typer.Option(
+        None,
+        help="Firefly III asset account to upload to (by default, selected interactively on start)",
+    ),
+    existing: bool = typer.Option(
+        True, help="Upload the reports already in the directory on start"
+    ),
+    poll_interval: float = typer.Option(
+        2.0, help="Seconds between scans of the directory, when inotify is unavailable"
+    ),
+    token: str = TOKEN_OPTION,
+    firefly_host: str = FIREFLY_HOST_OPTION,
+    concurrency: int = CONCURRENCY_OPTION,
+    batch_size: int = BATCH_SIZE_OPTION,
+    index_path: Path = INDEX_PATH_OPTION,
+    precheck: bool = PRECHECK_OPTION,
+    metadata_ttl: float = METADATA_TTL_OPTION,
+    refresh_metadata: bool = REFRESH_METADATA_OPTION,
+    sync_rules: bool = SYNC_RULES_OPTION,
+    report_cache: bool | None = REPORT_CACHE_OPTION,
+    incremental: bool = INCREMENTAL_OPTION,
+):
+    """
+    Upload the new transactions of every report that is added to (or changed in) the directory, until interrupted
+    """
+    from finparse.index import index_scope
+    from finparse.parsers import find_parser
+    from finparse.watch import is_report, watch_directory
+    from finparse.watermarks import Watermarks
+
+    # Connected once, so every report reuses the categories, rules and HTTP connections
+    firefly = connect(
+        firefly_host, token, concurrency, metadata_ttl, refresh_metadata, sync_rules
     )
+    account_id = account_id or select_account(firefly)
+    scope = index_scope(firefly.client.configuration.host, account_id)
 
-    logger.success(f"Selected account: {acc_name}")
+    def upload_report(report_file: Path):
+        try:
+            parser = find_parser(report_file)
+        except (ValueError, OSError) as e:
+            logger.warning(e)
+            return
 
-    card: Card
-    for card in filter(lambda c: c.enabled, cards):
-        if card.transactions:
-            logger.info(f"Uploading transactions for {card.description}")
-            upload_card(
-                card,
+        logger.info(f"Uploading {report_file} ({card_company(parser)})")
+        # Loaded for every report, so the watermarks of a report that failed are discarded
+        watermarks = Watermarks(scope=scope) if incremental else None
+        # A report that failed is retried when it changes, or by a later run
+        # noinspection PyBroadException
+        try:
+            complete = upload_rows(
+                report_rows(parser, report_file, report_cache, watermarks),
                 firefly,
-                parser,
-                accounts[acc_idx].id,
+                parser.get_category_translations(),
+                account_id,
+                concurrency,
+                batch_size,
+                dedup=True,
+                index_path=index_path,
+                progress=False,
+                precheck=precheck,
             )
-            logger.success(f"Finished uploading {card.description}")
-        else:
-            logger.info(f"Card {card.description} has no transactions")
+        except Exception:
+            logger.exception(f"Failed uploading {report_file}")
+            return
 
-    logger.success("Finished uploading transactions from all cards")
+        if complete and watermarks is not None:
+            watermarks.commit()
+
+    # Started before uploading the existing reports, so reports added meanwhile aren't missed
+    with watch_directory(directory, poll_interval) as watcher:
+        if existing:
+            for report_file in sorted(filter(is_report, directory.iterdir())):
+                upload_report(report_file)
+
+        logger.success(f"Waiting for new reports in {directory}")
+        try:
+            for report_files in watcher.changes():
+                for report_file in sorted(report_files):
+                    upload_report(report_file)
+        except KeyboardInterrupt:
+            logger.info("Stopped watching")
 
 
 if __name__ == "__main__":
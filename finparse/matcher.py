@@ -0,0 +1,113 @@
+from collections import deque
+from enum import Enum
+from typing import Iterable, NamedTuple
+
+
+class MatchType(Enum):
+    """
+    Firefly III's description trigger types
+    """
+
+    Contains = "description_contains"
+    Starts = "description_starts"
+    Ends = "description_ends"
+    Is = "description_is"
+
+
+class Pattern(NamedTuple):
+    length: int
+    match_type: MatchType
+    category_name: str
+
+
+class CategoryMatcher:
+    """
+    Assigns categories by the description rules, with all of their activators compiled into a single Aho-Corasick
+    automaton. A description is scanned once, whatever the number of rules, so tens of thousands of rules stay fast.
+
+    Like Firefly III, matching is case-insensitive. When several rules match, the longest activator (the most
+    specific one) wins, and between activators of the same length, the first rule loaded wins.
+    """
+
+    def __init__(self, rules: Iterable[tuple[str, MatchType, str]] = ()):
+        self.patterns: list[Pattern] = []
+
+        # The automaton: goto edges, failure links and matched patterns of every state (state 0 is the root)
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[int]] = [[]]
+
+        for activator, match_type, category_name in rules:
+            self._add(activator.lower(), match_type, category_name)
+        self._link()
+
+    def _add(self, activator: str, match_type: MatchType, category_name: str):
+        if not activator:
+            return
+
+        state = 0
+        for char in activator:
+            if (next_state := self._goto[state].get(char)) is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+
+        self._out[state].append(len(self.patterns))
+        self.patterns.append(Pattern(len(activator), match_type, category_name))
+
+    def _link(self):
+        """
+        Set the failure links breadth first, and merge the output of each state with that of its failure state
+        """
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+
+                self._fail[next_state] = fail
+                self._out[next_state] = self._out[next_state] + self._out[fail]
+
+    def match(self, description: str) -> str | None:
+        """
+        Name of the category the description rules assign to the description, if any
+        """
+        text = description.lower()
+        last = len(text) - 1
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+
+        best = None
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            for pattern_idx in out[state]:
+                length, match_type, _ = patterns[pattern_idx]
+                match match_type:
+                    case MatchType.Starts if end + 1 != length:
+                        continue
+                    case MatchType.Ends if end != last:
+                        continue
+                    case MatchType.Is if end != last or end + 1 != length:
+                        continue
+
+                if best is None or (length, -pattern_idx) > (
+                    patterns[best].length,
+                    -best,
+                ):
+                    best = pattern_idx
+
+        return None if best is None else patterns[best].category_name
+
+    def __len__(self):
+        return len(self.patterns)
@@ -0,0 +1,219 @@
+"""
+Instrumentation: per-stage timers, counters and latency histograms, a live progress display, and a JSON dump of it all
+"""
+
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+
+class Histogram:
+    """
+    Latency histogram with fixed, roughly logarithmic, millisecond buckets
+    """
+
+    BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+    def __init__(self):
+        # The last bucket holds everything above the last bound
+        self.buckets = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_seconds = 0.0
+
+    def observe(self, seconds: float):
+        self.buckets[bisect_left(self.BOUNDS_MS, seconds * 1000)] += 1
+        self.count += 1
+        self.total_seconds += seconds
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Upper bound (in milliseconds) of the bucket the quantile falls in
+        """
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS_MS + (float("inf"),), self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total_seconds / self.count * 1000 if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets_ms": {
+                f"<={bound}": count
+                for bound, count in zip(self.BOUNDS_MS, self.buckets)
+                if count
+            }
+            | (
+                {f">{self.BOUNDS_MS[-1]}": self.buckets[-1]} if self.buckets[-1] else {}
+            ),
+        }
+
+
+class Metrics:
+    """
+    Thread-safe collection of the metrics of a run. Stages may nest (parsing includes loading the workbook)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.perf_counter()
+            self.counters: Counter[str] = Counter()
+            self.stage_seconds: Counter[str] = Counter()
+            self.stage_calls: Counter[str] = Counter()
+            self.histograms: dict[str, Histogram] = {}
+
+    def incr(self, counter: str, n: int = 1):
+        with self._lock:
+            self.counters[counter] += n
+
+    def observe(self, histogram: str, seconds: float):
+        with self._lock:
+            self.histograms.setdefault(histogram, Histogram()).observe(seconds)
+
+    def add_time(self, stage: str, seconds: float, calls: int = 1):
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+            self.stage_calls[stage] += calls
+
+    @contextmanager
+    def time(self, stage: str, histogram: str | None = None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.add_time(stage, elapsed)
+            if histogram:
+                self.observe(histogram, elapsed)
+
+    def time_iter(self, stage: str, iterable: Iterable[T]) -> Iterator[T]:
+        """
+        Time the production of the items of a (lazy) iterable, excluding the time its consumer spends on them
+        """
+        iterator = iter(iterable)
+        seconds = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    seconds += time.perf_counter() - start
+                    return
+                seconds += time.perf_counter() - start
+                yield item
+        finally:
+            self.add_time(stage, seconds)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def rate(self, counter: str) -> float:
+        return self.counters[counter] / max(self.elapsed, 1e-9)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            elapsed = self.elapsed
+            return {
+                "elapsed_seconds": elapsed,
+                "counters": dict(self.counters),
+                "rates_per_second": {
+                    name: count / max(elapsed, 1e-9)
+                    for name, count in self.counters.items()
+                },
+                "stages": {
+                    stage: {"seconds": seconds, "calls": self.stage_calls[stage]}
+                    for stage, seconds in self.stage_seconds.items()
+                },
+                "histograms": {
+                    name: histogram.to_dict()
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+    def log_summary(self):
+        stages = ", ".join(
+            f"{stage} {seconds:.2f}s"
+            for stage, seconds in self.stage_seconds.most_common()
+        )
+        logger.info(f"Time by stage: {stages or 'nothing recorded'}")
+
+    def dump(self, path: Path):
+        path.write_text(json.dumps(self.to_dict(), indent=2))
+        logger.info(f"Wrote metrics to {path}")
+
+
+# The metrics of this process
+metrics = Metrics()
+
+
+class Progress:
+    """
+    Live progress of an upload, redrawn in place on a terminal, or logged periodically otherwise
+    """
+
+    def __init__(self, interval: float = 0.5, log_interval: float = 10):
+        self.tty = sys.stderr.isatty()
+        self.interval = interval if self.tty else log_interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def render() -> str:
+        counters = metrics.counters
+        latency = metrics.histograms.get("request_latency")
+        line = (
+            f"{counters['uploaded']} uploaded ({metrics.rate('uploaded'):.1f}/s), "
+            f"{counters['rows_parsed']} parsed, {counters['skipped']} skipped, "
+            f"{counters['failed']} failed, {counters['retries']} retries"
+        )
+        if latency and latency.count:
+            line += (
+                f", latency p50 <={latency.quantile(0.5)}ms "
+                f"p95 <={latency.quantile(0.95)}ms"
+            )
+        return line
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._draw()
+
+    def _draw(self, final: bool = False):
+        if self.tty:
+            sys.stderr.write(f"\r\x1b[K{self.render()}" + ("\n" if final else ""))
+            sys.stderr.flush()
+        else:
+            logger.info(f"Progress: {self.render()}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join()
+        self._draw(final=True)
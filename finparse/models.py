@@ -1,10 +1,17 @@
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, field, fields
+from collections import Counter
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import Callable, Iterable
+from typing import Callable, Iterable, Iterator, TYPE_CHECKING
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
+
+from finparse.metrics import metrics
+
+if TYPE_CHECKING:
+    from finparse.watermarks import Watermarks
 
 
 class Currency(Enum):
@@ -13,7 +20,13 @@ class Currency(Enum):
     EURO = "€"
 
 
+# Faster than Currency(symbol), which goes through the Enum lookup machinery
+CURRENCY_BY_SYMBOL: dict[str, Currency] = {c.value: c for c in Currency}
+
+
 class Transaction(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     date: datetime
     description: str
     amount: str
@@ -35,6 +48,66 @@ class Transaction(BaseModel):
         return d
 
 
+@dataclass(slots=True)
+class TransactionRow:
+    """
+    A lightweight transaction that parsers produce for every row of a report.
+
+    Rows aren't validated when they're created. They're validated into Transactions in batches (see validate_rows),
+    or checked one by one as they're streamed (see check_row).
+    """
+
+    date: datetime
+    description: str
+    amount: str
+    currency: Currency
+    foreign_amount: str | None = None
+    foreign_currency: Currency | None = None
+    category: str | None = None
+    id: str | None = None
+    notes: str | None = None
+
+    __str__ = Transaction.__str__
+    firefly_notes = Transaction.firefly_notes
+
+
+# Anything downstream of the parsers (upload, indexing, etc.) accepts both
+AnyTransaction = Transaction | TransactionRow
+
+_transactions_adapter = TypeAdapter(list[Transaction])
+
+
+def validate_rows(rows: list[TransactionRow]) -> list[Transaction]:
+    """
+    Validate a batch of rows into Transactions, in a single call to pydantic
+    """
+    return _transactions_adapter.validate_python(rows, from_attributes=True)
+
+
+def _optional_str(value) -> bool:
+    return value is None or isinstance(value, str)
+
+
+def check_row(row: TransactionRow) -> TransactionRow:
+    """
+    Check the types of a streamed row, which validate_rows would have checked, with a few isinstance calls rather
+    than a pydantic model per row
+    """
+    if not (
+        isinstance(row.date, datetime)
+        and isinstance(row.description, str)
+        and isinstance(row.amount, str)
+        and isinstance(row.currency, Currency)
+        and _optional_str(row.foreign_amount)
+        and (row.foreign_currency is None or isinstance(row.foreign_currency, Currency))
+        and _optional_str(row.category)
+        and _optional_str(row.id)
+        and _optional_str(row.notes)
+    ):
+        raise ValueError(f"Invalid transaction row: {row!r}")
+    return row
+
+
 def str_transactions(transactions: list[Transaction]) -> str:
     ret = []
     for t in transactions:
@@ -47,6 +120,11 @@ class Card(BaseModel):
     last_4_digits: str
     transactions: list[Transaction] = []
     enabled: bool = True
+    # The name of the issuer whose report the card is from, which namespaces the IDs of its transactions
+    issuer: str = ""
+    # The keys (see index.transaction_key) of the rows that were skipped before reaching the uploader, since they were
+    # already uploaded (see Watermarks). Identical rows after them are counted from them.
+    skipped: Counter[str] = Field(default_factory=Counter, exclude=True, repr=False)
 
     @property
     def description(self) -> str:
@@ -59,10 +137,127 @@ class Card(BaseModel):
         )
 
 
+@dataclass(slots=True)
+class TransactionTable:
+    """
+    The transactions of a card, stored by column rather than by row, for exporting or uploading them in bulk.
+
+    The columns are those of TransactionRow, and all of them have the same length.
+    """
+
+    card: Card
+    date: list[datetime] = field(default_factory=list)
+    description: list[str] = field(default_factory=list)
+    amount: list[str] = field(default_factory=list)
+    currency: list[Currency] = field(default_factory=list)
+    foreign_amount: list[str | None] = field(default_factory=list)
+    foreign_currency: list[Currency | None] = field(default_factory=list)
+    category: list[str | None] = field(default_factory=list)
+    id: list[str | None] = field(default_factory=list)
+    notes: list[str | None] = field(default_factory=list)
+
+    def columns(self) -> dict[str, list]:
+        return {f.name: getattr(self, f.name) for f in fields(TransactionRow)}
+
+    def append(self, row: TransactionRow):
+        for name, column in self.columns().items():
+            column.append(getattr(row, name))
+
+    def rows(self) -> Iterator[TransactionRow]:
+        return map(TransactionRow, *self.columns().values())
+
+    def iter_transactions(self) -> Iterator[tuple[Card, TransactionRow]]:
+        """
+        (card, transaction) pairs, like ReportParser.iter_transactions, for uploading the table. The rows are never
+        validated into Transactions, so they're checked like streamed rows
+        """
+        for row in self.rows():
+            yield self.card, check_row(row)
+
+    def __len__(self):
+        return len(self.date)
+
+
 class ReportParser(ABC):
     @staticmethod
     @abstractmethod
-    def parse_workbook(workbook_path: Path) -> Iterable[Card]: ...
+    def iter_records(workbook_path: Path) -> Iterator[Card | TransactionRow]:
+        """
+        Lazily yield every card in the report, each followed by its transactions
+        """
+
+    @classmethod
+    def _timed_records(cls, workbook_path: Path) -> Iterator[Card | TransactionRow]:
+        return metrics.time_iter("parse", cls.iter_records(workbook_path))
+
+    @classmethod
+    def parse_workbook(cls, workbook_path: Path) -> Iterable[Card]:
+        card, rows = None, []
+        for record in cls._timed_records(workbook_path):
+            if isinstance(record, Card):
+                if card is not None:
+                    card.transactions = validate_rows(rows)
+                    metrics.incr("rows_parsed", len(rows))
+                    yield card
+                card, rows = record, []
+            else:
+                rows.append(record)
+
+        if card is not None:
+            card.transactions = validate_rows(rows)
+            metrics.incr("rows_parsed", len(rows))
+            yield card
+
+    @classmethod
+    def iter_transactions(
+        cls, workbook_path: Path, watermarks: "Watermarks | None" = None
+    ) -> Iterator[tuple[Card, TransactionRow]]:
+        """
+        Lazily yield (card, transaction) pairs, without collecting the transactions in their cards. With watermarks,
+        only the rows of each card after its watermark are yielded.
+        """
+        if watermarks is not None:
+            pairs = watermarks.filter_new(lambda: cls._iter_pairs(workbook_path))
+        else:
+            pairs = cls._iter_pairs(workbook_path)
+        return cls._checked(pairs)
+
+    @staticmethod
+    def _checked(
+        pairs: Iterable[tuple[Card, TransactionRow]]
+    ) -> Iterator[tuple[Card, TransactionRow]]:
+        # The streamed rows are never validated into Transactions, so they're checked as they're counted
+        for card, row in pairs:
+            metrics.incr("rows_parsed")
+            yield card, check_row(row)
+
+    @classmethod
+    def _iter_pairs(cls, workbook_path: Path) -> Iterator[tuple[Card, TransactionRow]]:
+        card = None
+        for record in cls._timed_records(workbook_path):
+            if isinstance(record, Card):
+                card = record
+            else:
+                yield card, record
+
+    @classmethod
+    def parse_tables(cls, workbook_path: Path) -> Iterator[TransactionTable]:
+        """
+        Yield a table of transactions per card. Parsers that can read their reports by column override this
+        """
+        table = None
+        for record in cls._timed_records(workbook_path):
+            if isinstance(record, Card):
+                if table is not None:
+                    metrics.incr("rows_parsed", len(table))
+                    yield table
+                table = TransactionTable(record)
+            else:
+                table.append(record)
+
+        if table is not None:
+            metrics.incr("rows_parsed", len(table))
+            yield table
 
     @staticmethod
     def get_category_translations() -> dict[str, str]:
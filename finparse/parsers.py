@@ -0,0 +1,165 @@
+import importlib
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Type, TYPE_CHECKING
+
+from loguru import logger
+
+from finparse.metrics import metrics
+
+if TYPE_CHECKING:
+    from finparse.models import ReportParser
+
+# Detection reads at most this many bytes of a report (or of each sniffed member of an .xlsx archive)
+SNIFF_BYTES = 64 * 1024
+
+XLS_MAGIC = bytes.fromhex("d0cf11e0a1b11ae1")
+XLSX_MAGIC = b"PK\x03\x04"
+
+# The members of an .xlsx archive where the first cells' text is, with either shared or inline strings
+XLSX_SNIFFED_MEMBERS = ("xl/sharedStrings.xml", "xl/worksheets/sheet1.xml")
+
+
+@dataclass(frozen=True)
+class ReportSignature:
+    """
+    How to recognize the reports of a parser: by their file format, and text that their first rows contain.
+
+    The parser is referenced by its import path ("module:class"), so only the parser of the detected issuer is ever
+    imported (along with its spreadsheet library).
+    """
+
+    parser_path: str
+    magic: bytes
+    # All of these must appear in the beginning of the report
+    markers: tuple[str, ...]
+    # Part of the URL the reports are downloaded from
+    url_hint: str
+
+    @property
+    def parser(self) -> Type["ReportParser"]:
+        module, _, name = self.parser_path.partition(":")
+        return getattr(importlib.import_module(module), name)
+
+
+SIGNATURES: list[ReportSignature] = []
+
+
+def register_signature(signature: ReportSignature):
+    SIGNATURES.append(signature)
+
+
+def registered_parsers() -> list[Type["ReportParser"]]:
+    # Imports the parsers of all the issuers
+    by_path = {signature.parser_path: signature for signature in SIGNATURES}
+    return [signature.parser for signature in by_path.values()]
+
+
+def all_category_translations() -> dict[str, str]:
+    # Reported categories are issuer specific, so the translations of all issuers don't overlap
+    category_translations = {}
+    for parser in registered_parsers():
+        category_translations.update(parser.get_category_translations())
+    return category_translations
+
+
+register_signature(
+    ReportSignature(
+        "finparse.cards.isracard:IsracardReportParser",
+        XLS_MAGIC,
+        # The title of the local and foreign transaction sections of each card
+        markers=("עסקאות ב",),
+        url_hint="isracard.co.il",
+    )
+)
+register_signature(
+    ReportSignature(
+        "finparse.cards.cal:CalReportParser",
+        XLSX_MAGIC,
+        # The title in A1: "פירוט עסקאות לכרטיס <card name> המסתיים ב-<last 4 digits>"
+        markers=("לכרטיס", "המסתיים"),
+        url_hint="cal-online.co.il",
+    )
+)
+
+
+def _xls_text(path: Path, prefix: bytes) -> bytes:
+    # BIFF8 stores strings with non latin-1 characters (like Hebrew) as UTF-16, in the shared strings table near the
+    # beginning of the workbook stream
+    return prefix
+
+
+def _xlsx_text(path: Path, prefix: bytes) -> bytes:
+    # Opening the archive only reads its central directory (at the end), and the members are read up to SNIFF_BYTES
+    try:
+        with zipfile.ZipFile(path) as archive:
+            names = set(archive.namelist())
+            return b"".join(
+                archive.open(member).read(SNIFF_BYTES)
+                for member in XLSX_SNIFFED_MEMBERS
+                if member in names
+            )
+    except (zipfile.BadZipFile, OSError):
+        logger.debug(f"Unable to read {path} as an .xlsx archive", exc_info=True)
+        return b""
+
+
+# How to extract the text of each format, and how it's encoded
+_FORMATS = {
+    XLS_MAGIC: (_xls_text, "utf-16-le"),
+    XLSX_MAGIC: (_xlsx_text, "utf-8"),
+}
+
+
+def sniff_parser(path: Path) -> Type["ReportParser"] | None:
+    """
+    Identify the parser of the report by its content, reading only a bounded prefix of it
+    """
+    with open(path, "rb") as f:
+        prefix = f.read(SNIFF_BYTES)
+
+    texts = {}
+    for signature in SIGNATURES:
+        if not prefix.startswith(signature.magic):
+            continue
+
+        read_text, encoding = _FORMATS[signature.magic]
+        if signature.magic not in texts:
+            texts[signature.magic] = read_text(path, prefix)
+
+        if all(m.encode(encoding) in texts[signature.magic] for m in signature.markers):
+            return signature.parser
+
+    return None
+
+
+def get_download_url(
+    path: Path, attr: str = "com.apple.metadata:kMDItemWhereFroms"
+) -> str | None:
+    # noinspection PyBroadException
+    try:
+        import xattr
+
+        dl_link: bytes = xattr.getxattr(path, attr)
+        return dl_link.decode("utf-8", "ignore")
+    except Exception:
+        logger.debug(f"Unable to find source of {path}", exc_info=True)
+        return None
+
+
+def find_parser(path: Path) -> Type["ReportParser"]:
+    with metrics.time("detect"):
+        parser = sniff_parser(path)
+    if parser is not None:
+        return parser
+
+    # Fall back to where the report was downloaded from (macOS keeps it in an extended attribute)
+    with metrics.time("xattr"):
+        dl_url = get_download_url(path)
+    if dl_url is not None:
+        for signature in SIGNATURES:
+            if signature.url_hint in dl_url:
+                return signature.parser
+
+    raise ValueError(f"Couldn't find an appropriate parser for {path}")
@@ -0,0 +1,12 @@
+from pathlib import Path
+
+import typer
+
+
+def app_dir() -> Path:
+    # Where finparse keeps its local state (upload index, caches, etc.). Resolved when it's used, so it follows the
+    # environment (XDG_CONFIG_HOME)
+    return Path(typer.get_app_dir("finparse"))
+
+
+DEFAULT_INDEX_PATH = app_dir() / "uploaded.sqlite3"
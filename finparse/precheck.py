@@ -0,0 +1,155 @@
+"""
+Skipping the rows that are already in Firefly III, by listing the transactions of the account over the date range of
+the rows before uploading them. Unlike the upload index, this doesn't depend on any local state.
+"""
+
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Iterable, Iterator
+
+from firefly_iii_client import TransactionTypeFilter
+from loguru import logger
+
+from finparse.firefly import Firefly
+from finparse.index import transaction_key
+from finparse.metrics import metrics
+from finparse.models import Card, AnyTransaction
+from finparse.utils import batched
+
+
+def match_key(
+    external_id: str | None, day: date, amount: str, description: str
+) -> tuple:
+    # Firefly III returns amounts with its own precision ("12.500000000000"), and trims descriptions
+    return external_id or None, day, Decimal(amount), description.strip()
+
+
+class ExistingTransactions:
+    """
+    The withdrawals of an asset account in Firefly III, matched to rows by their external ID, date, amount and
+    description.
+
+    Identical rows (two coffees on the same day) are counted, so each transaction in Firefly III only accounts for a
+    single row.
+
+    Rows are read ahead a window at a time, and only the days of a window that weren't listed for a previous one are
+    listed, so the rows are streamed rather than collected, and no day is listed (and counted) twice.
+    """
+
+    def __init__(
+        self,
+        firefly: Firefly,
+        account_id: str,
+        page_size: int = 500,
+        window_size: int = 200,
+    ):
+        self.firefly = firefly
+        self.account_id = account_id
+        self.page_size = page_size
+        self.window_size = window_size
+
+    def fetch(self, start: date, end: date) -> Counter[tuple]:
+        existing = Counter()
+        page = 1
+        with metrics.time("precheck"):
+            while True:
+                with metrics.time("http", histogram="request_latency"):
+                    response = self.firefly.accounts_api.list_transaction_by_account(
+                        self.account_id,
+                        limit=self.page_size,
+                        page=page,
+                        start=start,
+                        end=end,
+                        type=TransactionTypeFilter.WITHDRAWAL,
+                    )
+
+                for transaction in response.data:
+                    for split in transaction.attributes.transactions:
+                        key = match_key(
+                            split.external_id,
+                            split.var_date.date(),
+                            split.amount,
+                            split.description,
+                        )
+                        existing[key] += 1
+
+                pagination = response.meta.pagination
+                if pagination is None or page >= (pagination.total_pages or 1):
+                    break
+                page += 1
+
+        logger.info(
+            f"Found {existing.total()} transactions in Firefly III between {start} and {end}"
+        )
+        return existing
+
+    @staticmethod
+    def _unlisted_ranges(
+        days: set[date], listed: set[date]
+    ) -> Iterator[tuple[date, date]]:
+        """
+        Group the days that weren't listed yet into ranges that don't overlap the listed days
+        """
+        start = end = None
+        for day in sorted(days - listed):
+            if end is not None and not any(
+                end + timedelta(days=i) in listed for i in range(1, (day - end).days)
+            ):
+                end = day
+                continue
+            if start is not None:
+                yield start, end
+            start = end = day
+        if start is not None:
+            yield start, end
+
+    def filter_new(
+        self, rows: Iterable[tuple[Card, AnyTransaction]]
+    ) -> Iterator[tuple[Card, AnyTransaction]]:
+        """
+        Yield only the rows that aren't in Firefly III yet. The rows are read ahead a window at a time, to find their
+        date range.
+        """
+        existing: Counter[tuple] = Counter()
+        listed: set[date] = set()
+        # The skipped rows (see Card.skipped) of the current card that were matched to Firefly III's transactions
+        card, matched_skipped = None, Counter()
+
+        skipped = 0
+        for window in batched(rows, self.window_size):
+            days = {transaction.date.date() for _, transaction in window}
+            for start, end in self._unlisted_ranges(days, listed):
+                existing.update(self.fetch(start, end))
+                listed.update(
+                    start + timedelta(days=i) for i in range((end - start).days + 1)
+                )
+
+            for row_card, transaction in window:
+                key = match_key(
+                    transaction.id,
+                    transaction.date.date(),
+                    transaction.amount,
+                    transaction.description,
+                )
+                if row_card is not card:
+                    card, matched_skipped = row_card, Counter()
+                if card.skipped:
+                    # Firefly III has the skipped rows identical to this one too, which don't account for it
+                    tkey = transaction_key(transaction, card)
+                    if unmatched := card.skipped[tkey] - matched_skipped[tkey]:
+                        existing[key] -= min(existing[key], unmatched)
+                        matched_skipped[tkey] += unmatched
+
+                if existing[key]:
+                    existing[key] -= 1
+                    logger.debug(
+                        "Skipping transaction already in Firefly III: {}", transaction
+                    )
+                    metrics.incr("skipped")
+                    skipped += 1
+                    continue
+                yield card, transaction
+
+        if skipped:
+            logger.info(f"Skipped {skipped} transactions already in Firefly III")
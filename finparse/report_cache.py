@@ -0,0 +1,180 @@
+"""
+Content-addressed cache of parsed reports, so parsing the same report again skips decoding the spreadsheet
+"""
+
+import hashlib
+import inspect
+import os
+import pickle
+import struct
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Iterator, Type
+
+from loguru import logger
+
+from finparse import models
+from finparse.metrics import metrics
+from finparse.models import Card, ReportParser, TransactionRow, TransactionTable
+from finparse.paths import app_dir
+
+CACHE_SUFFIX = ".pickle.zlib"
+
+# Entries are a sequence of frames, one per table: its compressed length, followed by the compressed pickled table
+_FRAME_HEADER = struct.Struct("<Q")
+
+
+@lru_cache
+def parser_version(parser: Type[ReportParser]) -> str:
+    """
+    Hash of the source of the modules of the parser and its base classes (e.g. the spec it's generated by), and of the
+    models, which changes whenever the parser (or what it produces) does
+    """
+    bases = {inspect.getmodule(cls) for cls in parser.__mro__[1:]}
+    modules = {inspect.getmodule(parser), models} | {
+        m for m in bases if m.__name__.startswith("finparse.")
+    }
+    digest = hashlib.sha256()
+    for module in sorted(modules, key=lambda m: m.__name__):
+        digest.update(Path(inspect.getfile(module)).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def file_hash(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class ReportCache:
+    """
+    Parsed reports (as tables of transactions per card), keyed by the hash of the report's content and the version of
+    its parser. Entries are pickled and compressed, and the least recently used ones are evicted once the cache grows
+    past max_bytes.
+
+    Tables are read and written one at a time, so a report is never held in memory whole: on a miss, each table is
+    handed on as soon as it's parsed, while it's appended to the new entry.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path | None = None,
+        max_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.cache_dir = cache_dir or app_dir() / "reports"
+        self.max_bytes = max_bytes
+
+    def _path(self, parser: Type[ReportParser], report_path: Path) -> Path:
+        key = f"{file_hash(report_path)}-{parser.__name__}-{parser_version(parser)}"
+        return self.cache_dir / f"{key}{CACHE_SUFFIX}"
+
+    @staticmethod
+    def _split_frames(data: bytes) -> list[memoryview]:
+        frames, offset, data = [], 0, memoryview(data)
+        while offset < len(data):
+            if offset + _FRAME_HEADER.size > len(data):
+                raise EOFError("Truncated frame header")
+            (length,) = _FRAME_HEADER.unpack_from(data, offset)
+            offset += _FRAME_HEADER.size
+            if offset + length > len(data):
+                raise EOFError("Truncated frame")
+            frames.append(data[offset : offset + length])
+            offset += length
+        return frames
+
+    def _load(self, path: Path) -> list[memoryview] | None:
+        """
+        The compressed frames of the entry's tables, which are decompressed one at a time as they're used
+        """
+        try:
+            frames = self._split_frames(path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError):
+            logger.warning(f"Discarding unreadable report cache entry {path.name}")
+            path.unlink(missing_ok=True)
+            return None
+
+        # Mark the entry as recently used
+        os.utime(path)
+        return frames
+
+    @staticmethod
+    def _write_table(f: BinaryIO, table: TransactionTable):
+        frame = zlib.compress(pickle.dumps(table, protocol=pickle.HIGHEST_PROTOCOL))
+        f.write(_FRAME_HEADER.pack(len(frame)))
+        f.write(frame)
+
+    def _parse_and_save(
+        self, parser: Type[ReportParser], report_path: Path, path: Path
+    ) -> Iterator[TransactionTable]:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                for table in parser.parse_tables(report_path):
+                    self._write_table(f, table)
+                    yield table
+            tmp_path.replace(path)
+        finally:
+            # Unless the whole report was parsed (and the entry saved)
+            tmp_path.unlink(missing_ok=True)
+        self.evict()
+
+    def evict(self):
+        """
+        Delete the least recently used entries, until the cache fits in max_bytes
+        """
+        entries = []
+        for entry in self.cache_dir.glob(f"*{CACHE_SUFFIX}"):
+            try:
+                entries.append((entry.stat(), entry))
+            except FileNotFoundError:
+                continue
+
+        total = sum(stat.st_size for stat, _ in entries)
+        for stat, entry in sorted(entries, key=lambda e: e[0].st_mtime):
+            if total <= self.max_bytes:
+                break
+            logger.debug(f"Evicting {entry.name} from the report cache")
+            entry.unlink(missing_ok=True)
+            total -= stat.st_size
+
+    def iter_tables(
+        self, parser: Type[ReportParser], report_path: Path
+    ) -> Iterator[TransactionTable]:
+        path = self._path(parser, report_path)
+        if (frames := self._load(path)) is not None:
+            logger.info(f"Loading {report_path.name} from the report cache")
+            for frame in frames:
+                table = pickle.loads(zlib.decompress(frame))
+                # Like the tables of the parser, on a miss
+                metrics.incr("rows_parsed", len(table))
+                yield table
+            return
+
+        yield from self._parse_and_save(parser, report_path, path)
+
+    def parse_tables(
+        self, parser: Type[ReportParser], report_path: Path
+    ) -> list[TransactionTable]:
+        return list(self.iter_tables(parser, report_path))
+
+    def iter_transactions(
+        self, parser: Type[ReportParser], report_path: Path
+    ) -> Iterator[tuple[Card, TransactionRow]]:
+        for table in self.iter_tables(parser, report_path):
+            yield from table.iter_transactions()
+
+    def parse_workbook(
+        self, parser: Type[ReportParser], report_path: Path
+    ) -> list[Card]:
+        cards = []
+        for table in self.iter_tables(parser, report_path):
+            table.card.transactions = models.validate_rows(list(table.rows()))
+            cards.append(table.card)
+        return cards
+
+    def clear(self):
+        for entry in self.cache_dir.glob(f"*{CACHE_SUFFIX}"):
+            entry.unlink(missing_ok=True)
@@ -0,0 +1,202 @@
+"""
+Keeping the "Finparse: Category Translations" rule group in sync with the category translations of the parsers, so
+Firefly III categorizes transactions by their reported category too (e.g. ones imported with the Data Importer).
+
+Every category gets a single rule, with a trigger for every reported category that translates to it. Reported
+categories are matched by the notes finparse writes (see Transaction.firefly_notes). Only the rules that differ are
+created, updated or deleted, so syncing rules that are already in sync costs no requests at all. Categories are never
+created, so translations to categories that are missing in Firefly III are skipped.
+"""
+
+from dataclasses import dataclass, field
+
+from firefly_iii_client import (
+    RuleActionKeyword,
+    RuleActionStore,
+    RuleGroupUpdate,
+    RuleStore,
+    RuleTriggerKeyword,
+    RuleTriggerStore,
+    RuleTriggerType,
+    RuleTriggerUpdate,
+    RuleUpdate,
+)
+from loguru import logger
+
+from finparse.firefly import (
+    Categories,
+    CategoryRule,
+    CategoryRuleType,
+    Firefly,
+    normalize_category,
+)
+from finparse.upload import generate_notes_str
+
+TRIGGER_TYPE = RuleTriggerKeyword.NOTES_CONTAINS
+
+
+def translation_activator(reported_category: str) -> str:
+    # Includes the terminator of the note, so a reported category doesn't match the ones it's a prefix of
+    return generate_notes_str(**{"Reported Category": reported_category})
+
+
+@dataclass
+class RuleSyncPlan:
+    # Category name -> the activators of its new rule
+    create: dict[str, list[str]] = field(default_factory=dict)
+    # Rule ID -> the name of its category, and its new activators
+    update: dict[str, tuple[str, list[str]]] = field(default_factory=dict)
+    # Rule IDs
+    delete: list[str] = field(default_factory=list)
+    # The order to move the translation rule group to, if it's applied after the description rules, which would let
+    # the reported category override the category of a description rule
+    translation_group_order: int | None = None
+
+    def __len__(self) -> int:
+        """
+        Number of requests it takes to apply the plan
+        """
+        return (
+            len(self.create)
+            + len(self.update)
+            + len(self.delete)
+            + (self.translation_group_order is not None)
+        )
+
+
+def _in_sync(rule: CategoryRule, activators: list[str]) -> bool:
+    return sorted(rule.activators) == activators and all(
+        trigger_type == TRIGGER_TYPE.value for trigger_type in rule.trigger_types
+    )
+
+
+def plan_translation_rules(
+    categories: Categories, translations: dict[str, str]
+) -> RuleSyncPlan:
+    """
+    Diff the translation rules in Firefly III with the translations (reported category -> category name)
+    """
+    names = {}
+    for name in categories.id_by_name:
+        names.setdefault(normalize_category(name), name)
+        names[name] = name
+
+    wanted: dict[str, list[str]] = {}
+    for reported_category, category_name in translations.items():
+        name = names.get(category_name) or names.get(normalize_category(category_name))
+        if name is None:
+            # Like CategoryLookup, so a misspelled translation doesn't create a category
+            logger.warning(
+                f"No {category_name!r} category in Firefly III, skipping the translation rule of "
+                f"{reported_category!r}"
+            )
+            continue
+        wanted.setdefault(name, []).append(translation_activator(reported_category))
+    for activators in wanted.values():
+        activators.sort()
+
+    plan = RuleSyncPlan()
+    for category in categories.by_id.values():
+        rules = category.translation_rules
+        activators = wanted.get(category.name)
+        if activators is None:
+            plan.delete.extend(rule.id for rule in rules)
+            continue
+
+        if not rules:
+            plan.create[category.name] = activators
+            continue
+
+        # Keep the first rule, and merge any others into it
+        rule, *duplicates = rules
+        plan.delete.extend(duplicate.id for duplicate in duplicates)
+        if not _in_sync(rule, activators):
+            plan.update[rule.id] = (category.name, activators)
+
+    orders = categories.rule_group_orders
+    translation_order = orders.get(CategoryRuleType.TranslationRule)
+    description_order = orders.get(CategoryRuleType.DescriptionRule)
+    if (
+        translation_order is not None
+        and description_order is not None
+        and translation_order > description_order
+    ):
+        plan.translation_group_order = description_order
+
+    return plan
+
+
+def _triggers(activators: list[str], trigger_model: type) -> list:
+    return [trigger_model(type=TRIGGER_TYPE, value=a) for a in activators]
+
+
+def apply_plan(firefly: Firefly, plan: RuleSyncPlan):
+    """
+    Apply the plan to Firefly III, and to the loaded categories, so they stay in sync with Firefly III
+    """
+    categories = firefly.categories
+    rule_type = CategoryRuleType.TranslationRule
+
+    if (order := plan.translation_group_order) is not None:
+        # Firefly III moves the groups from this order on down, including the description rules group
+        firefly.rule_groups_api.update_rule_group(
+            categories.rule_group_ids[rule_type], RuleGroupUpdate(order=order)
+        )
+        categories.rule_group_orders[CategoryRuleType.DescriptionRule] = order + 1
+        categories.rule_group_orders[rule_type] = order
+        logger.info("Moved the translation rules before the description rules")
+
+    for rule_id in plan.delete:
+        firefly.rules_api.delete_rule(rule_id)
+        for category in categories.by_id.values():
+            category.translation_rules = [
+                rule for rule in category.translation_rules if rule.id != rule_id
+            ]
+    if plan.delete:
+        logger.info(f"Deleted {len(plan.delete)} translation rules")
+
+    for rule_id, (name, activators) in plan.update.items():
+        updated = firefly.rules_api.update_rule(
+            rule_id,
+            RuleUpdate(triggers=_triggers(activators, RuleTriggerUpdate), strict=False),
+        )
+        category = categories[name]
+        category.translation_rules = [
+            rule for rule in category.translation_rules if rule.id != rule_id
+        ]
+        category.add_rule(rule_type, updated.data)
+        logger.info(f"Updated the translation rule of {name!r}")
+
+    for name, activators in plan.create.items():
+        created = firefly.rules_api.store_rule(
+            RuleStore(
+                title=f"{rule_type.value}: {name}",
+                rule_group_id=categories.rule_group_ids[rule_type],
+                trigger=RuleTriggerType.STORE_MINUS_JOURNAL,
+                # Any of the reported categories sets the category
+                strict=False,
+                triggers=_triggers(activators, RuleTriggerStore),
+                actions=[
+                    RuleActionStore(type=RuleActionKeyword.SET_CATEGORY, value=name)
+                ],
+            )
+        )
+        categories[name].add_rule(rule_type, created.data)
+        logger.info(f"Created a translation rule for {name!r}")
+
+
+def sync_translation_rules(
+    firefly: Firefly, translations: dict[str, str]
+) -> RuleSyncPlan:
+    plan = plan_translation_rules(firefly.categories, translations)
+    if not plan:
+        logger.info("Category translation rules are in sync")
+        return plan
+
+    apply_plan(firefly, plan)
+    # Rule changes don't always change the rule group, which the metadata snapshot is validated by
+    if firefly.metadata_cache is not None:
+        firefly.metadata_cache.clear()
+
+    logger.success(f"Synced category translation rules ({len(plan)} changes)")
+    return plan
@@ -0,0 +1,314 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Iterable
+
+import urllib3
+from firefly_iii_client import (
+    ApiException,
+    TransactionSplitStore,
+    TransactionStore,
+    TransactionTypeProperty,
+)
+from loguru import logger
+from pydantic import BaseModel
+
+from finparse.firefly import CategoryLookup, Firefly
+from finparse.index import UploadIndex
+from finparse.journal import CheckpointJournal
+from finparse.matcher import CategoryMatcher
+from finparse.metrics import metrics
+from finparse.models import Card, AnyTransaction
+from finparse.precheck import ExistingTransactions
+from finparse.utils import batched
+
+
+def generate_notes_str(**notes) -> str:
+    # Every note is terminated, so rules can match a whole value ("Reported Category: X;" isn't in "...: X Y;")
+    return "\n".join(f"{k}: {v};" for k, v in notes.items())
+
+
+def build_transaction_store(
+    transaction: AnyTransaction,
+    card: Card,
+    categories: CategoryLookup,
+    account_id: str,
+    matcher: CategoryMatcher | None = None,
+    error_if_duplicate: bool = False,
+) -> TransactionStore:
+    # Description rules are more specific than the category reported by the issuer, so they take precedence
+    category_id = None
+    if matcher is not None and (name := matcher.match(transaction.description)):
+        category_id = categories.by_name(name)
+    if category_id is None:
+        category_id = categories.by_reported(transaction.category)
+
+    transaction_store = TransactionSplitStore(
+        amount=transaction.amount,
+        var_date=datetime.combine(transaction.date, datetime.min.time()),
+        description=transaction.description,
+        category_id=category_id,
+        currency_code=transaction.currency.name,
+        external_id=transaction.id,
+        foreign_amount=transaction.foreign_amount,
+        foreign_currency_code=(
+            transaction.foreign_currency.name if transaction.foreign_currency else None
+        ),
+        source_id=account_id,
+        type=TransactionTypeProperty.WITHDRAWAL,
+        notes=generate_notes_str(**transaction.firefly_notes),
+        tags=[card.description],
+    )
+
+    return TransactionStore(
+        transactions=[transaction_store], error_if_duplicate_hash=error_if_duplicate
+    )
+
+
+def upload_transaction(
+    transaction: AnyTransaction,
+    card: Card,
+    firefly: Firefly,
+    categories: CategoryLookup,
+    account_id: str,
+    error_if_duplicate: bool = False,
+):
+    transaction_store = build_transaction_store(
+        transaction,
+        card,
+        categories,
+        account_id,
+        firefly.categories.matcher,
+        error_if_duplicate,
+    )
+    with metrics.time("http", histogram="request_latency"):
+        firefly.transactions_api.store_transaction(transaction_store)
+
+
+def upload_serially(
+    rows: Iterable[tuple[Card, AnyTransaction]],
+    firefly: Firefly,
+    category_translations: dict[str, str],
+    account_id: str,
+    index: UploadIndex | None = None,
+    journal: CheckpointJournal | None = None,
+    existing: ExistingTransactions | None = None,
+):
+    # Firefly III is only asked about the rows that aren't known locally
+    if journal is not None:
+        rows = journal.filter_new(rows)
+    if index is not None:
+        rows = index.filter_new(rows)
+    if existing is not None:
+        rows = existing.filter_new(rows)
+
+    categories = CategoryLookup(firefly.categories, category_translations)
+    current_card = None
+    for card, transaction in rows:
+        if card is not current_card:
+            logger.info(f"Uploading transactions for {card.description}")
+            current_card = card
+
+        logger.debug("Transaction: {}", transaction)
+        upload_transaction(transaction, card, firefly, categories, account_id)
+        metrics.incr("uploaded")
+        if index is not None:
+            index.add(transaction, card)
+        if journal is not None:
+            journal.add(transaction, card)
+
+
+class UploadResult(BaseModel):
+    card: Card
+    transaction: AnyTransaction
+    error: str | None = None
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+
+class UploadReport(BaseModel):
+    """
+    Outcome of an upload. Only failures are kept, so memory doesn't grow with the number of uploaded rows
+    """
+
+    uploaded: int = 0
+    failures: list[UploadResult] = []
+
+    @property
+    def total(self) -> int:
+        return self.uploaded + len(self.failures)
+
+    def add(self, result: UploadResult):
+        if result.success:
+            self.uploaded += 1
+        else:
+            self.failures.append(result)
+
+
+def _is_retryable(e: ApiException) -> bool:
+    return e.status == 429 or (e.status or 0) >= 500
+
+
+def _is_duplicate(e: ApiException) -> bool:
+    # Firefly III rejects a transaction whose hash is already stored with a validation error
+    return e.status == 422 and "Duplicate of transaction" in (e.body or "")
+
+
+def _retry_after(e: ApiException) -> float | None:
+    """
+    Seconds the server asked us to wait (by the Retry-After header), if any
+    """
+    try:
+        return float(e.headers["Retry-After"])
+    except (TypeError, KeyError, ValueError):
+        return None
+
+
+class AsyncUploader:
+    """
+    Uploads transactions from a bounded pool of workers that share the Firefly client's keep-alive connection pool.
+
+    Firefly III has no endpoint for storing multiple (unrelated) transactions in one request, so each transaction is
+    still one request. Rows are handed to the workers in batches through a bounded queue, so the producer (parsing)
+    never runs too far ahead of the uploads. Rate limited (429) and failed (5xx) requests, and network errors (a reset
+    connection, a timeout), are retried with exponential backoff.
+
+    A failed request may have been stored anyway (e.g. when its response timed out), so retries ask Firefly III to
+    reject duplicates, and a duplicate counts as uploaded. The first attempt doesn't, since identical transactions (two
+    coffees on the same day) share a hash.
+    """
+
+    def __init__(
+        self,
+        firefly: Firefly,
+        category_translations: dict[str, str],
+        account_id: str,
+        concurrency: int = 4,
+        batch_size: int = 1,
+        retries: int = 5,
+        backoff: float = 0.5,
+        index: UploadIndex | None = None,
+        journal: CheckpointJournal | None = None,
+        existing: ExistingTransactions | None = None,
+    ):
+        self.firefly = firefly
+        self.categories = CategoryLookup(firefly.categories, category_translations)
+        self.account_id = account_id
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self.index = index
+        self.journal = journal
+        self.existing = existing
+
+    async def _upload_transaction(
+        self, executor: ThreadPoolExecutor, card: Card, transaction: AnyTransaction
+    ) -> UploadResult:
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(self.retries + 1):
+            try:
+                await loop.run_in_executor(
+                    executor,
+                    upload_transaction,
+                    transaction,
+                    card,
+                    self.firefly,
+                    self.categories,
+                    self.account_id,
+                    attempt > 0,
+                )
+            except ApiException as e:
+                if attempt and _is_duplicate(e):
+                    logger.info(f"{transaction} was already stored by a failed attempt")
+                    return UploadResult(card=card, transaction=transaction)
+                if attempt < self.retries and _is_retryable(e):
+                    metrics.incr("retries")
+                    delay = _retry_after(e) or self.backoff * 2**attempt
+                    logger.warning(
+                        f"Got {e.status} for {transaction}, retrying in {delay:.2f}s"
+                    )
+                    await asyncio.sleep(delay)
+                    continue
+
+                logger.error(f"Failed uploading {transaction}: {e.status} {e.reason}")
+                error = f"{e.status} {e.reason}"
+                return UploadResult(card=card, transaction=transaction, error=error)
+            except urllib3.exceptions.HTTPError as e:
+                if attempt < self.retries:
+                    metrics.incr("retries")
+                    delay = self.backoff * 2**attempt
+                    logger.warning(
+                        f"Network error for {transaction} ({e!r}), retrying in {delay:.2f}s"
+                    )
+                    await asyncio.sleep(delay)
+                    continue
+
+                logger.error(f"Failed uploading {transaction}: {e!r}")
+                return UploadResult(card=card, transaction=transaction, error=repr(e))
+
+            return UploadResult(card=card, transaction=transaction)
+
+    async def _worker(
+        self,
+        executor: ThreadPoolExecutor,
+        queue: asyncio.Queue,
+        report: UploadReport,
+    ):
+        while (batch := await queue.get()) is not None:
+            for card, transaction in batch:
+                logger.debug("Transaction: {}", transaction)
+                result = await self._upload_transaction(executor, card, transaction)
+                metrics.incr("uploaded" if result.success else "failed")
+                if self.index is not None and result.success:
+                    self.index.add(transaction, card)
+                if self.journal is not None and result.success:
+                    self.journal.add(transaction, card)
+                report.add(result)
+
+    async def upload_rows(
+        self, rows: Iterable[tuple[Card, AnyTransaction]]
+    ) -> UploadReport:
+        """
+        Upload the rows, pulling them from the (possibly lazy) iterable on a separate thread, so parsing overlaps with
+        uploading
+        """
+        loop = asyncio.get_running_loop()
+        report = UploadReport()
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        if self.journal is not None:
+            rows = self.journal.filter_new(rows)
+        if self.index is not None:
+            rows = self.index.filter_new(rows)
+        if self.existing is not None:
+            rows = self.existing.filter_new(rows)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            async with asyncio.TaskGroup() as tg:
+                for _ in range(self.concurrency):
+                    tg.create_task(self._worker(executor, queue, report))
+
+                batches = batched(rows, self.batch_size)
+                while batch := await loop.run_in_executor(None, next, batches, ()):
+                    await queue.put(batch)
+
+                for _ in range(self.concurrency):
+                    await queue.put(None)
+
+        return report
+
+    def upload(self, cards: Iterable[Card]) -> UploadReport:
+        rows = ((card, t) for card in cards for t in card.transactions)
+        return asyncio.run(self.upload_rows(rows))
+
+
+def log_report(report: UploadReport):
+    logger.success(f"Uploaded {report.uploaded}/{report.total} transactions")
+    for result in report.failures:
+        logger.error(
+            f"Failed ({result.card.description}): {result.transaction} - {result.error}"
+        )
@@ -0,0 +1,11 @@
+from itertools import islice
+from typing import Iterable, Iterator
+
+
+def batched(iterable: Iterable, n: int) -> Iterator[tuple]:
+    """
+    Same as itertools.batched, which is only available from Python 3.12
+    """
+    it = iter(iterable)
+    while batch := tuple(islice(it, n)):
+        yield batch
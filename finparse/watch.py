@@ -0,0 +1,177 @@
+"""
+Watching a directory for new or changed reports: with inotify on Linux, and by polling the directory elsewhere
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterator
+
+from loguru import logger
+
+REPORT_SUFFIXES = (".xls", ".xlsx")
+
+
+def is_report(path: Path) -> bool:
+    # Skip hidden files, and the lock files Excel leaves next to open workbooks
+    return path.suffix.lower() in REPORT_SUFFIXES and not path.name.startswith(
+        (".", "~$")
+    )
+
+
+class DirectoryWatcher(ABC):
+    """
+    Yields batches of the reports in a directory that were created or changed, once they were completely written.
+    Reports that were already in the directory aren't yielded until they change.
+    """
+
+    def __init__(self, directory: Path, interval: float):
+        self.directory = directory
+        self.interval = interval
+        self._stop = threading.Event()
+
+    @abstractmethod
+    def changes(self) -> Iterator[set[Path]]:
+        pass
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class PollingWatcher(DirectoryWatcher):
+    def __init__(self, directory: Path, interval: float = 2.0):
+        super().__init__(directory, interval)
+        self._snapshot = self._scan()
+        self._pending: dict[Path, tuple[int, int]] = {}
+
+    def _scan(self) -> dict[Path, tuple[int, int]]:
+        snapshot = {}
+        for path in self.directory.iterdir():
+            if not is_report(path):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def poll(self) -> set[Path]:
+        """
+        Return the reports that changed before the previous poll, and didn't change since. A report that is still
+        being written (downloaded) keeps changing, so it's returned only after it was left alone for a whole interval.
+        """
+        current = self._scan()
+        ready = {
+            path for path, stat in self._pending.items() if current.get(path) == stat
+        }
+        self._pending = {
+            path: stat
+            for path, stat in current.items()
+            if self._snapshot.get(path) != stat
+        }
+        self._snapshot = current
+        return ready
+
+    def changes(self) -> Iterator[set[Path]]:
+        while not self._stop.wait(self.interval):
+            if ready := self.poll():
+                yield ready
+
+
+class InotifyWatcher(DirectoryWatcher):
+    """
+    Uses the inotify API of Linux (through libc, so there's nothing to install)
+    """
+
+    # Reports are ready once they're closed after being written, or moved into the directory (as browsers do once a
+    # download completes)
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+
+    # struct inotify_event: int wd, uint32_t mask, uint32_t cookie, uint32_t len, and then the name, padded with NULs
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, directory: Path, interval: float = 1.0, settle: float = 0.5):
+        super().__init__(directory, interval)
+        # Events that arrive within this many seconds of each other are yielded together
+        self.settle = settle
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        watch = libc.inotify_add_watch(
+            self._fd,
+            os.fsencode(directory),
+            self.IN_CLOSE_WRITE | self.IN_MOVED_TO,
+        )
+        if watch < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"Unable to watch {directory}")
+
+    def _read_events(self) -> set[Path]:
+        buffer = os.read(self._fd, 64 * 1024)
+        paths = set()
+        offset = 0
+        while offset < len(buffer):
+            _, _, _, name_length = self.EVENT_HEADER.unpack_from(buffer, offset)
+            offset += self.EVENT_HEADER.size
+            name = buffer[offset : offset + name_length].rstrip(b"\0")
+            offset += name_length
+
+            path = self.directory / os.fsdecode(name)
+            if is_report(path):
+                paths.add(path)
+        return paths
+
+    def _readable(self, timeout: float) -> bool:
+        return bool(select.select([self._fd], [], [], timeout)[0])
+
+    def changes(self) -> Iterator[set[Path]]:
+        while not self._stop.is_set():
+            if not self._readable(self.interval):
+                continue
+
+            paths = self._read_events()
+            while self._readable(self.settle):
+                paths |= self._read_events()
+
+            if paths:
+                yield paths
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def watch_directory(directory: Path, poll_interval: float = 2.0) -> DirectoryWatcher:
+    if sys.platform == "linux":
+        try:
+            watcher = InotifyWatcher(directory)
+            logger.info(f"Watching {directory} with inotify")
+            return watcher
+        except (OSError, AttributeError):
+            # AttributeError: a libc without inotify
+            logger.debug("Unable to use inotify", exc_info=True)
+
+    logger.info(f"Watching {directory} by polling it every {poll_interval}s")
+    return PollingWatcher(directory, poll_interval)
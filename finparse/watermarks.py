@@ -0,0 +1,295 @@
+"""
+Per-section watermarks of growing reports: the report of the current billing cycle can be downloaded again every day
+as it grows, so only the rows that were added to each section of each card since its last upload need to be parsed and
+uploaded. Sections grow independently (e.g. the local and foreign transactions of an Isracard card), so each has a
+watermark of its own.
+"""
+
+import hashlib
+import os
+from collections import Counter
+from datetime import date
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from loguru import logger
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from finparse.index import transaction_key
+from finparse.metrics import metrics
+from finparse.models import Card, AnyTransaction
+from finparse.paths import app_dir
+
+# The section of the rows of parsers that don't tell sections apart
+DEFAULT_SECTION = ""
+
+T = TypeVar("T")
+
+
+def fingerprint(transaction: AnyTransaction) -> str:
+    content = "\x1f".join(
+        (
+            transaction.date.isoformat(),
+            transaction.description,
+            transaction.amount,
+            transaction.currency.value,
+            transaction.id or "",
+        )
+    )
+    return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+
+def card_key(card: Card) -> str:
+    # The last 4 digits of cards of different issuers may collide
+    return f"{card.issuer}:{card.last_4_digits}"
+
+
+class Watermark(BaseModel):
+    # The date of the last processed row of the section
+    last_date: date
+    # The number of rows of the section that were processed
+    row: int
+    # The fingerprint of the last processed row
+    fingerprint: str
+    # The keys (see transaction_key) of the processed rows on the last date, which the rows added on that date after
+    # the watermark (a second coffee) are told apart from, without extracting the skipped rows
+    day_keys: dict[str, int]
+
+    def matches(self, transaction: AnyTransaction) -> bool:
+        return transaction.date.date() == self.last_date and (
+            fingerprint(transaction) == self.fingerprint
+        )
+
+
+# Scope -> card -> section name -> watermark
+_watermarks_adapter = TypeAdapter(dict[str, dict[str, dict[str, Watermark]]])
+
+
+class _Replay:
+    """
+    Another pass over the raw rows of the report, for the rows under a watermark that turned out to be needed after
+    all (a report of another billing cycle, or one whose rows changed).
+
+    Sections are identified by the position of their card in the report and their name, and their rows are read in
+    the order they're requested, so usually a single pass is enough.
+    """
+
+    def __init__(
+        self,
+        read: Callable[[], Iterable[tuple[Card, T]]],
+        section: Callable[[T], str] | None,
+    ):
+        self.read = read
+        self.section = section
+        self._rows = None
+        self._reached: set[tuple[int, str]] = set()
+
+    def _positions(self) -> Iterator[tuple[int, str, int, T]]:
+        card, ordinal, positions = None, -1, Counter()
+        for row_card, raw in self.read():
+            if row_card is not card:
+                card, ordinal, positions = row_card, ordinal + 1, Counter()
+            name = self.section(raw) if self.section else DEFAULT_SECTION
+            positions[name] += 1
+            self._reached.add((ordinal, name))
+            yield ordinal, name, positions[name], raw
+
+    def rows(self, ordinal: int, name: str, count: int) -> Iterator[T]:
+        """
+        The first count raw rows of the section
+        """
+        if not count:
+            return
+        if self._rows is None or (ordinal, name) in self._reached:
+            # The pass is already past the section
+            self._rows, self._reached = self._positions(), set()
+
+        for row_ordinal, row_name, position, raw in self._rows:
+            if (row_ordinal, row_name) == (ordinal, name):
+                yield raw
+                if position == count:
+                    return
+
+
+class _SectionFilter:
+    """
+    The rows of a section of a card, as they're filtered by its watermark. The rows under the watermark are skipped
+    without being extracted, only the last of them is extracted, to check it.
+    """
+
+    def __init__(
+        self,
+        card: Card,
+        ordinal: int,
+        name: str,
+        watermark: Watermark | None,
+        extract: Callable[[T], AnyTransaction],
+        replay: _Replay,
+    ):
+        self.card = card
+        self.ordinal = ordinal
+        self.name = name
+        self.watermark = watermark
+        self.mark = watermark.row if watermark is not None else 0
+        self.extract = extract
+        self.replay = replay
+        self.position = 0
+        self.last: AnyTransaction | None = None
+        # The processed rows on the date of the last of them, and the keys of the skipped ones
+        self.day: date | None = None
+        self.day_rows: list[AnyTransaction] = []
+        self.day_keys: Counter[str] = Counter()
+        self.label = f"card {card.last_4_digits}" + (f" ({name})" if name else "")
+
+    def _process(self, transaction: AnyTransaction) -> tuple[Card, AnyTransaction]:
+        if transaction.date.date() != self.day:
+            self.day, self.day_rows, self.day_keys = (
+                transaction.date.date(),
+                [],
+                Counter(),
+            )
+        self.day_rows.append(transaction)
+        self.last = transaction
+        return self.card, transaction
+
+    def _replayed(self, count: int) -> Iterator[tuple[Card, AnyTransaction]]:
+        for raw in self.replay.rows(self.ordinal, self.name, count):
+            yield self._process(self.extract(raw))
+
+    def add(self, raw) -> Iterator[tuple[Card, AnyTransaction]]:
+        self.position += 1
+        if self.position < self.mark:
+            return
+
+        transaction = self.extract(raw)
+        if self.position > self.mark:
+            yield self._process(transaction)
+            return
+
+        # The last row under the watermark
+        if self.watermark.matches(transaction):
+            self.last = transaction
+            self.day = self.watermark.last_date
+            self.day_keys = Counter(self.watermark.day_keys)
+            # So the uploader counts the rows identical to the skipped ones from them (see OccurrenceCounter)
+            self.card.skipped.update(self.day_keys)
+            logger.info(
+                f"Skipping {self.mark} rows of {self.label} "
+                f"(up to {self.watermark.last_date}), which were already processed"
+            )
+            metrics.incr("skipped", self.mark)
+            return
+
+        logger.info(
+            f"The rows of {self.label} changed since its watermark, processing all of them"
+        )
+        yield from self._replayed(self.mark - 1)
+        yield self._process(transaction)
+
+    def finish(self) -> Iterator[tuple[Card, AnyTransaction]]:
+        if self.position < self.mark:
+            logger.info(
+                f"The {self.label} has fewer rows than its watermark ({self.mark}), processing all of them"
+            )
+            yield from self._replayed(self.position)
+
+    def new_watermark(self) -> Watermark | None:
+        if self.last is None:
+            return None
+
+        day_keys = self.day_keys + Counter(
+            transaction_key(transaction, self.card) for transaction in self.day_rows
+        )
+        return Watermark(
+            last_date=self.last.date.date(),
+            row=self.position,
+            fingerprint=fingerprint(self.last),
+            day_keys=day_keys,
+        )
+
+
+class Watermarks:
+    """
+    The watermarks of the sections of each card, by the card and the section's name, within a scope (see index_scope),
+    since the rows that were uploaded to one account say nothing about another.
+
+    The rows under the watermark of a section are skipped only if the last of them is still the row the watermark was
+    recorded at. Otherwise (a report of another billing cycle, or one whose rows changed), all the rows of the section
+    are processed. The watermarks of the processed rows are pending until they're committed, once the rows were
+    uploaded.
+    """
+
+    def __init__(self, path: Path | None = None, scope: str = ""):
+        self.path = path or app_dir() / "watermarks.json"
+        self.scope = scope
+        self.by_card: dict[str, dict[str, Watermark]] = self._load().get(scope, {})
+        self.pending: dict[str, dict[str, Watermark]] = {}
+
+    def _load(self) -> dict[str, dict[str, dict[str, Watermark]]]:
+        try:
+            return _watermarks_adapter.validate_json(self.path.read_bytes())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValidationError):
+            logger.warning(f"Ignoring unreadable watermarks {self.path}")
+            return {}
+
+    def filter_new(
+        self,
+        read: Callable[[], Iterable[tuple[Card, T]]],
+        extract: Callable[[T], AnyTransaction] | None = None,
+        section: Callable[[T], str] | None = None,
+    ) -> Iterator[tuple[Card, AnyTransaction]]:
+        """
+        Yield only the rows of each section of each card that are after its watermark, and record the new watermarks
+        as pending.
+
+        The rows are read by read, and can be extracted (by extract) from raw rows of the report, whose section is
+        named by section. The rows under a watermark are then never built, besides the last one, which is checked
+        against the watermark. Only if they're needed after all, they're read again.
+        """
+        extract = extract or (lambda raw: raw)
+        replay = _Replay(read, section)
+        card, ordinal, sections = None, -1, {}
+
+        def finish_card() -> Iterator[tuple[Card, AnyTransaction]]:
+            for name, section_filter in sections.items():
+                yield from section_filter.finish()
+                if (watermark := section_filter.new_watermark()) is not None:
+                    self.pending.setdefault(card_key(card), {})[name] = watermark
+
+        for row_card, raw in read():
+            if row_card is not card:
+                if card is not None:
+                    yield from finish_card()
+                card, ordinal, sections = row_card, ordinal + 1, {}
+
+            name = section(raw) if section else DEFAULT_SECTION
+            if (section_filter := sections.get(name)) is None:
+                watermark = self.by_card.get(card_key(card), {}).get(name)
+                section_filter = sections[name] = _SectionFilter(
+                    card, ordinal, name, watermark, extract, replay
+                )
+            yield from section_filter.add(raw)
+
+        if card is not None:
+            yield from finish_card()
+
+    def commit(self):
+        """
+        Save the pending watermarks, once their rows were uploaded
+        """
+        if not self.pending:
+            return
+
+        for key, sections in self.pending.items():
+            self.by_card.setdefault(key, {}).update(sections)
+        self.pending.clear()
+
+        # Read again, to keep the watermarks of the other scopes
+        scopes = self._load()
+        scopes[self.scope] = self.by_card
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(_watermarks_adapter.dump_json(scopes, indent=2))
+        tmp_path.replace(self.path)
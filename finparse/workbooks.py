@@ -0,0 +1,56 @@
+"""
+Loading the sheets of reports with bounded memory, and releasing them deterministically, so the file handles and
+buffers of a report don't outlive its parsing (when parsing many reports in one process).
+
+The spreadsheet libraries are imported when a sheet is opened, so only the library of the detected issuer is imported.
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, TYPE_CHECKING
+
+from finparse.metrics import metrics
+
+if TYPE_CHECKING:
+    from openpyxl.worksheet.worksheet import Worksheet
+    from xlrd.sheet import Sheet
+
+
+@contextmanager
+def open_xls_sheet(path: Path, index: int = 0) -> Iterator["Sheet"]:
+    """
+    Open a sheet of an .xls workbook. The file is memory mapped, and only the requested sheet is decoded.
+    """
+    import xlrd
+
+    with metrics.time("load_workbook"):
+        book = xlrd.open_workbook(path, on_demand=True, use_mmap=True)
+        try:
+            sheet = book.sheet_by_index(index)
+        finally:
+            # The decoded sheet doesn't need the mapped file or the shared strings table
+            book.release_resources()
+
+    try:
+        yield sheet
+    finally:
+        book.unload_sheet(index)
+
+
+@contextmanager
+def open_xlsx_sheet(path: Path, index: int = 0) -> Iterator["Worksheet"]:
+    """
+    Open a sheet of an .xlsx workbook in read-only mode, which streams its rows from the archive rather than loading
+    them. The archive stays open until the sheet is closed.
+    """
+    import openpyxl
+
+    with metrics.time("load_workbook"):
+        workbook = openpyxl.load_workbook(
+            path, read_only=True, data_only=True, keep_links=False
+        )
+
+    try:
+        yield workbook.worksheets[index]
+    finally:
+        workbook.close()
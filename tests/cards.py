@@ -0,0 +1,33 @@
+"""
+Synthetic cards, for the tests that upload, match or export transactions without parsing a report first
+"""
+
+from datetime import datetime
+from typing import Iterator
+
+from finparse.models import Card, Currency, Transaction
+
+
+def make_card(transactions: int) -> Card:
+    return Card(
+        name="Test Card",
+        last_4_digits="1234",
+        transactions=[
+            Transaction(
+                date=datetime(2024, 1, 1 + i % 28),
+                description=f"Business {i}",
+                amount=str(i + 1),
+                currency=Currency.ILS,
+                foreign_amount=str(i + 1),
+                foreign_currency=Currency.ILS,
+                id=str(i),
+            )
+            for i in range(transactions)
+        ],
+    )
+
+
+def make_rows(transactions: int) -> Iterator[tuple[Card, Transaction]]:
+    # The (card, transaction) rows of a synthetic card, as they're streamed to the uploader
+    card = make_card(transactions)
+    return ((card, t) for t in card.transactions)
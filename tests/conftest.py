@@ -0,0 +1,24 @@
+import pytest
+
+from fake_firefly import FakeFirefly
+from finparse.firefly import Firefly
+
+
+@pytest.fixture(autouse=True)
+def app_dir(tmp_path, monkeypatch):
+    # The local state of finparse (caches, journals, watermarks) is kept apart from the user's
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+    return tmp_path / "config" / "finparse"
+
+
+@pytest.fixture
+def fake_firefly():
+    fake = FakeFirefly().start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def firefly(fake_firefly) -> Firefly:
+    fake_firefly.add_account("Checking")
+    return Firefly(fake_firefly.url, "token")
@@ -0,0 +1,383 @@
+"""
+A minimal, in-memory Firefly III API server for tests and benchmarks.
+
+Only the endpoints finparse talks to are implemented, and only with the fields the generated client requires.
+"""
+
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+
+# In transaction_failures: close the connection without answering, like a connection reset
+DROP_CONNECTION = "drop"
+# In transaction_failures: store the transaction, but drop the connection before answering, like a response lost to
+# a timeout
+DROP_AFTER_STORING = "drop after storing"
+
+
+def _meta(total: int, page: int = 1, per_page: int = 50) -> dict:
+    total_pages = max((total + per_page - 1) // per_page, 1)
+    return {
+        "pagination": {
+            "total": total,
+            "count": min(per_page, max(total - (page - 1) * per_page, 0)),
+            "per_page": per_page,
+            "current_page": page,
+            "total_pages": total_pages,
+        }
+    }
+
+
+class FakeFirefly:
+    def __init__(self, latency: float = 0):
+        # Seconds every request takes, to simulate a real server (and the network)
+        self.latency = latency
+
+        self.requests: Counter[tuple[str, str]] = Counter()
+        self.categories: dict[str, dict] = {}
+        self.rule_groups: dict[str, dict] = {}
+        self.rules: dict[str, dict] = {}
+        self.accounts: dict[str, dict] = {}
+        self.transactions: dict[str, dict] = {}
+
+        # Status codes to answer the next transaction POSTs with, instead of storing them (None stores the transaction,
+        # DROP_CONNECTION drops the connection and DROP_AFTER_STORING drops it after storing the transaction)
+        self.transaction_failures: list[int | str | None] = []
+
+        self._ids = count(1)
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    # Fixtures
+
+    def next_id(self) -> str:
+        return str(next(self._ids))
+
+    def add_category(self, name: str) -> str:
+        _id = self.next_id()
+        self.categories[_id] = {"name": name}
+        return _id
+
+    def add_account(self, name: str, account_type: str = "asset") -> str:
+        _id = self.next_id()
+        self.accounts[_id] = {"name": name, "type": account_type}
+        return _id
+
+    def add_rule_group(self, title: str, active: bool = True) -> str:
+        _id = self.next_id()
+        order = len(self.rule_groups) + 1
+        self.rule_groups[_id] = {"title": title, "active": active, "order": order}
+        return _id
+
+    def add_rule(
+        self,
+        group_id: str,
+        category: str,
+        activators: list[str],
+        trigger_type: str = "description_contains",
+        strict: bool = False,
+        active: bool = True,
+        inactive_triggers: tuple[str, ...] = (),
+    ) -> str:
+        _id = self.next_id()
+        self.rules[_id] = {
+            "title": f"{category} rule",
+            "rule_group_id": group_id,
+            "trigger": "store-journal",
+            "strict": strict,
+            "active": active,
+            "triggers": [
+                {"type": trigger_type, "value": a, "active": a not in inactive_triggers}
+                for a in activators
+            ],
+            "actions": [{"type": "set_category", "value": category}],
+        }
+        return _id
+
+    # Lifecycle
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    @property
+    def transaction_posts(self) -> int:
+        return self.requests["POST", "/api/v1/transactions"]
+
+    def start(self) -> "FakeFirefly":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.05,), daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # Routing
+
+    def handle(self, method: str, path: str, query: dict, body: dict | None):
+        with self._lock:
+            self.requests[method, path] += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        for route_method, pattern, handler in self._routes():
+            if route_method == method and (match := re.fullmatch(pattern, path)):
+                return handler(query, body, *match.groups())
+
+        return 404, {"message": f"No route for {method} {path}"}
+
+    def _routes(self):
+        return (
+            ("GET", r"/api/v1/about", self._about),
+            ("GET", r"/api/v1/categories", self._list_categories),
+            ("POST", r"/api/v1/categories", self._store_category),
+            ("GET", r"/api/v1/accounts", self._list_accounts),
+            (
+                "GET",
+                r"/api/v1/accounts/(\w+)/transactions",
+                self._list_account_transactions,
+            ),
+            ("GET", r"/api/v1/rule-groups", self._list_rule_groups),
+            ("POST", r"/api/v1/rule-groups", self._store_rule_group),
+            ("PUT", r"/api/v1/rule-groups/(\w+)", self._update_rule_group),
+            ("GET", r"/api/v1/rule-groups/(\w+)/rules", self._list_rules_by_group),
+            ("POST", r"/api/v1/rules", self._store_rule),
+            ("PUT", r"/api/v1/rules/(\w+)", self._update_rule),
+            ("DELETE", r"/api/v1/rules/(\w+)", self._delete_rule),
+            ("POST", r"/api/v1/transactions", self._store_transaction),
+        )
+
+    def _about(self, query, body):
+        return 200, {
+            "data": {
+                "version": "6.1.0",
+                "api_version": "2.0.12",
+                "php_version": "8.3.0",
+                "os": "Linux",
+                "driver": "sqlite",
+            }
+        }
+
+    def _list_categories(self, query, body):
+        data = [
+            {"type": "categories", "id": _id, "attributes": attrs}
+            for _id, attrs in self.categories.items()
+        ]
+        return 200, {"data": data, "meta": _meta(len(data))}
+
+    def _store_category(self, query, body):
+        _id = self.add_category(body["name"])
+        return 200, {
+            "data": {
+                "type": "categories",
+                "id": _id,
+                "attributes": self.categories[_id],
+            }
+        }
+
+    def _list_accounts(self, query, body):
+        data = [
+            {"type": "accounts", "id": _id, "attributes": attrs}
+            for _id, attrs in self.accounts.items()
+            if query.get("type", attrs["type"]) == attrs["type"]
+        ]
+        return 200, {"data": data, "meta": _meta(len(data))}
+
+    def _list_account_transactions(self, query, body, account_id):
+        # Dates are compared as strings, which works for ISO dates
+        start, end = query.get("start", ""), query.get("end", "9999")
+        matching = [
+            (_id, transaction)
+            for _id, transaction in self.transactions.items()
+            if any(
+                split["source_id"] == account_id
+                and start <= split["date"][:10] <= end
+                and query.get("type", split["type"]) == split["type"]
+                for split in transaction["transactions"]
+            )
+        ]
+
+        per_page = int(query.get("limit", 50))
+        page = int(query.get("page", 1))
+        data = [
+            {
+                "type": "transactions",
+                "id": _id,
+                "attributes": {
+                    "transactions": [
+                        {"destination_id": None} | split
+                        for split in transaction["transactions"]
+                    ]
+                },
+                "links": {"self": f"/transactions/{_id}"},
+            }
+            for _id, transaction in matching[(page - 1) * per_page : page * per_page]
+        ]
+        return 200, {
+            "data": data,
+            "links": {},
+            "meta": _meta(len(matching), page, per_page),
+        }
+
+    def _list_rule_groups(self, query, body):
+        data = [
+            {
+                "type": "rule_groups",
+                "id": _id,
+                "attributes": attrs,
+                "links": {"self": f"/rule-groups/{_id}"},
+            }
+            for _id, attrs in self.rule_groups.items()
+        ]
+        return 200, {"data": data, "links": {}, "meta": _meta(len(data))}
+
+    def _store_rule_group(self, query, body):
+        _id = self.add_rule_group(body["title"])
+        return 200, {
+            "data": {
+                "type": "rule_groups",
+                "id": _id,
+                "attributes": self.rule_groups[_id],
+                "links": {"self": f"/rule-groups/{_id}"},
+            }
+        }
+
+    def _update_rule_group(self, query, body, group_id):
+        group = self.rule_groups[group_id]
+        if (order := body.get("order")) is not None:
+            # Like Firefly III, moving a group shifts the groups between its old and new orders
+            old = group["order"]
+            for other in self.rule_groups.values():
+                if order <= other["order"] < old:
+                    other["order"] += 1
+                elif old < other["order"] <= order:
+                    other["order"] -= 1
+            group["order"] = order
+        return 200, {
+            "data": {
+                "type": "rule_groups",
+                "id": group_id,
+                "attributes": group,
+                "links": {"self": f"/rule-groups/{group_id}"},
+            }
+        }
+
+    def _rule_read(self, _id: str) -> dict:
+        return {
+            "type": "rules",
+            "id": _id,
+            "attributes": self.rules[_id],
+            "links": {"self": f"/rules/{_id}"},
+        }
+
+    def _list_rules_by_group(self, query, body, group_id):
+        data = [
+            self._rule_read(_id)
+            for _id, rule in self.rules.items()
+            if rule["rule_group_id"] == group_id
+        ]
+        return 200, {"data": data, "links": {}, "meta": _meta(len(data))}
+
+    def _store_rule(self, query, body):
+        _id = self.next_id()
+        self.rules[_id] = body
+        return 200, {"data": self._rule_read(_id)}
+
+    def _update_rule(self, query, body, rule_id):
+        if rule_id not in self.rules:
+            return 404, {"message": "Rule not found"}
+        self.rules[rule_id] |= body
+        return 200, {"data": self._rule_read(rule_id)}
+
+    def _delete_rule(self, query, body, rule_id):
+        if self.rules.pop(rule_id, None) is None:
+            return 404, {"message": "Rule not found"}
+        return 204, None
+
+    def _store_transaction(self, query, body):
+        with self._lock:
+            status = (
+                self.transaction_failures.pop(0) if self.transaction_failures else None
+            )
+            if status is not None and status != DROP_AFTER_STORING:
+                return status, {"message": "Injected failure"}
+
+            if body.get("error_if_duplicate_hash"):
+                for _id, transaction in self.transactions.items():
+                    if transaction["transactions"] == body["transactions"]:
+                        message = f"Duplicate of transaction #{_id}."
+                        return 422, {
+                            "message": message,
+                            "errors": {"transactions.0.description": [message]},
+                        }
+
+            _id = self.next_id()
+            self.transactions[_id] = body
+            if status == DROP_AFTER_STORING:
+                return DROP_CONNECTION, None
+
+        return 200, {
+            "data": {
+                "type": "transactions",
+                "id": _id,
+                "attributes": {"transactions": body["transactions"]},
+                "links": {"self": f"/transactions/{_id}"},
+            }
+        }
+
+
+def _make_handler(fake: FakeFirefly):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def _dispatch(self, method: str):
+            path, _, raw_query = self.path.partition("?")
+            query = dict(
+                part.split("=", 1) for part in raw_query.split("&") if "=" in part
+            )
+
+            body = None
+            if length := int(self.headers.get("Content-Length") or 0):
+                body = json.loads(self.rfile.read(length))
+
+            status, payload = fake.handle(method, path, query, body)
+            if status == DROP_CONNECTION:
+                self.close_connection = True
+                return
+
+            data = json.dumps(payload).encode() if payload is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def do_PUT(self):
+            self._dispatch("PUT")
+
+        def do_DELETE(self):
+            self._dispatch("DELETE")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
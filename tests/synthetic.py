@@ -0,0 +1,182 @@
+"""
+Generators of synthetic credit card reports, laid out like the real exports, for tests and benchmarks
+"""
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import openpyxl
+import xlwt
+from openpyxl.cell import WriteOnlyCell
+
+# The .xls (BIFF8) format can't hold more rows than this in a sheet
+XLS_MAX_ROWS = 65536
+
+CATEGORIES = ("מסעדות", "מזון ומשקאות", "רכב ותחבורה", "אנרגיה", "קטגוריה חדשה")
+START_DATE = datetime(2024, 3, 1)
+
+
+def _date(i: int) -> datetime:
+    return START_DATE + timedelta(days=i % 28)
+
+
+def write_cal_report(
+    path: Path,
+    rows: int,
+    foreign_currencies: tuple[str, ...] = ("$", "€"),
+    last_4_digits: str = "1234",
+):
+    """
+    Cal .xlsx report with a single card. Every 10th transaction is charged in a foreign currency.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+
+    sheet.append([f"פירוט עסקאות לכרטיס ויזה זהב המסתיים ב-{last_4_digits}"])
+    sheet.append(["עסקאות במועד החיוב"])
+    sheet.append(
+        ["תאריך עסקה", "שם בית עסק", "סכום עסקה", "סכום חיוב", "סוג", "ענף", "הערות"]
+    )
+
+    for i in range(rows):
+        amount = round(10 + i % 1000 / 7, 2)
+        if i % 10 == 9:
+            symbol = foreign_currencies[i // 10 % len(foreign_currencies)]
+        else:
+            symbol = "₪"
+
+        foreign_cost = WriteOnlyCell(sheet, value=amount)
+        foreign_cost.number_format = f"[${symbol}] #,##0.00"
+        local_cost = WriteOnlyCell(sheet, value=round(amount * 3.7, 2))
+        local_cost.number_format = "[$₪] #,##0.00"
+
+        sheet.append(
+            [
+                _date(i),
+                f"בית עסק {i}",
+                foreign_cost,
+                local_cost,
+                "רגילה",
+                CATEGORIES[i % len(CATEGORIES)],
+                # Write-only sheets are unsized, so an empty (rather than a missing) cell keeps the row 7 cells wide
+                "",
+            ]
+        )
+
+    sheet.append([""])
+    sheet.append(["סך הכל"])
+    workbook.save(path)
+
+
+def write_isracard_report(
+    path: Path,
+    rows: int,
+    cards: int = 2,
+    foreign_currencies: tuple[str, ...] = ("$", "€"),
+    foreign_rows: int | None = None,
+):
+    """
+    Isracard .xls report. The rows are split evenly between the cards, and each card has a local section, and a foreign
+    section with a sub-section per foreign currency, of foreign_rows transactions each (a tenth of the card's
+    transactions by default).
+    """
+    # Every card adds a header, 2 section titles, 2 column header rows, a footer and a separator
+    sheet_rows = rows + cards * (7 + len(foreign_currencies)) + 5
+    if sheet_rows >= XLS_MAX_ROWS:
+        raise ValueError(
+            f"{rows} transactions don't fit in a single .xls sheet ({XLS_MAX_ROWS} rows)"
+        )
+
+    workbook = xlwt.Workbook(encoding="utf-8")
+    sheet = workbook.add_sheet("פירוט עסקאות")
+
+    row = 1
+    sheet.write(row, 0, "ישראל ישראלי")
+    row += 2
+
+    transaction_id = 0
+    for card_idx in range(cards):
+        card_rows = rows // cards + (card_idx < rows % cards)
+        currency_rows = card_rows // 10 if foreign_rows is None else foreign_rows
+        local_rows = card_rows - currency_rows * len(foreign_currencies)
+
+        sheet.write(row, 0, f"ישראכרט זהב - {1000 + card_idx}")
+        row += 1
+
+        sheet.write(row, 0, "עסקאות בארץ")
+        row += 1
+        headers = (
+            "תאריך רכישה",
+            "שם בית עסק",
+            "סכום עסקה",
+            "",
+            "סכום חיוב",
+            "",
+            "שובר",
+            "פירוט נוסף",
+        )
+        for col, header in enumerate(headers):
+            sheet.write(row, col, header)
+        row += 1
+
+        for i in range(local_rows):
+            transaction_id += 1
+            amount = round(10 + i % 1000 / 7, 2)
+            values = (
+                _date(i).strftime("%d/%m/%Y"),
+                f"בית עסק {i}",
+                amount,
+                "₪",
+                amount,
+                "₪",
+                str(transaction_id),
+                "",
+            )
+            for col, value in enumerate(values):
+                sheet.write(row, col, value)
+            row += 1
+
+        sheet.write(row, 0, _date(0).strftime("%d/%m/%Y"))
+        sheet.write(row, 1, "סך חיוב בש''ח:")
+        row += 1
+
+        sheet.write(row, 0, 'עסקאות בחו"ל')
+        row += 1
+        headers = (
+            "תאריך רכישה",
+            "תאריך חיוב",
+            "שם בית עסק",
+            "סכום מקורי",
+            "מטבע מקור",
+            "סכום חיוב",
+            "מטבע לחיוב",
+            "",
+        )
+        for col, header in enumerate(headers):
+            sheet.write(row, col, header)
+        row += 1
+
+        for currency in foreign_currencies:
+            for i in range(currency_rows):
+                amount = round(5 + i % 100 / 3, 2)
+                values = (
+                    _date(i).strftime("%d/%m/%Y"),
+                    _date(i + 1).strftime("%d/%m/%Y"),
+                    f"SHOP {currency} {i}",
+                    amount,
+                    currency,
+                    round(amount * 3.7, 2),
+                    "₪",
+                    "",
+                )
+                for col, value in enumerate(values):
+                    sheet.write(row, col, value)
+                row += 1
+
+            sheet.write(row, 2, "TOTAL FOR DATE")
+            row += 1
+
+        row += 1
+
+    sheet.write(row + 1, 0, "סך הכל לחיוב")
+    workbook.save(str(path))
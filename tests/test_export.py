@@ -0,0 +1,41 @@
+import csv
+import json
+
+import pytest
+
+from finparse.export import ExportFormat, export_rows
+from tests.cards import make_rows
+
+
+@pytest.mark.parametrize("export_format", list(ExportFormat))
+def test_export(tmp_path, export_format: ExportFormat):
+    if export_format is ExportFormat.parquet:
+        pytest.importorskip("pyarrow")
+
+    path = tmp_path / f"export.{export_format.value}"
+    with export_format.writer(path) as writer:
+        assert export_rows(make_rows(25), writer, chunk_size=10) == 25
+
+    match export_format:
+        case ExportFormat.csv:
+            with open(path, newline="", encoding="utf-8") as f:
+                records = list(csv.DictReader(f))
+        case ExportFormat.jsonl:
+            records = [json.loads(line) for line in path.read_text().splitlines()]
+        case ExportFormat.parquet:
+            import pyarrow.parquet as pq
+
+            assert pq.ParquetFile(path).num_row_groups == 3
+            records = pq.read_table(path).to_pylist()
+
+    assert len(records) == 25
+    assert records[3]["description"] == "Business 3"
+    assert records[3]["amount"] == "4"
+    assert records[3]["currency"] == "ILS"
+    assert str(records[3]["date"]) == "2024-01-04"
+
+
+def test_export_format_from_path(tmp_path):
+    assert ExportFormat.from_path(tmp_path / "out.JSONL") is ExportFormat.jsonl
+    with pytest.raises(ValueError):
+        ExportFormat.from_path(tmp_path / "out.xlsx")
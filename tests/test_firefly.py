@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from finparse.firefly import CategoryLookup, CategoryRuleType, Firefly, MetadataCache
+from finparse.upload import upload_serially
+from tests.cards import make_card
+
+
+def rules_crawled(fake_firefly) -> int:
+    return sum(
+        n
+        for (method, path), n in fake_firefly.requests.items()
+        if path.endswith("/rules")
+    )
+
+
+def test_metadata_cache(fake_firefly, tmp_path):
+    fake_firefly.add_category("Groceries")
+    group_id = fake_firefly.add_rule_group(CategoryRuleType.DescriptionRule.value)
+    fake_firefly.add_rule(group_id, "Groceries", ["SUPER", "MARKET"])
+    fake_firefly.add_rule_group(CategoryRuleType.TranslationRule.value)
+
+    cache = MetadataCache(fake_firefly.url, cache_dir=tmp_path)
+
+    cold = Firefly(fake_firefly.url, "token", metadata_cache=cache)
+    assert rules_crawled(fake_firefly) == 2
+
+    warm = Firefly(fake_firefly.url, "token", metadata_cache=cache)
+    assert rules_crawled(fake_firefly) == 2
+    assert warm.categories["Groceries"] == cold.categories["Groceries"]
+    assert warm.categories["Groceries"].description_rules[0].activators == [
+        "SUPER",
+        "MARKET",
+    ]
+
+    # A new category invalidates the snapshot
+    fake_firefly.add_category("Restaurants")
+    Firefly(fake_firefly.url, "token", metadata_cache=cache)
+    assert rules_crawled(fake_firefly) == 4
+
+
+def test_metadata_cache_ttl(fake_firefly, tmp_path):
+    cache = MetadataCache(fake_firefly.url, ttl=timedelta(0), cache_dir=tmp_path)
+
+    # The first run creates both rule groups, and the snapshot is already expired for the second one
+    Firefly(fake_firefly.url, "token", metadata_cache=cache)
+    Firefly(fake_firefly.url, "token", metadata_cache=cache)
+    assert rules_crawled(fake_firefly) == 2
+
+
+def test_category_lookup(fake_firefly, firefly):
+    food_id = fake_firefly.add_category("Food and Beverages")
+    firefly = Firefly(fake_firefly.url, "token")
+
+    lookup = CategoryLookup(
+        firefly.categories,
+        {"מזון ומשקאות": "food  and beverages ", "אנרגיה": "Energy"},
+    )
+    assert lookup.by_name("Food and Beverages") == food_id
+    assert lookup.by_reported("מזון ומשקאות") == food_id
+    assert lookup.by_reported(" מזון  ומשקאות") == food_id
+    # Never resolved by Firefly III, which would create the category
+    assert lookup.by_reported("אנרגיה") is None
+    assert lookup.by_reported(None) is None
+
+    card = make_card(2)
+    card.transactions[0].category = "מזון ומשקאות"
+    card.transactions[1].category = "אנרגיה"
+    upload_serially(
+        ((card, t) for t in card.transactions),
+        firefly,
+        {"מזון ומשקאות": "Food and Beverages", "אנרגיה": "Energy"},
+        "1",
+    )
+    splits = [t["transactions"][0] for t in fake_firefly.transactions.values()]
+    assert [s.get("category_id") for s in splits] == [food_id, None]
+    assert not any(s.get("category_name") for s in splits)
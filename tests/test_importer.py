@@ -0,0 +1,40 @@
+import csv
+import json
+
+from finparse.importer import COLUMNS, write_importer_files
+from tests.cards import make_card
+
+
+def test_importer_files(tmp_path):
+    card = make_card(25)
+    card.transactions[0].category = "מסעדות"
+    rows = ((card, t) for t in card.transactions)
+
+    csv_path = tmp_path / "import.csv"
+    written = write_importer_files(
+        rows, csv_path, 3, {"מסעדות": "Restaurants"}, chunk_size=10
+    )
+    assert written == 25
+
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        records = list(csv.DictReader(f))
+    assert len(records) == 25
+    assert records[0] == {
+        "date": "2024-01-01",
+        "description": "Business 0",
+        "amount": "1",
+        "currency": "ILS",
+        "external_id": "0",
+        "foreign_amount": "1",
+        "foreign_currency": "ILS",
+        "category": "Restaurants",
+        "tags": "Test Card - 1234",
+        "notes": "Reported Category: מסעדות;",
+    }
+
+    config = json.loads(csv_path.with_suffix(".json").read_text())
+    assert config["default_account"] == 3
+    assert config["roles"] == [column.role for column in COLUMNS]
+    assert len(config["roles"]) == len(records[0])
+    assert config["unique_column_index"] == 4
+    assert config["roles"][config["unique_column_index"]] == "external-id"
@@ -0,0 +1,100 @@
+import importlib
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from finparse.ingest import IngestStats, expand_reports, parse_reports
+from tests.synthetic import write_cal_report, write_isracard_report
+
+
+@pytest.fixture
+def reports(tmp_path):
+    directory = tmp_path / "reports"
+    directory.mkdir()
+    write_cal_report(directory / "cal.xlsx", 30)
+    write_isracard_report(directory / "isracard.xls", 20)
+    (directory / "notes.txt").write_text("Not a report")
+    # The lock file Excel leaves next to an open workbook
+    (directory / "~$cal.xlsx").write_bytes(b"Lock")
+    return directory
+
+
+def test_expand_reports(reports):
+    expected = [reports / "cal.xlsx", reports / "isracard.xls"]
+    assert expand_reports(str(reports)) == expected
+    assert expand_reports(str(reports / "*.xls*")) == expected
+    assert expand_reports(str(reports.parent / "**" / "cal.xlsx")) == expected[:1]
+    assert expand_reports(str(reports / "missing*.xlsx")) == []
+
+
+def test_parse_reports(reports):
+    parsed = list(parse_reports(expand_reports(str(reports)), processes=2))
+    assert [(r.path.name, r.transactions) for r in parsed] == [
+        ("cal.xlsx", 30),
+        ("isracard.xls", 20),
+    ]
+
+
+def test_parse_reports_bad_file(reports):
+    # A report that can't be parsed doesn't abort the reports after it
+    bad = reports / "bad.xlsx"
+    bad.write_bytes(b"Not a workbook")
+
+    stats = IngestStats()
+    rows = list(stats.rows(parse_reports(expand_reports(str(reports)), processes=2)))
+
+    assert len(rows) == 50
+    assert stats.files == 3
+    assert stats.failed_files == 1
+    assert stats.transactions == 50
+
+
+def test_ingest_command(reports, fake_firefly, monkeypatch, tmp_path, app_dir):
+    # The CLI runs as a script from inside the package (see test_startup)
+    monkeypatch.syspath_prepend(Path(__file__).parents[1] / "finparse")
+    app = importlib.import_module("finparse.main").app
+
+    fake_firefly.add_account("Checking")
+    monkeypatch.setattr("pick.pick", lambda options, title: (options[0], 0))
+    (reports / "bad.xlsx").write_bytes(b"Not a workbook")
+
+    args = [
+        "ingest",
+        str(reports),
+        "--token=token",
+        f"--firefly-host={fake_firefly.url}",
+        f"--index-path={tmp_path / 'index.sqlite3'}",
+        "--processes=2",
+        "--concurrency=4",
+        "--no-sync-rules",
+        "--no-report-cache",
+        "--no-progress",
+        "--refresh-metadata",
+    ]
+    result = CliRunner().invoke(app, args)
+    assert result.exit_code == 0, result.output
+    assert fake_firefly.transaction_posts == 50
+
+    # Everything was indexed
+    result = CliRunner().invoke(app, args)
+    assert result.exit_code == 0, result.output
+    assert fake_firefly.transaction_posts == 50
+
+    # The metadata snapshots were kept in the isolated app directory
+    assert list((app_dir / "metadata").iterdir())
+
+
+def test_parse_reports_window(reports):
+    consumed = []
+
+    def paths():
+        for _ in range(10):
+            consumed.append(reports / "cal.xlsx")
+            yield consumed[-1]
+
+    parsed = parse_reports(paths(), processes=1)
+    assert next(parsed).transactions == 30
+    # Only a couple of reports are parsed ahead
+    assert len(consumed) == 2
+    assert len(list(parsed)) == 9
@@ -0,0 +1,88 @@
+import pytest
+from firefly_iii_client import ApiException
+
+from finparse.journal import CheckpointJournal
+from finparse.upload import AsyncUploader, upload_serially
+from tests.cards import make_card, make_rows
+
+
+@pytest.fixture
+def report_path(tmp_path):
+    path = tmp_path / "report.xls"
+    path.write_bytes(b"report")
+    return path
+
+
+def test_resume_interrupted_upload(fake_firefly, firefly, report_path, tmp_path):
+    fake_firefly.transaction_failures = [None] * 12 + [500]
+
+    with CheckpointJournal(report_path, tmp_path, flush_every=5) as journal:
+        with pytest.raises(ApiException):
+            upload_serially(make_rows(30), firefly, {}, "1", journal=journal)
+    assert fake_firefly.transaction_posts == 13
+
+    # Closing the journal flushed the last, partial, batch
+    journal = CheckpointJournal(report_path, tmp_path, flush_every=5)
+    assert journal.load() == 12
+
+    with journal:
+        upload_serially(make_rows(30), firefly, {}, "1", journal=journal)
+    assert len(fake_firefly.transactions) == 30
+    assert fake_firefly.transaction_posts == 13 + 18
+
+
+def test_resume_concurrent_upload(fake_firefly, firefly, report_path, tmp_path):
+    # Rows are acknowledged out of order, so resuming retries exactly the failed ones
+    fake_firefly.transaction_failures = [None, 422, None, None, 422]
+
+    with CheckpointJournal(report_path, tmp_path) as journal:
+        uploader = AsyncUploader(firefly, {}, "1", concurrency=4, journal=journal)
+        report = uploader.upload([make_card(20)])
+    assert len(report.failures) == 2
+
+    journal = CheckpointJournal(report_path, tmp_path)
+    assert journal.load() == 18
+    with journal:
+        uploader = AsyncUploader(firefly, {}, "1", concurrency=4, journal=journal)
+        report = uploader.upload([make_card(20)])
+    assert report.total == 2
+    assert len(fake_firefly.transactions) == 20
+
+    journal.complete()
+    assert not journal.path.exists()
+
+
+def test_journal_ignores_torn_lines(report_path, tmp_path):
+    journal = CheckpointJournal(report_path, tmp_path)
+    journal.path.write_text("finparse-journal 2\n:1234:0\n:1234:1\n:1234:1\n:1234:2")
+    assert journal.load() == 3
+    assert journal.acknowledged == {":1234:0": 1, ":1234:1": 2}
+
+    journal.path.write_text("finparse-journal 1\n0\n")
+    assert CheckpointJournal(report_path, tmp_path).load() == 0
+
+
+def test_resume_identical_transactions(fake_firefly, firefly, report_path, tmp_path):
+    # Identical rows share a key, so each is acknowledged by its occurrence rather than by its identity
+    card = make_card(1)
+    coffee = card.transactions[0].model_copy(update={"id": None})
+    card.transactions = [coffee] * 3
+    fake_firefly.transaction_failures = [None, 500]
+
+    with CheckpointJournal(report_path, tmp_path) as journal:
+        with pytest.raises(ApiException):
+            upload_serially(
+                ((card, t) for t in card.transactions),
+                firefly,
+                {},
+                "1",
+                journal=journal,
+            )
+
+    journal = CheckpointJournal(report_path, tmp_path)
+    assert journal.load() == 1
+    with journal:
+        upload_serially(
+            ((card, t) for t in card.transactions), firefly, {}, "1", journal=journal
+        )
+    assert len(fake_firefly.transactions) == 3
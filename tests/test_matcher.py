@@ -0,0 +1,105 @@
+import pytest
+
+from finparse.firefly import CategoryRuleType, Firefly
+from finparse.matcher import CategoryMatcher, MatchType
+from finparse.upload import AsyncUploader
+from tests.cards import make_card
+
+
+@pytest.fixture
+def matcher() -> CategoryMatcher:
+    return CategoryMatcher(
+        [
+            ("super", MatchType.Contains, "Groceries"),
+            ("shufersal", MatchType.Contains, "Groceries"),
+            ("super pharm", MatchType.Contains, "Pharmacy"),
+            ("paz", MatchType.Starts, "Fuel"),
+            ("wolt", MatchType.Ends, "Restaurants"),
+            ("רב קו", MatchType.Is, "Transportation"),
+        ]
+    )
+
+
+@pytest.mark.parametrize(
+    "description, category",
+    [
+        ("SHUFERSAL DEAL", "Groceries"),
+        ("Mega Super 12", "Groceries"),
+        # The longest activator wins
+        ("SUPER PHARM TLV", "Pharmacy"),
+        ("PAZ YELLOW", "Fuel"),
+        ("YELLOW PAZ", None),
+        ("Pizza via WOLT", "Restaurants"),
+        ("WOLT delivery", None),
+        ("רב קו", "Transportation"),
+        ("טעינת רב קו", None),
+        ("", None),
+    ],
+)
+def test_match(matcher: CategoryMatcher, description: str, category: str | None):
+    assert matcher.match(description) == category
+
+
+def test_match_many_rules():
+    matcher = CategoryMatcher(
+        (f"business {i:05}", MatchType.Contains, f"Category {i}") for i in range(20000)
+    )
+
+    assert len(matcher) == 20000
+    assert matcher.match("Paid at BUSINESS 12345 online") == "Category 12345"
+    assert matcher.match("Paid at business 2000") is None
+
+
+def test_upload_assigns_categories_by_description(fake_firefly):
+    fake_firefly.add_account("Checking")
+    fake_firefly.add_category("Even")
+    group_id = fake_firefly.add_rule_group(CategoryRuleType.DescriptionRule.value)
+    fake_firefly.add_rule(group_id, "Even", ["4", "6"], trigger_type="description_ends")
+
+    firefly = Firefly(fake_firefly.url, "token")
+    AsyncUploader(firefly, {}, "1").upload([make_card(6)])
+
+    categories = {
+        t["transactions"][0]["description"]: t["transactions"][0]["category_id"]
+        for t in fake_firefly.transactions.values()
+    }
+    assert categories == {
+        "Business 0": None,
+        "Business 1": None,
+        "Business 2": None,
+        "Business 3": None,
+        "Business 4": firefly.categories.id_by_name["Even"],
+        "Business 5": None,
+    }
+
+
+def test_inactive_and_strict_rules(fake_firefly):
+    for name in ("Groceries", "Pharmacy", "Fuel", "Restaurants"):
+        fake_firefly.add_category(name)
+    group_id = fake_firefly.add_rule_group(CategoryRuleType.DescriptionRule.value)
+    fake_firefly.add_rule(group_id, "Groceries", ["SUPER"], active=False)
+    fake_firefly.add_rule(
+        group_id, "Pharmacy", ["PHARM", "DRUG"], inactive_triggers=("DRUG",)
+    )
+    # Fires only if both match, which is left to Firefly III
+    fake_firefly.add_rule(group_id, "Fuel", ["PAZ", "YELLOW"], strict=True)
+    # A strict rule with a single trigger is matched like any other
+    fake_firefly.add_rule(group_id, "Restaurants", ["WOLT"], strict=True)
+
+    matcher = Firefly(fake_firefly.url, "token").categories.matcher
+    assert matcher.match("SUPER PHARM") == "Pharmacy"
+    assert matcher.match("SUPER DEAL") is None
+    assert matcher.match("DRUG STORE") is None
+    assert matcher.match("PAZ") is None
+    assert matcher.match("PAZ YELLOW") is None
+    assert matcher.match("WOLT") == "Restaurants"
+
+
+def test_inactive_rule_group(fake_firefly):
+    fake_firefly.add_category("Groceries")
+    group_id = fake_firefly.add_rule_group(
+        CategoryRuleType.DescriptionRule.value, active=False
+    )
+    fake_firefly.add_rule(group_id, "Groceries", ["SUPER"])
+
+    assert not Firefly(fake_firefly.url, "token").categories.matcher.match("SUPER")
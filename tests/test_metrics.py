@@ -0,0 +1,56 @@
+import pytest
+
+from finparse.cards.cal import CalReportParser
+from finparse.metrics import Histogram, metrics
+from finparse.upload import AsyncUploader
+from tests.synthetic import write_cal_report
+from tests.cards import make_card
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+
+
+def test_histogram_quantiles():
+    histogram = Histogram()
+    for ms in [0.5] * 50 + [15] * 45 + [700] * 4 + [60_000]:
+        histogram.observe(ms / 1000)
+
+    assert histogram.quantile(0.5) == 1
+    assert histogram.quantile(0.95) == 20
+    assert histogram.quantile(0.99) == 1000
+    assert histogram.quantile(1) == float("inf")
+    assert histogram.to_dict()["buckets_ms"] == {
+        "<=1": 50,
+        "<=20": 45,
+        "<=1000": 4,
+        ">10000": 1,
+    }
+
+
+def test_parse_metrics(tmp_path):
+    path = tmp_path / "report.xlsx"
+    write_cal_report(path, 30)
+
+    assert sum(1 for _ in CalReportParser.iter_transactions(path)) == 30
+    stats = metrics.to_dict()
+    assert stats["counters"]["rows_parsed"] == 30
+    assert stats["stages"]["load_workbook"]["calls"] == 1
+    assert stats["stages"]["parse"]["seconds"] >= (
+        stats["stages"]["load_workbook"]["seconds"]
+    )
+
+
+def test_upload_metrics(fake_firefly, firefly):
+    fake_firefly.transaction_failures = [429, 422]
+
+    uploader = AsyncUploader(firefly, {}, "1", concurrency=2, backoff=0.01)
+    uploader.upload([make_card(10)])
+
+    stats = metrics.to_dict()
+    assert stats["counters"]["uploaded"] == 9
+    assert stats["counters"]["failed"] == 1
+    assert stats["counters"]["retries"] == 1
+    assert stats["histograms"]["request_latency"]["count"] == 11
+    assert stats["stages"]["http"]["calls"] == 11
@@ -0,0 +1,38 @@
+import pytest
+
+from finparse.cards.cal import CalReportParser
+from finparse.cards.isracard import IsracardReportParser
+from finparse.parsers import find_parser, sniff_parser
+from tests.synthetic import write_cal_report, write_isracard_report
+
+
+def test_detect_cal(tmp_path):
+    path = tmp_path / "report.xlsx"
+    write_cal_report(path, 10)
+    assert find_parser(path) is CalReportParser
+
+
+def test_detect_isracard(tmp_path):
+    path = tmp_path / "report.xls"
+    write_isracard_report(path, 10)
+    assert find_parser(path) is IsracardReportParser
+
+
+def test_detect_large_report(tmp_path):
+    # The signature is found in the beginning of the report, whatever its size
+    path = tmp_path / "report.xls"
+    write_isracard_report(path, 60000, cards=1)
+    assert path.stat().st_size > 1024 * 1024
+    assert sniff_parser(path) is IsracardReportParser
+
+
+@pytest.mark.parametrize(
+    "content",
+    [b"", b"date,description,amount\n", bytes.fromhex("d0cf11e0a1b11ae1") + bytes(64)],
+)
+def test_detect_unknown(tmp_path, content: bytes):
+    path = tmp_path / "report.xls"
+    path.write_bytes(content)
+
+    with pytest.raises(ValueError):
+        find_parser(path)
@@ -1,8 +1,14 @@
+from datetime import datetime
 from pathlib import Path
 
 import pytest
+import xlrd
 
 from finparse.cards import isracard, cal
+from finparse.cards.isracard import ISRACARD, Section
+from finparse.cards.spec import CardHeader, SectionRow
+from finparse.models import Card, Currency, ReportParser, Transaction
+from tests.synthetic import write_cal_report, write_isracard_report
 
 FILES_PATH = Path(__file__).parent / "files"
 
@@ -37,3 +43,93 @@ def test_isracard_parser(workbook_path: Path, expected_transactions: int):
 def test_cal_parser(workbook_path: Path, expected_transactions: int):
     cards = cal.parse_workbook(workbook_path)
     assert sum(len(c.transactions) for c in cards) == expected_transactions
+
+
+class StubParser(ReportParser):
+    @staticmethod
+    def iter_records(workbook_path: Path):
+        for digits, transactions in (("1111", 2), ("2222", 0), ("3333", 3)):
+            yield Card(name="Card", last_4_digits=digits)
+            for i in range(transactions):
+                yield Transaction(
+                    date=datetime(2024, 1, 1),
+                    description=f"{digits}-{i}",
+                    amount="1",
+                    currency=Currency.ILS,
+                )
+
+
+def test_streaming_matches_parse_workbook():
+    cards = list(StubParser.parse_workbook(Path("report.xlsx")))
+    assert [len(c.transactions) for c in cards] == [2, 0, 3]
+
+    pairs = list(StubParser.iter_transactions(Path("report.xlsx")))
+    assert [(c.last_4_digits, t.description) for c, t in pairs] == [
+        (c.last_4_digits, t.description) for c in cards for t in c.transactions
+    ]
+    # Streaming doesn't collect the transactions in their cards
+    assert all(not c.transactions for c, _ in pairs)
+
+
+@pytest.mark.parametrize(
+    "parser, suffix, write_report",
+    [
+        (cal.CalReportParser, ".xlsx", write_cal_report),
+        (isracard.IsracardReportParser, ".xls", write_isracard_report),
+        (StubParser, ".xlsx", write_cal_report),
+    ],
+)
+def test_tables_match_rows(parser, suffix, write_report, tmp_path):
+    workbook_path = tmp_path / f"report{suffix}"
+    write_report(workbook_path, 250)
+
+    tables = list(parser.parse_tables(workbook_path))
+    pairs = list(parser.iter_transactions(workbook_path))
+
+    def validated(rows):
+        return [(c.last_4_digits, Transaction.model_validate(t)) for c, t in rows]
+
+    assert sum(map(len, tables)) == len(pairs)
+    assert validated(
+        pair for table in tables for pair in table.iter_transactions()
+    ) == validated(pairs)
+
+
+def test_isracard_scanner_events(tmp_path):
+    workbook_path = tmp_path / "report.xls"
+    write_isracard_report(workbook_path, 20, cards=2, foreign_currencies=("$", "€"))
+
+    sheet = xlrd.open_workbook(workbook_path).sheet_by_index(0)
+    events = list(ISRACARD.layout.scan(sheet, ISRACARD.format))
+    summary = [
+        (type(e).__name__, getattr(e, "section", None))
+        for e in events
+        if not isinstance(e, SectionRow)
+    ]
+
+    card = [
+        ("CardHeader", None),
+        ("SectionStart", Section.Local),
+        ("SectionTotal", Section.Local),
+        ("SectionStart", Section.Foreign),
+        ("SectionTotal", Section.Foreign),
+        ("SectionTotal", Section.Foreign),
+    ]
+    assert summary == card * 2
+    assert [e.last_4_digits for e in events if isinstance(e, CardHeader)] == [
+        "1000",
+        "1001",
+    ]
+    assert sum(isinstance(e, SectionRow) for e in events) == 20
+
+
+def test_isracard_many_sections(tmp_path):
+    # The scanner is iterative, so the number of foreign currency sections isn't bounded by the recursion limit
+    workbook_path = tmp_path / "report.xls"
+    write_isracard_report(
+        workbook_path, 3000, cards=1, foreign_currencies=("$",) * 1500, foreign_rows=1
+    )
+
+    pairs = list(isracard.IsracardReportParser.iter_transactions(workbook_path))
+    assert len(pairs) == 3000
+    assert sum(t.foreign_currency == Currency.USD for _, t in pairs) == 1500
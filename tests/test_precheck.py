@@ -0,0 +1,78 @@
+from datetime import datetime
+
+from finparse.models import Card, Currency, Transaction
+from finparse.precheck import ExistingTransactions
+from finparse.upload import AsyncUploader, upload_serially
+from tests.cards import make_card
+
+LIST_PATH = "GET", "/api/v1/accounts/1/transactions"
+
+
+def rows(card: Card):
+    return ((card, t) for t in card.transactions)
+
+
+def test_skips_transactions_in_firefly(fake_firefly, firefly):
+    upload_serially(rows(make_card(30)), firefly, {}, "1")
+
+    # A fresh machine: no upload index, so only Firefly III knows what was uploaded
+    existing = ExistingTransactions(firefly, "1", page_size=7)
+    uploader = AsyncUploader(firefly, {}, "1", concurrency=4, existing=existing)
+    report = uploader.upload([make_card(40)])
+
+    assert report.uploaded == 10
+    assert len(fake_firefly.transactions) == 40
+    assert fake_firefly.transaction_posts == 40
+    # 30 transactions in the date range, 7 per page
+    assert fake_firefly.requests[LIST_PATH] == 5
+
+
+def test_identical_rows_are_counted(fake_firefly, firefly):
+    coffee = Transaction(
+        date=datetime(2024, 3, 1),
+        description="Coffee",
+        amount="12.5",
+        currency=Currency.ILS,
+    )
+    card = Card(name="Test Card", last_4_digits="1234", transactions=[coffee] * 2)
+
+    # Firefly III pads amounts and trims descriptions
+    fake_firefly.transactions["100"] = {
+        "transactions": [
+            {
+                "type": "withdrawal",
+                "date": "2024-03-01T00:00:00+02:00",
+                "amount": "12.500000000000",
+                "description": "Coffee ",
+                "source_id": "1",
+            }
+        ]
+    }
+
+    existing = ExistingTransactions(firefly, "1")
+    upload_serially(rows(card), firefly, {}, "1", existing=existing)
+    assert fake_firefly.transaction_posts == 1
+
+
+def test_no_rows_no_requests(fake_firefly, firefly):
+    existing = ExistingTransactions(firefly, "1")
+    assert list(existing.filter_new([])) == []
+    assert fake_firefly.requests[LIST_PATH] == 0
+
+
+def test_rows_are_streamed_in_windows(fake_firefly, firefly):
+    upload_serially(rows(make_card(30)), firefly, {}, "1")
+
+    # The rows cycle through the days of the month, so later windows revisit days that were already listed
+    consumed = []
+    card = make_card(60)
+    existing = ExistingTransactions(firefly, "1", window_size=10)
+    new = existing.filter_new(
+        (consumed.append(t) or card, t) for t in card.transactions
+    )
+
+    assert next(new)[1].description == "Business 30"
+    assert len(consumed) == 40
+    assert [t.description for _, t in new] == [f"Business {i}" for i in range(31, 60)]
+    # Each day of the month was listed once, by the first three windows
+    assert fake_firefly.requests[LIST_PATH] == 3
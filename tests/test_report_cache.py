@@ -0,0 +1,117 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from finparse.cards.cal import CalReportParser
+from finparse.cards.isracard import IsracardReportParser
+from finparse.metrics import metrics
+from finparse.report_cache import CACHE_SUFFIX, ReportCache
+from tests.synthetic import write_cal_report, write_isracard_report
+
+
+class CountingParser(CalReportParser):
+    parses = 0
+
+    @classmethod
+    def parse_tables(cls, workbook_path: Path):
+        cls.parses += 1
+        return super().parse_tables(workbook_path)
+
+
+@pytest.fixture
+def report(tmp_path) -> Path:
+    path = tmp_path / "report.xlsx"
+    write_cal_report(path, 50)
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path) -> ReportCache:
+    CountingParser.parses = 0
+    return ReportCache(tmp_path / "cache")
+
+
+def test_cache_hit(cache, report):
+    parsed = cache.parse_tables(CountingParser, report)
+    cached = cache.parse_tables(CountingParser, report)
+
+    assert CountingParser.parses == 1
+    assert [len(t) for t in cached] == [50]
+    assert list(cached[0].rows()) == list(parsed[0].rows())
+    assert cached[0].card == parsed[0].card
+
+
+def test_cache_invalidated_by_content(cache, report):
+    cache.parse_tables(CountingParser, report)
+    write_cal_report(report, 60)
+
+    tables = cache.parse_tables(CountingParser, report)
+    assert CountingParser.parses == 2
+    assert len(tables[0]) == 60
+
+
+def test_cache_discards_corrupt_entries(cache, report):
+    cache.parse_tables(CountingParser, report)
+    (entry,) = cache.cache_dir.iterdir()
+    entry.write_bytes(b"not a cache entry")
+
+    assert len(cache.parse_tables(CountingParser, report)[0]) == 50
+    assert CountingParser.parses == 2
+
+
+def test_cache_evicts_least_recently_used(cache, tmp_path):
+    reports = []
+    for i in range(3):
+        reports.append(tmp_path / f"report{i}.xlsx")
+        write_cal_report(reports[-1], 50, last_4_digits=f"{i:04}")
+        cache.parse_tables(CountingParser, reports[-1])
+
+    entries = sorted(cache.cache_dir.iterdir(), key=lambda p: p.stat().st_mtime)
+    for age, entry in enumerate(reversed(entries)):
+        os.utime(entry, (0, entry.stat().st_mtime - age * 10))
+
+    # One entry too many, so using the oldest entry keeps it, and evicts the next one
+    cache.max_bytes = sum(p.stat().st_size for p in entries) - 1
+    cache.parse_tables(CountingParser, reports[0])
+    cache.evict()
+
+    assert len(list(cache.cache_dir.iterdir())) == 2
+    cache.parse_tables(CountingParser, reports[0])
+    assert CountingParser.parses == 3
+    cache.parse_tables(CountingParser, reports[1])
+    assert CountingParser.parses == 4
+
+
+def test_cache_miss_streams_tables(cache, tmp_path):
+    report = tmp_path / "report.xls"
+    write_isracard_report(report, 40, cards=2)
+
+    # The first card is handed on before the second one is parsed, and an abandoned parse saves no entry
+    tables = cache.iter_tables(IsracardReportParser, report)
+    assert next(tables).card.last_4_digits == "1000"
+    assert not list(cache.cache_dir.glob(f"*{CACHE_SUFFIX}"))
+    tables.close()
+    assert not list(cache.cache_dir.iterdir())
+
+    parsed = cache.parse_tables(IsracardReportParser, report)
+    cached = cache.parse_tables(IsracardReportParser, report)
+    assert [t.card.last_4_digits for t in cached] == ["1000", "1001"]
+    assert [list(t.rows()) for t in cached] == [list(t.rows()) for t in parsed]
+
+
+def test_cached_rows_are_checked(cache, report):
+    metrics.reset()
+    cache.parse_tables(CountingParser, report)
+    assert sum(1 for _ in cache.iter_transactions(CountingParser, report)) == 50
+    assert metrics.to_dict()["counters"]["rows_parsed"] == 100
+
+    # An entry whose rows have the wrong types, e.g. written by a parser that stored a number as the description
+    (table,) = cache.parse_tables(CountingParser, report)
+    table.description[0] = 42.0
+    (entry,) = cache.cache_dir.iterdir()
+    with open(entry, "wb") as f:
+        cache._write_table(f, table)
+
+    with pytest.raises(ValueError, match="Invalid transaction row"):
+        list(cache.iter_transactions(CountingParser, report))
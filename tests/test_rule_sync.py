@@ -0,0 +1,106 @@
+from finparse.firefly import CategoryRuleType, Firefly
+from finparse.rule_sync import sync_translation_rules, translation_activator
+from finparse.upload import generate_notes_str
+
+TRANSLATIONS = {
+    "מסעדות": "Restaurants",
+    "פנאי": "Leisure",
+    "בילוי": "Leisure",
+}
+
+
+def translation_rules(fake_firefly) -> dict[str, list[str]]:
+    group_id = next(
+        _id
+        for _id, group in fake_firefly.rule_groups.items()
+        if group["title"] == CategoryRuleType.TranslationRule.value
+    )
+    return {
+        rule["actions"][0]["value"]: sorted(t["value"] for t in rule["triggers"])
+        for rule in fake_firefly.rules.values()
+        if rule["rule_group_id"] == group_id
+    }
+
+
+def test_sync_creates_rules(fake_firefly):
+    fake_firefly.add_category("Restaurants")
+    fake_firefly.add_category("Leisure")
+    firefly = Firefly(fake_firefly.url, "token")
+
+    sync_translation_rules(firefly, TRANSLATIONS)
+    assert translation_rules(fake_firefly) == {
+        "Restaurants": [translation_activator("מסעדות")],
+        "Leisure": sorted(map(translation_activator, ("פנאי", "בילוי"))),
+    }
+
+    # Idempotent, both with the loaded categories and after reloading them
+    requests = fake_firefly.requests.total()
+    assert not sync_translation_rules(firefly, TRANSLATIONS)
+    assert fake_firefly.requests.total() == requests
+
+    reloaded = Firefly(fake_firefly.url, "token")
+    assert not sync_translation_rules(reloaded, TRANSLATIONS)
+
+
+def test_sync_skips_missing_categories(fake_firefly):
+    fake_firefly.add_category("Restaurants")
+    firefly = Firefly(fake_firefly.url, "token")
+
+    plan = sync_translation_rules(
+        firefly, {"מסעדות": " restaurants", "פנאי": "Leisure"}
+    )
+    assert list(plan.create) == ["Restaurants"]
+    assert translation_rules(fake_firefly) == {
+        "Restaurants": [translation_activator("מסעדות")]
+    }
+    assert fake_firefly.requests["POST", "/api/v1/categories"] == 0
+
+
+def test_sync_applies_diff(fake_firefly):
+    fake_firefly.add_category("Restaurants")
+    fake_firefly.add_category("Leisure")
+    firefly = Firefly(fake_firefly.url, "token")
+    sync_translation_rules(firefly, TRANSLATIONS)
+
+    # A duplicate rule, e.g. created by hand
+    group_id = firefly.categories.rule_group_ids[CategoryRuleType.TranslationRule]
+    fake_firefly.add_rule(group_id, "Leisure", [translation_activator("פנאי")])
+    firefly = Firefly(fake_firefly.url, "token")
+
+    plan = sync_translation_rules(firefly, {"פנאי": "Leisure", "אירועים": "Leisure"})
+    assert len(plan.update) == 1
+    assert len(plan.delete) == 2
+    assert not plan.create
+    assert translation_rules(fake_firefly) == {
+        "Leisure": sorted(map(translation_activator, ("פנאי", "אירועים")))
+    }
+
+
+def test_translations_apply_before_description_rules(fake_firefly):
+    # Groups created in the wrong order, e.g. by an older version
+    description = fake_firefly.add_rule_group(CategoryRuleType.DescriptionRule.value)
+    translation = fake_firefly.add_rule_group(CategoryRuleType.TranslationRule.value)
+    firefly = Firefly(fake_firefly.url, "token")
+
+    plan = sync_translation_rules(firefly, TRANSLATIONS)
+    assert plan.translation_group_order == 1
+    assert fake_firefly.rule_groups[translation]["order"] == 1
+    assert fake_firefly.rule_groups[description]["order"] == 2
+
+    assert not sync_translation_rules(Firefly(fake_firefly.url, "token"), TRANSLATIONS)
+
+
+def test_created_groups_are_ordered(fake_firefly):
+    firefly = Firefly(fake_firefly.url, "token")
+    orders = firefly.categories.rule_group_orders
+    assert (
+        orders[CategoryRuleType.TranslationRule]
+        < orders[CategoryRuleType.DescriptionRule]
+    )
+
+
+def test_activators_match_whole_categories():
+    assert translation_activator("Food") == "Reported Category: Food;"
+    assert translation_activator("Food") not in generate_notes_str(
+        **{"Reported Category": "Food Delivery"}
+    )
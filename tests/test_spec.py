@@ -0,0 +1,110 @@
+import re
+from datetime import datetime
+
+import pytest
+import xlwt
+
+from finparse.cards.spec import (
+    Columns,
+    CurrencyColumn,
+    IssuerSpec,
+    Marker,
+    SectionSpec,
+    SheetFormat,
+    SpecReportParser,
+    TableLayout,
+    compile_columns,
+)
+from finparse.models import Currency, TransactionRow, TransactionTable, Card
+
+COLUMNS = Columns(
+    date=0,
+    description=2,
+    amount=3,
+    currency=CurrencyColumn(4),
+    id=1,
+    date_format="%Y-%m-%d",
+)
+
+# A bank that is only configuration
+BANK = IssuerSpec(
+    "Bank",
+    SheetFormat.XLS,
+    TableLayout(
+        card_title=re.compile(r"Card (.*) ending in (\d{4})"),
+        section=SectionSpec("Transactions", Marker(0, "Transactions"), COLUMNS),
+    ),
+)
+
+
+class BankReportParser(SpecReportParser):
+    spec = BANK
+
+
+def test_compiled_columns():
+    compiled = compile_columns(COLUMNS, cells=False)
+    rows = [
+        ["2024-03-01", "A1", "Coffee", 12.5, "₪", "ignored"],
+        ["2024-03-02", "A2", "Books", 40.0, "$", "ignored"],
+    ]
+
+    extracted = list(map(compiled.row, rows))
+    assert extracted[0] == TransactionRow(
+        date=datetime(2024, 3, 1),
+        description="Coffee",
+        amount="12.5",
+        currency=Currency.ILS,
+        id="A1",
+    )
+
+    table = TransactionTable(Card(name="Card", last_4_digits="1234"))
+    compiled.fill_table(list(map(compiled.raw, rows)), table)
+    assert list(table.rows()) == extracted
+
+
+def test_number_format_requires_cells():
+    columns = Columns(
+        date=0, description=1, amount=2, currency=CurrencyColumn(2, number_format=True)
+    )
+    with pytest.raises(ValueError):
+        compile_columns(columns, cells=False)
+
+
+def write_bank_report(path, businesses=tuple(f"Business {row}" for row in range(5))):
+    workbook = xlwt.Workbook(encoding="utf-8")
+    sheet = workbook.add_sheet("Report")
+    sheet.write(0, 0, "Card Gold ending in 4321")
+    sheet.write(2, 0, "Transactions")
+    for column, title in enumerate(("Date", "ID", "Business", "Amount", "Currency")):
+        sheet.write(3, column, title)
+    for row, business in enumerate(businesses):
+        values = (f"2024-03-0{row + 1}", f"T{row}", business, row + 0.5, "€")
+        for column, value in enumerate(values):
+            sheet.write(4 + row, column, value)
+    sheet.write(len(businesses) + 5, 0, "Not a transaction, after the empty row")
+    workbook.save(path)
+
+
+def test_configured_issuer(tmp_path):
+    path = tmp_path / "report.xls"
+    write_bank_report(path)
+
+    records = list(BankReportParser.iter_records(path))
+    assert records[0] == Card(name="Gold", last_4_digits="4321", issuer="Bank")
+    assert [r.id for r in records[1:]] == [f"T{row}" for row in range(5)]
+    assert records[-1].date == datetime(2024, 3, 5)
+    assert records[-1].currency == Currency.EURO
+
+    (table,) = BankReportParser.parse_tables(path)
+    assert list(table.rows()) == records[1:]
+
+
+def test_streamed_rows_are_checked(tmp_path):
+    path = tmp_path / "report.xls"
+    # A business that the spreadsheet stored as a number
+    write_bank_report(path, ("Coffee", 42.0, "Books"))
+
+    rows = BankReportParser.iter_transactions(path)
+    assert next(rows)[1].description == "Coffee"
+    with pytest.raises(ValueError, match="Invalid transaction row"):
+        next(rows)
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from tests.synthetic import write_cal_report, write_isracard_report
+
+ROOT = Path(__file__).parent.parent
+
+HEAVY_MODULES = ("firefly_iii_client", "openpyxl", "xlrd", "pick", "xattr")
+
+
+def imported_heavy_modules(code: str) -> set[str]:
+    env = os.environ | {
+        "PYTHONPATH": os.pathsep.join((str(ROOT), str(ROOT / "finparse")))
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport sys\nprint('\\n'.join(sys.modules))"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return set(HEAVY_MODULES) & set(result.stdout.splitlines())
+
+
+def test_cli_imports_lazily():
+    assert imported_heavy_modules("import finparse.main") == set()
+
+
+@pytest.mark.parametrize(
+    "suffix, write_report, expected",
+    [(".xlsx", write_cal_report, "openpyxl"), (".xls", write_isracard_report, "xlrd")],
+)
+def test_parsing_imports_only_detected_library(
+    tmp_path, suffix, write_report, expected
+):
+    path = tmp_path / f"report{suffix}"
+    write_report(path, 10)
+
+    detect = f"from finparse.parsers import find_parser\nparser = find_parser(__import__('pathlib').Path({str(path)!r}))"
+    # Parsers import their spreadsheet library when they open a report
+    assert imported_heavy_modules(detect) == set()
+    assert imported_heavy_modules(
+        f"{detect}\nlist(parser.parse_tables({str(path)!r}))"
+    ) == {expected}
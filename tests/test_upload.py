@@ -0,0 +1,132 @@
+import pytest
+
+from fake_firefly import DROP_AFTER_STORING, DROP_CONNECTION
+from finparse.models import Card
+from finparse.index import UploadIndex
+from finparse.upload import AsyncUploader, upload_serially
+from tests.cards import make_card
+
+
+@pytest.mark.parametrize("concurrency, batch_size", [(1, 1), (4, 10), (8, 64)])
+def test_concurrent_upload(fake_firefly, firefly, concurrency: int, batch_size: int):
+    uploader = AsyncUploader(firefly, {}, "1", concurrency, batch_size)
+    report = uploader.upload([make_card(100)])
+
+    assert report.uploaded == 100
+    assert not report.failures
+    assert fake_firefly.transaction_posts == 100
+    assert len(fake_firefly.transactions) == 100
+
+
+def test_upload_reports_failures(fake_firefly, firefly):
+    fake_firefly.transaction_failures = [422, 422, 422]
+
+    uploader = AsyncUploader(firefly, {}, "1", concurrency=2, batch_size=5)
+    report = uploader.upload([make_card(20)])
+
+    assert report.total == 20
+    assert len(report.failures) == 3
+    assert all(r.error.startswith("422") for r in report.failures)
+    assert len(fake_firefly.transactions) == 17
+
+
+def test_upload_retries_server_errors(fake_firefly, firefly):
+    fake_firefly.transaction_failures = [429, 500, 503]
+
+    uploader = AsyncUploader(firefly, {}, "1", concurrency=2, backoff=0.01)
+    report = uploader.upload([make_card(10)])
+
+    assert report.uploaded == 10
+    assert fake_firefly.transaction_posts == 13
+    assert len(fake_firefly.transactions) == 10
+
+
+def test_upload_retries_dropped_connections(fake_firefly, firefly):
+    fake_firefly.transaction_failures = [DROP_CONNECTION, None, DROP_CONNECTION]
+
+    uploader = AsyncUploader(firefly, {}, "1", concurrency=2, backoff=0.01)
+    report = uploader.upload([make_card(10)])
+
+    assert report.uploaded == 10
+    assert not report.failures
+    assert len(fake_firefly.transactions) == 10
+
+
+def test_upload_reports_network_failures(fake_firefly, firefly):
+    fake_firefly.transaction_failures = [DROP_CONNECTION] * 100
+
+    uploader = AsyncUploader(firefly, {}, "1", retries=1, backoff=0.01)
+    report = uploader.upload([make_card(3)])
+
+    # Every transaction is tried, and fails, rather than the first failure aborting the upload
+    assert report.total == 3
+    assert len(report.failures) == 3
+    assert all("ProtocolError" in r.error for r in report.failures)
+
+
+def test_upload_skips_indexed_transactions(fake_firefly, firefly, tmp_path):
+    with UploadIndex(tmp_path / "index.sqlite3", "firefly#1") as index:
+        uploader = AsyncUploader(firefly, {}, "1", index=index)
+        uploader.upload([make_card(10)])
+        assert fake_firefly.transaction_posts == 10
+
+        report = uploader.upload([make_card(15)])
+        assert report.total == 5
+        assert fake_firefly.transaction_posts == 15
+
+    # The index persists between runs
+    with UploadIndex(tmp_path / "index.sqlite3", "firefly#1") as index:
+        assert len(index) == 15
+        card = make_card(15)
+        rows = ((card, t) for t in card.transactions)
+        upload_serially(rows, firefly, {}, "1", index)
+        assert fake_firefly.transaction_posts == 15
+
+
+def test_index_counts_identical_transactions(fake_firefly, firefly, tmp_path):
+    coffee = make_card(1).transactions[0].model_copy(update={"id": None})
+    card = Card(name="Test Card", last_4_digits="1234", transactions=[coffee] * 2)
+
+    with UploadIndex(tmp_path / "index.sqlite3", "firefly#1") as index:
+        uploader = AsyncUploader(firefly, {}, "1", index=index)
+        assert uploader.upload([card]).total == 2
+        assert len(index) == 2
+
+        # A third, identical transaction in the grown report
+        card.transactions.append(coffee)
+        assert uploader.upload([card]).total == 1
+        assert fake_firefly.transaction_posts == 3
+
+
+def test_index_scope(fake_firefly, firefly, tmp_path):
+    path = tmp_path / "index.sqlite3"
+    with UploadIndex(path, "firefly#1") as index:
+        upload_serially(
+            ((card, t) for card in [make_card(5)] for t in card.transactions),
+            firefly,
+            {},
+            "1",
+            index,
+        )
+
+    with UploadIndex(path, "firefly#2") as index:
+        assert len(index) == 0
+        card = make_card(5)
+        assert len(list(index.filter_new((card, t) for t in card.transactions))) == 5
+
+    # The IDs of one issuer (or card) say nothing about another's
+    with UploadIndex(path, "firefly#1") as index:
+        card = make_card(5).model_copy(update={"issuer": "Other"})
+        assert len(list(index.filter_new((card, t) for t in card.transactions))) == 5
+
+
+def test_upload_retries_stored_transactions(fake_firefly, firefly):
+    # The transaction was stored, but its response was lost, so the retry is a duplicate
+    fake_firefly.transaction_failures = [DROP_AFTER_STORING, 500]
+
+    uploader = AsyncUploader(firefly, {}, "1", backoff=0.01)
+    report = uploader.upload([make_card(3)])
+
+    assert report.uploaded == 3
+    assert not report.failures
+    assert len(fake_firefly.transactions) == 3
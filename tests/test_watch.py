@@ -0,0 +1,55 @@
+import os
+import sys
+
+import pytest
+
+from finparse.watch import InotifyWatcher, PollingWatcher, is_report
+
+
+def test_is_report(tmp_path):
+    assert is_report(tmp_path / "report.xlsx")
+    assert is_report(tmp_path / "REPORT.XLS")
+    assert not is_report(tmp_path / "report.xlsx.crdownload")
+    assert not is_report(tmp_path / "~$report.xlsx")
+    assert not is_report(tmp_path / ".report.xls")
+
+
+def test_polling_waits_for_reports_to_settle(tmp_path):
+    (tmp_path / "existing.xls").write_bytes(b"old")
+    watcher = PollingWatcher(tmp_path)
+
+    report = tmp_path / "report.xlsx"
+    report.write_bytes(b"partial")
+    (tmp_path / "notes.txt").write_text("not a report")
+    assert watcher.poll() == set()
+
+    # Still being written
+    report.write_bytes(b"partial, and some more")
+    assert watcher.poll() == set()
+
+    assert watcher.poll() == {report}
+    assert watcher.poll() == set()
+
+    (tmp_path / "existing.xls").write_bytes(b"changed")
+    assert watcher.poll() == set()
+    assert watcher.poll() == {tmp_path / "existing.xls"}
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="inotify is Linux only")
+def test_inotify_yields_written_and_moved_reports(tmp_path):
+    downloads = tmp_path / "downloads"
+    watched = tmp_path / "watched"
+    downloads.mkdir()
+    watched.mkdir()
+
+    with InotifyWatcher(watched, interval=0.1, settle=0.1) as watcher:
+        (watched / "report.xlsx").write_bytes(b"report")
+        (watched / "notes.txt").write_text("not a report")
+        (downloads / "moved.xls").write_bytes(b"report")
+        os.rename(downloads / "moved.xls", watched / "moved.xls")
+
+        changes = watcher.changes()
+        assert next(changes) == {watched / "report.xlsx", watched / "moved.xls"}
+
+        watcher.stop()
+        assert next(changes, None) is None
@@ -0,0 +1,280 @@
+import importlib
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from firefly_iii_client import ApiException
+from typer.testing import CliRunner
+
+from finparse.cards.cal import CalReportParser
+from finparse.cards.isracard import IsracardReportParser
+from finparse.index import UploadIndex, index_scope
+from finparse.journal import CheckpointJournal
+from finparse.models import Card, Currency, TransactionRow
+from finparse.precheck import ExistingTransactions
+from finparse.upload import upload_serially
+from finparse.watermarks import Watermarks
+from tests.synthetic import write_cal_report, write_isracard_report
+
+
+def card() -> Card:
+    return Card(name="Card", last_4_digits="1234")
+
+
+def make_row(i: int) -> TransactionRow:
+    return TransactionRow(
+        date=datetime(2024, 3, 1) + timedelta(days=i // 5),
+        description=f"Business {i}",
+        amount=str(i),
+        currency=Currency.ILS,
+    )
+
+
+def card_rows(transactions: int, start: int = 0):
+    # A single card, as parsed from a single report
+    row_card = card()
+    return ((row_card, make_row(i)) for i in range(start, start + transactions))
+
+
+def test_growing_report(tmp_path):
+    path = tmp_path / "watermarks.json"
+    first, grown = tmp_path / "first.xlsx", tmp_path / "grown.xlsx"
+    write_cal_report(first, 100)
+    write_cal_report(grown, 130)
+
+    watermarks = Watermarks(path)
+    assert len(list(CalReportParser.iter_transactions(first, watermarks))) == 100
+    assert not path.exists()
+    watermarks.commit()
+
+    watermarks = Watermarks(path)
+    assert watermarks.by_card["Cal:1234"]["Transactions"].row == 100
+    tail = [t for _, t in CalReportParser.iter_transactions(grown, watermarks)]
+    assert tail == [t for _, t in CalReportParser.iter_transactions(grown)][100:]
+
+    watermarks.commit()
+    assert Watermarks(path).by_card["Cal:1234"]["Transactions"].row == 130
+    assert not list(CalReportParser.iter_transactions(grown, Watermarks(path)))
+
+
+def test_skipped_rows_are_not_extracted(tmp_path):
+    watermarks = Watermarks(tmp_path / "watermarks.json")
+    list(watermarks.filter_new(lambda: card_rows(10)))
+    watermarks.commit()
+
+    extracted = []
+
+    def extract(i: int) -> TransactionRow:
+        extracted.append(i)
+        return make_row(i)
+
+    def raw_rows(transactions: int):
+        row_card = card()
+        return ((row_card, i) for i in range(transactions))
+
+    # Only the last row under the watermark, to check it
+    assert not list(watermarks.filter_new(lambda: raw_rows(10), extract))
+    assert extracted == [9]
+
+    # Rows were added, and the skipped rows on the date of the watermark are counted in the card
+    extracted.clear()
+    new = list(watermarks.filter_new(lambda: raw_rows(15), extract))
+    assert [t.description for _, t in new] == [f"Business {i}" for i in range(10, 15)]
+    assert extracted == list(range(9, 15))
+    assert new[0][0].skipped.total() == 5
+
+
+def test_changed_rows(tmp_path):
+    watermarks = Watermarks(tmp_path / "watermarks.json")
+    list(watermarks.filter_new(lambda: card_rows(10)))
+    watermarks.commit()
+
+    # Another billing cycle
+    changed = list(card_rows(15, start=100))
+    assert list(watermarks.filter_new(lambda: changed)) == changed
+
+    # Fewer rows than the watermark
+    shorter = list(card_rows(5))
+    assert list(watermarks.filter_new(lambda: shorter)) == shorter
+
+    # The watermarks of other cards don't apply
+    other_card = Card(name="Other", last_4_digits="9999")
+    other = [(other_card, make_row(i)) for i in range(10)]
+    assert list(watermarks.filter_new(lambda: other)) == other
+
+
+def test_changed_sections(tmp_path):
+    # Sections whose rows under the watermark are needed after all, out of the order of the report
+    watermarks = Watermarks(tmp_path / "watermarks.json")
+
+    def sections(local: range, foreign: range):
+        row_card = card()
+        return [(row_card, ("Local", i)) for i in local] + [
+            (row_card, ("Foreign", i)) for i in foreign
+        ]
+
+    def filter_new(raw_rows):
+        return [
+            t.description
+            for _, t in watermarks.filter_new(
+                lambda: iter(raw_rows), lambda raw: make_row(raw[1]), lambda raw: raw[0]
+            )
+        ]
+
+    filter_new(sections(range(10), range(100, 105)))
+    watermarks.commit()
+
+    # A shorter local section, and a foreign one that changed
+    new = filter_new(sections(range(50, 55), range(200, 210)))
+    assert sorted(new) == sorted(
+        f"Business {i}" for i in [*range(50, 55), *range(200, 210)]
+    )
+
+
+def test_isracard_cards(tmp_path):
+    report = tmp_path / "report.xls"
+    write_isracard_report(report, 40, cards=2)
+    watermarks = Watermarks(tmp_path / "watermarks.json")
+
+    rows = list(IsracardReportParser.iter_transactions(report, watermarks))
+    assert rows == list(IsracardReportParser.iter_transactions(report))
+    assert {
+        d: {name: w.row for name, w in sections.items()}
+        for d, sections in watermarks.pending.items()
+    } == {
+        "Isracard:1000": {"Local": 16, "Foreign": 4},
+        "Isracard:1001": {"Local": 16, "Foreign": 4},
+    }
+
+    # Until the uploaded rows are committed, nothing is skipped
+    assert len(list(IsracardReportParser.iter_transactions(report, watermarks))) == 40
+    watermarks.commit()
+    assert not list(IsracardReportParser.iter_transactions(report, watermarks))
+
+
+def test_growing_isracard_sections(tmp_path):
+    # The local section grows, after the foreign one was already uploaded
+    first, grown = tmp_path / "first.xls", tmp_path / "grown.xls"
+    write_isracard_report(first, 40, cards=1, foreign_currencies=("$",), foreign_rows=4)
+    write_isracard_report(grown, 45, cards=1, foreign_currencies=("$",), foreign_rows=4)
+
+    watermarks = Watermarks(tmp_path / "watermarks.json")
+    assert len(list(IsracardReportParser.iter_transactions(first, watermarks))) == 40
+    watermarks.commit()
+
+    tail = list(IsracardReportParser.iter_transactions(grown, watermarks))
+    assert [t.id for _, t in tail] == [str(i) for i in range(37, 42)]
+
+
+@pytest.mark.parametrize("dedup", ["index", "precheck"])
+def test_identical_rows_after_the_watermark(fake_firefly, firefly, tmp_path, dedup):
+    # A second coffee on the same day, after the first one was uploaded
+    coffee = make_row(0)
+    watermarks = Watermarks(tmp_path / "watermarks.json")
+    with UploadIndex(tmp_path / "index.sqlite3", "firefly#1") as index:
+        if dedup == "index":
+            layers = {"index": index}
+        else:
+            layers = {"existing": ExistingTransactions(firefly, "1")}
+
+        def report(*transactions):
+            report_card = card()
+            return lambda: ((report_card, t) for t in transactions)
+
+        rows = watermarks.filter_new(report(make_row(1), coffee))
+        upload_serially(rows, firefly, {}, "1", **layers)
+        watermarks.commit()
+
+        # The skipped coffee accounts for the one uploaded, but not for the second one
+        rows = watermarks.filter_new(report(make_row(1), coffee, coffee))
+        upload_serially(rows, firefly, {}, "1", **layers)
+
+    assert fake_firefly.transaction_posts == 3
+
+
+def test_resume_incremental_upload(fake_firefly, firefly, tmp_path):
+    report = tmp_path / "report.xlsx"
+    report.write_bytes(b"report")
+    watermarks = Watermarks(tmp_path / "watermarks.json")
+    upload_serially(watermarks.filter_new(lambda: card_rows(10)), firefly, {}, "1")
+    watermarks.commit()
+
+    # The journal only sees the rows after the watermark
+    fake_firefly.transaction_failures = [None, None, 500]
+    with CheckpointJournal(report, tmp_path) as journal:
+        with pytest.raises(ApiException):
+            upload_serially(
+                watermarks.filter_new(lambda: card_rows(20)),
+                firefly,
+                {},
+                "1",
+                journal=journal,
+            )
+
+    journal = CheckpointJournal(report, tmp_path)
+    assert journal.load() == 2
+    with journal:
+        upload_serially(
+            watermarks.filter_new(lambda: card_rows(20)),
+            firefly,
+            {},
+            "1",
+            journal=journal,
+        )
+    assert len(fake_firefly.transactions) == 20
+    assert fake_firefly.transaction_posts == 10 + 3 + 8
+
+
+def test_accounts(fake_firefly, firefly, tmp_path):
+    # Uploading to one account says nothing about another
+    accounts = ["1", fake_firefly.add_account("Savings")]
+    for account_id in accounts:
+        scope = index_scope(fake_firefly.url, account_id)
+        watermarks = Watermarks(tmp_path / "watermarks.json", scope)
+        upload_serially(
+            watermarks.filter_new(lambda: card_rows(10)), firefly, {}, account_id
+        )
+        watermarks.commit()
+
+    by_account = Counter(
+        t["transactions"][0]["source_id"] for t in fake_firefly.transactions.values()
+    )
+    assert by_account == {account_id: 10 for account_id in accounts}
+
+    watermarks = Watermarks(
+        tmp_path / "watermarks.json", index_scope(fake_firefly.url, "1")
+    )
+    assert not list(watermarks.filter_new(lambda: card_rows(10)))
+
+
+def test_upload_to_two_accounts(fake_firefly, monkeypatch, tmp_path):
+    # The CLI runs as a script from inside the package (see test_startup)
+    monkeypatch.syspath_prepend(Path(__file__).parents[1] / "finparse")
+    app = importlib.import_module("finparse.main").app
+
+    accounts = [
+        fake_firefly.add_account("Checking"),
+        fake_firefly.add_account("Savings"),
+    ]
+    report = tmp_path / "report.xlsx"
+    write_cal_report(report, 20)
+
+    for index in range(len(accounts)):
+        monkeypatch.setattr("pick.pick", lambda options, title: (options[index], index))
+        args = [
+            "upload",
+            str(report),
+            "--token=token",
+            f"--firefly-host={fake_firefly.url}",
+            f"--index-path={tmp_path / 'index.sqlite3'}",
+            "--no-sync-rules",
+            "--no-progress",
+        ]
+        result = CliRunner().invoke(app, args)
+        assert result.exit_code == 0, result.output
+
+    by_account = Counter(
+        t["transactions"][0]["source_id"] for t in fake_firefly.transactions.values()
+    )
+    assert by_account == {account_id: 20 for account_id in accounts}
@@ -0,0 +1,60 @@
+import gc
+import os
+from pathlib import Path
+
+import pytest
+
+from finparse.cards.cal import CalReportParser
+from finparse.cards.isracard import IsracardReportParser
+from finparse.workbooks import open_xls_sheet
+from tests.synthetic import write_cal_report, write_isracard_report
+
+pytestmark = pytest.mark.skipif(
+    not Path("/proc/self/fd").exists(), reason="Counts the open file descriptors"
+)
+
+
+def open_fds() -> int:
+    return len(os.listdir("/proc/self/fd"))
+
+
+@pytest.fixture
+def no_gc():
+    # Workbooks that aren't closed are only released when garbage is collected
+    gc.collect()
+    gc.disable()
+    yield
+    gc.enable()
+
+
+@pytest.mark.parametrize(
+    "parser, write_report, suffix",
+    [
+        (CalReportParser, write_cal_report, ".xlsx"),
+        (IsracardReportParser, write_isracard_report, ".xls"),
+    ],
+)
+def test_workbooks_are_released(tmp_path, no_gc, parser, write_report, suffix):
+    path = tmp_path / f"report{suffix}"
+    write_report(path, 20)
+
+    before = open_fds()
+    for _ in range(10):
+        assert sum(1 for _ in parser.iter_transactions(path)) == 20
+        assert sum(len(table) for table in parser.parse_tables(path)) == 20
+
+        # A report that was only partially parsed
+        records = parser.iter_records(path)
+        next(records)
+        records.close()
+
+    assert open_fds() == before
+
+
+def test_xls_sheet(tmp_path):
+    path = tmp_path / "report.xls"
+    write_isracard_report(path, 20, cards=1)
+
+    with open_xls_sheet(path) as sheet:
+        # The transactions, and the titles and totals around them
+        assert sheet.nrows > 20